@@ -0,0 +1,183 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Lambda that labels PDF pages and splits them between the OCR and the vision paths
+"""
+
+#########################
+#   LIBRARIES & LOGGER
+#########################
+
+import json
+import logging
+import os
+import sys
+from io import BytesIO
+from typing import List, Tuple
+
+import boto3
+from checkpoint import Checkpoints, get_document_hash
+from pypdf import PdfReader
+from renderer import PDF_RENDERER, PopplerRenderer, encode_image, get_renderer
+from single_flight import SingleFlight, get_flight_key
+from utils import LABEL_PHOTO, OCR_LABELS, classify_page, write_pdf_subset
+
+LOGGER = logging.Logger("PAGE-CLASSIFICATION", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+
+#########################
+#       CONSTANTS
+#########################
+
+S3_BUCKET = os.environ["BUCKET_NAME"]
+S3_CLIENT = boto3.client("s3")
+
+PREFIX_PAGES = "pages"
+
+CLASSIFICATION_DPI = 40  # resolution used to label pages
+PHOTO_DPI = 200  # resolution of the page images sent to the vision model
+
+# concurrent executions of the same document share its page routing, disabled unless enabled in config.yml
+SINGLE_FLIGHT = SingleFlight.from_env()
+
+
+def label_pages(pdf_bytes: bytes, reader: PdfReader, renderer_name: str = PDF_RENDERER) -> Tuple[List[str], dict]:
+    """
+    Label the pages of a PDF, and render the photo pages from the same open document
+
+    Parameters
+    ----------
+    pdf_bytes : bytes
+        Content of the PDF
+    reader : PdfReader
+        Reader of the PDF, for the text layer of the pages
+    renderer_name : str
+        Name of the renderer, by default PDF_RENDERER
+
+    Returns
+    -------
+    Tuple[List[str], dict]
+        Label of every page, and JPEG image of every photo page by 1-based page number
+    """
+    page_labels, photo_images = [], {}
+    with get_renderer(renderer_name).open(pdf_bytes) as document:
+        for page_idx, (page, image) in enumerate(zip(reader.pages, document.render_all(CLASSIFICATION_DPI))):
+            try:
+                text = page.extract_text() or ""
+            except Exception as e:
+                LOGGER.debug(f"Could not read the text layer: {e}")
+                text = ""
+            page_labels.append(classify_page(image, text))
+            if page_labels[-1] == LABEL_PHOTO:
+                photo_images[page_idx + 1] = encode_image(document.render(page_idx, PHOTO_DPI).convert("RGB"))
+    return page_labels, photo_images
+
+
+def route_pages(file_name: str, doc_prefix: str) -> dict:
+    """
+    Label the pages of a PDF and upload the text pages and the photo page images
+
+    Returns
+    -------
+    dict
+        Page routing: page labels, key of the text pages and keys of the photo page images
+    """
+    # read the file into memory, pages are rendered in-process, poppler is only used as a fallback
+    pdf_bytes = S3_CLIENT.get_object(Bucket=S3_BUCKET, Key=file_name)["Body"].read()
+    reader = PdfReader(BytesIO(pdf_bytes))
+    try:
+        page_labels, photo_images = label_pages(pdf_bytes, reader)
+    except Exception as e:
+        if PDF_RENDERER == PopplerRenderer.name:
+            raise
+        LOGGER.warning(f"Renderer {PDF_RENDERER} failed, falling back to poppler: {e}")
+        page_labels, photo_images = label_pages(pdf_bytes, reader, PopplerRenderer.name)
+    LOGGER.info(f"Page labels: {page_labels}")
+
+    text_pages = [idx + 1 for idx, label in enumerate(page_labels) if label in OCR_LABELS]
+    photo_pages = [idx + 1 for idx, label in enumerate(page_labels) if label == LABEL_PHOTO]
+
+    # send text pages to the OCR path, keeping the original key if no page is dropped
+    text_file_name = None
+    if text_pages and len(text_pages) == len(page_labels):
+        text_file_name = file_name
+    elif text_pages:
+        text_file_name = f"{doc_prefix}/text_pages.pdf"
+        S3_CLIENT.put_object(
+            Body=write_pdf_subset(reader, text_pages),
+            Bucket=S3_BUCKET,
+            Key=text_file_name,
+            ContentType="application/pdf",
+        )
+        LOGGER.info(f"Uploaded text pages {text_pages} to: {text_file_name}")
+
+    # send photo pages to the vision path
+    photo_page_keys = []
+    for page_number in photo_pages:
+        page_key = f"{doc_prefix}/page_{page_number}.jpg"
+        S3_CLIENT.put_object(
+            Body=photo_images[page_number], Bucket=S3_BUCKET, Key=page_key, ContentType="image/jpeg"
+        )
+        photo_page_keys.append(page_key)
+    LOGGER.info(f"Uploaded photo pages {photo_pages} to: {photo_page_keys}")
+
+    return {
+        "original_file_name": file_name,
+        "page_labels": page_labels,
+        "text_file_name": text_file_name,
+        "photo_page_keys": photo_page_keys,
+    }
+
+
+#########################
+#        HANDLER
+#########################
+
+
+def lambda_handler(event, context):
+    """
+    Lambda handler
+    """
+
+    # parse event
+    if "requestContext" in event:
+        LOGGER.info("Received HTTP request.")
+        body = json.loads(event["body"])
+    else:  # step functions invocation
+        body = event["body"]
+    LOGGER.info(f"Received input: {body}")
+
+    file_name = body["file_name"]
+    document_hash = get_document_hash(S3_CLIENT, S3_BUCKET, file_name)
+    # pages are keyed by content, a re-uploaded document never overwrites the pages of a checkpoint of its old content
+    doc_prefix = f"{PREFIX_PAGES}/{file_name.split('/', 1)[-1].rsplit('.', 1)[0]}/{document_hash[:16]}"
+
+    # a retry or a re-submission of the same document reuses the labels and the rendered pages
+    checkpoints = Checkpoints.from_env(S3_CLIENT, S3_BUCKET, document_hash, event.get("execution_name"))
+    checkpoint_inputs = {"doc_prefix": doc_prefix, "classification_dpi": CLASSIFICATION_DPI, "photo_dpi": PHOTO_DPI}
+    page_routing = checkpoints.load("page-routing", checkpoint_inputs)
+    if page_routing is None:
+        page_routing, _ = SINGLE_FLIGHT.run(
+            get_flight_key(checkpoints.document_hash, "page-routing", checkpoint_inputs),
+            lambda: route_pages(file_name, doc_prefix),
+        )
+        artifacts = [page_routing["text_file_name"], *page_routing["photo_page_keys"]]
+        checkpoints.save("page-routing", page_routing, checkpoint_inputs, artifacts=artifacts)
+
+    json_data = json.dumps(
+        {
+            "file_name": file_name,
+            "page_routing": page_routing,
+        }
+    )
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json_data,
+    }
@@ -0,0 +1,232 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    PDF page renderers
+"""
+
+import logging
+import os
+from abc import ABC, abstractmethod
+from io import BytesIO
+from typing import Iterator, List, Union
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DPI = 200
+DEFAULT_FORMAT = "JPEG"
+DEFAULT_QUALITY = 85
+PDF_RENDERER = os.environ.get("PDF_RENDERER", "pdfium")  # primary renderer, poppler is used as a fallback
+
+
+def encode_image(image, image_format: str = DEFAULT_FORMAT) -> bytes:
+    """
+    Compress a page image
+    """
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, quality=DEFAULT_QUALITY)
+    return buffer.getvalue()
+
+
+class BaseDocument(ABC):
+    """
+    Open PDF whose pages are rendered on demand, at any resolution
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @abstractmethod
+    def __len__(self) -> int:
+        pass
+
+    @abstractmethod
+    def render(self, page_idx: int, dpi: int = DEFAULT_DPI):
+        """
+        Render one page
+
+        Parameters
+        ----------
+        page_idx : int
+            0-based index of the page
+        dpi : int
+            Rendering resolution, by default DEFAULT_DPI
+
+        Returns
+        -------
+        PIL.Image.Image
+            Page image
+        """
+        pass
+
+    def render_all(self, dpi: int = DEFAULT_DPI) -> Iterator:
+        """
+        Render all pages in document order
+        """
+        for page_idx in range(len(self)):
+            yield self.render(page_idx, dpi)
+
+    @abstractmethod
+    def close(self):
+        pass
+
+
+class BaseRenderer(ABC):
+    """
+    Renders PDF pages into compressed image buffers
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def open(self, source: Union[str, bytes]) -> BaseDocument:
+        """
+        Open a PDF from the path to the PDF file or the content of the PDF
+        """
+        pass
+
+    def render(
+        self,
+        source: Union[str, bytes],
+        dpi: int = DEFAULT_DPI,
+        image_format: str = DEFAULT_FORMAT,
+    ) -> Iterator[bytes]:
+        """
+        Render the pages of a PDF
+
+        Parameters
+        ----------
+        source : Union[str, bytes]
+            Path to the PDF file or content of the PDF
+        dpi : int
+            Rendering resolution, by default DEFAULT_DPI
+        image_format : str
+            Format of the page images, by default DEFAULT_FORMAT
+
+        Yields
+        ------
+        bytes
+            Compressed image of each page in document order
+        """
+        with self.open(source) as document:
+            for image in document.render_all(dpi):
+                yield encode_image(image, image_format)
+
+
+class PdfiumDocument(BaseDocument):
+    def __init__(self, source: Union[str, bytes]):
+        import pypdfium2 as pdfium
+
+        self.pdf = pdfium.PdfDocument(source)
+
+    def __len__(self) -> int:
+        return len(self.pdf)
+
+    def render(self, page_idx: int, dpi: int = DEFAULT_DPI):
+        page = self.pdf[page_idx]
+        try:
+            return page.render(scale=dpi / 72).to_pil()
+        finally:
+            page.close()
+
+    def close(self):
+        self.pdf.close()
+
+
+class PdfiumRenderer(BaseRenderer):
+    """
+    In-process renderer based on PDFium, no subprocess and no temporary files
+    """
+
+    name = "pdfium"
+
+    def open(self, source: Union[str, bytes]) -> PdfiumDocument:
+        return PdfiumDocument(source)
+
+
+class PopplerDocument(BaseDocument):
+    def __init__(self, source: Union[str, bytes]):
+        self.source = source
+
+    def _convert(self, dpi: int, **kwargs):
+        from pdf2image import convert_from_bytes, convert_from_path
+
+        convert = convert_from_bytes if isinstance(self.source, bytes) else convert_from_path
+        return convert(self.source, dpi=dpi, **kwargs)
+
+    def __len__(self) -> int:
+        from pdf2image import pdfinfo_from_bytes, pdfinfo_from_path
+
+        pdfinfo = pdfinfo_from_bytes if isinstance(self.source, bytes) else pdfinfo_from_path
+        return int(pdfinfo(self.source)["Pages"])
+
+    def render(self, page_idx: int, dpi: int = DEFAULT_DPI):
+        return self._convert(dpi, first_page=page_idx + 1, last_page=page_idx + 1)[0]
+
+    def render_all(self, dpi: int = DEFAULT_DPI) -> Iterator:
+        return iter(self._convert(dpi))  # one subprocess for the whole document
+
+    def close(self):
+        self.source = None
+
+
+class PopplerRenderer(BaseRenderer):
+    """
+    Renderer based on poppler's pdftoppm subprocess
+    """
+
+    name = "poppler"
+
+    def open(self, source: Union[str, bytes]) -> PopplerDocument:
+        return PopplerDocument(source)
+
+
+RENDERERS = {
+    PdfiumRenderer.name: PdfiumRenderer,
+    PopplerRenderer.name: PopplerRenderer,
+}
+
+
+def get_renderer(name: str = PDF_RENDERER) -> BaseRenderer:
+    """
+    Get a renderer by name
+    """
+    return RENDERERS[name]()
+
+
+def render_pdf(
+    source: Union[str, bytes],
+    dpi: int = DEFAULT_DPI,
+    image_format: str = DEFAULT_FORMAT,
+    renderer_name: str = PDF_RENDERER,
+) -> List[bytes]:
+    """
+    Render all pages of a PDF, falling back to poppler if the primary renderer fails
+
+    Parameters
+    ----------
+    source : Union[str, bytes]
+        Path to the PDF file or content of the PDF
+    dpi : int
+        Rendering resolution, by default DEFAULT_DPI
+    image_format : str
+        Format of the page images, by default DEFAULT_FORMAT
+    renderer_name : str
+        Name of the primary renderer, by default PDF_RENDERER
+
+    Returns
+    -------
+    List[bytes]
+        Compressed image of each page in document order
+    """
+    try:
+        return list(get_renderer(renderer_name).render(source, dpi=dpi, image_format=image_format))
+    except Exception as e:
+        if renderer_name == PopplerRenderer.name:
+            raise
+        LOGGER.warning(f"Renderer {renderer_name} failed, falling back to poppler: {e}")
+        return list(PopplerRenderer().render(source, dpi=dpi, image_format=image_format))
@@ -0,0 +1,261 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Single flight: concurrent callers of the same work on the same document wait for the first one's result
+"""
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+LOGGER = logging.Logger("SINGLE-FLIGHT", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+LOCK_TTL_S = 900.0  # Lambda timeout, the lock of a caller that died is taken over afterwards
+WAIT_S = 300.0  # a caller waiting longer does the work itself
+LINGER_S = 60.0  # results are kept for the callers still polling, later callers use the checkpoints
+POLL_S = 1.0
+
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+
+
+def get_flight_key(document_hash: str, stage: str, inputs: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Key of a piece of work: the document content, the stage and the inputs its result depends on
+    """
+    fingerprint = hashlib.sha256(json.dumps(inputs or {}, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"{document_hash}/{stage}/{fingerprint}"
+
+
+class InMemoryLockStore:
+    """
+    Locks of a single process, for local runs or when no table is configured
+    """
+
+    def __init__(self):
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, owner: str, expires_at: float, now: float) -> bool:
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record["expires_at"] >= now:
+                return False
+            self._records[key] = {"owner": owner, "status": STATUS_RUNNING, "expires_at": expires_at}
+            return True
+
+    def complete(self, key: str, owner: str, result: str, expires_at: float):
+        with self._lock:
+            if self._records.get(key, {}).get("owner") == owner:
+                self._records[key] = {"owner": owner, "status": STATUS_DONE, "result": result, "expires_at": expires_at}
+
+    def release(self, key: str, owner: str):
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None and record["owner"] == owner and record["status"] == STATUS_RUNNING:
+                del self._records[key]
+
+    def get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._records.get(key)
+            return dict(record) if record is not None and record["expires_at"] >= now else None
+
+
+class DynamoDBLockStore:
+    """
+    Locks shared by all Lambdas, one item per piece of work taken with a conditional write
+
+    Parameters
+    ----------
+    table_name : str
+        DynamoDB table with the string partition key "flight_key" and the TTL attribute "expires_at"
+    """
+
+    # owner, status and result are DynamoDB reserved words
+    NAMES = {"#owner": "owner", "#status": "status", "#result": "result"}
+
+    def __init__(self, table_name: str, dynamodb_resource=None):
+        self._table = (dynamodb_resource or boto3.resource("dynamodb")).Table(table_name)
+
+    def acquire(self, key: str, owner: str, expires_at: float, now: float) -> bool:
+        try:
+            self._table.put_item(
+                Item={
+                    "flight_key": key,
+                    "owner": owner,
+                    "status": STATUS_RUNNING,
+                    "expires_at": Decimal(str(round(expires_at, 3))),
+                },
+                ConditionExpression="attribute_not_exists(flight_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": Decimal(str(round(now, 3)))},
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def complete(self, key: str, owner: str, result: str, expires_at: float):
+        self._table.update_item(
+            Key={"flight_key": key},
+            UpdateExpression="SET #status = :done, #result = :result, expires_at = :expires_at",
+            ConditionExpression="#owner = :owner",
+            ExpressionAttributeNames=self.NAMES,
+            ExpressionAttributeValues={
+                ":done": STATUS_DONE,
+                ":result": result,
+                ":expires_at": Decimal(str(round(expires_at, 3))),
+                ":owner": owner,
+            },
+        )
+
+    def release(self, key: str, owner: str):
+        try:
+            self._table.delete_item(
+                Key={"flight_key": key},
+                ConditionExpression="#owner = :owner AND #status = :running",
+                ExpressionAttributeNames={"#owner": "owner", "#status": "status"},
+                ExpressionAttributeValues={":owner": owner, ":running": STATUS_RUNNING},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                raise
+
+    def get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        item = self._table.get_item(Key={"flight_key": key}, ConsistentRead=True).get("Item")
+        if item is None or float(item["expires_at"]) < now:  # the TTL deletes expired items with a delay
+            return None
+        return {**item, "expires_at": float(item["expires_at"])}
+
+
+class SingleFlight:
+    """
+    Coalescing of identical in-flight work: Textract and Transcribe jobs, page routing and model answers
+
+    When the same claim is opened by several adjusters or a form is submitted twice, executions process the same
+    documents at the same time. The first caller of a piece of work takes its lock and does it, the others poll the
+    lock until its result is published and return it instead of starting the same job. The checkpoints cover the
+    callers arriving after the work is done. A caller waiting longer than wait_s, or half of its remaining time,
+    does the work itself, and a failed caller releases the lock to the next one. Lock store errors never fail the
+    work, it is then done without coordination.
+
+    Parameters
+    ----------
+    store : InMemoryLockStore or DynamoDBLockStore, optional
+        Lock store, None disables the coalescing
+    lock_ttl_s : float, optional
+        Lifetime of a lock, by default LOCK_TTL_S
+    wait_s : float, optional
+        Max time to wait for the result of another caller, by default WAIT_S
+    linger_s : float, optional
+        Lifetime of a published result, by default LINGER_S
+    poll_s : float, optional
+        Interval between the reads of the lock, by default POLL_S
+    """
+
+    def __init__(
+        self,
+        store=None,
+        lock_ttl_s: float = LOCK_TTL_S,
+        wait_s: float = WAIT_S,
+        linger_s: float = LINGER_S,
+        poll_s: float = POLL_S,
+    ):
+        self.store = store
+        self.lock_ttl_s = lock_ttl_s
+        self.wait_s = wait_s
+        self.linger_s = linger_s
+        self.poll_s = poll_s
+
+    @classmethod
+    def from_env(
+        cls, policy_variable: str = "SINGLE_FLIGHT_POLICY", table_variable: str = "SINGLE_FLIGHT_TABLE"
+    ) -> "SingleFlight":
+        """
+        Coalescing of the single_flight section of config.yml, disabled unless enabled there
+        """
+        policy = json.loads(os.environ.get(policy_variable) or "{}")
+        if not policy.get("enabled", False):
+            return cls()
+        table_name = os.environ.get(table_variable)
+        return cls(
+            DynamoDBLockStore(table_name) if table_name else InMemoryLockStore(),
+            lock_ttl_s=float(policy.get("lock_ttl_s", LOCK_TTL_S)),
+            wait_s=float(policy.get("wait_s", WAIT_S)),
+            linger_s=float(policy.get("linger_s", LINGER_S)),
+        )
+
+    def run(self, key: str, work: Callable[[], Dict[str, Any]], deadline=None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Do a piece of work once across the concurrent callers
+
+        Parameters
+        ----------
+        key : str
+            Key of the work, see get_flight_key
+        work : Callable[[], Dict[str, Any]]
+            Work returning a JSON-serializable result, small enough for a DynamoDB item (400 KB)
+        deadline : model.deadline.Deadline, optional
+            Deadline of the invocation, a caller keeps half of its remaining time to do the work itself
+
+        Returns
+        -------
+        Tuple[Dict[str, Any], bool]
+            Result and whether it was computed by another caller
+        """
+        if self.store is None:
+            return work(), False
+
+        owner = uuid.uuid4().hex
+        start = time.time()
+        max_wait_s = self.wait_s if deadline is None else min(self.wait_s, deadline.remaining() / 2)
+        try:
+            while True:
+                now = time.time()
+                if self.store.acquire(key, owner, now + self.lock_ttl_s, now):
+                    break
+                record = self.store.get(key, now)
+                if record is not None and record["status"] == STATUS_DONE:
+                    LOGGER.info(f"Using the result of {key} of a concurrent caller after {now - start:.1f}s")
+                    return json.loads(record["result"]), True
+                if now - start >= max_wait_s:
+                    LOGGER.warning(f"Waited {now - start:.0f}s for a concurrent caller of {key}, running it again")
+                    return work(), False
+                time.sleep(self.poll_s * random.uniform(1.0, 1.2))  # jitter spreads the waiting callers
+        except ClientError as e:
+            LOGGER.warning(f"Could not coordinate {key}, running it without lock: {e}")
+            return work(), False
+
+        try:
+            result = work()
+        except BaseException:
+            self._release(key, owner)
+            raise
+        try:
+            self.store.complete(key, owner, json.dumps(result), time.time() + self.linger_s)
+        except Exception as e:  # noqa: BLE001 e.g. a result too large for the table, the waiting callers run it
+            LOGGER.warning(f"Could not publish the result of {key}: {e}")
+            self._release(key, owner)
+        return result, False
+
+    def _release(self, key: str, owner: str):
+        try:
+            self.store.release(key, owner)
+        except Exception as e:  # noqa: BLE001 the lock expires after lock_ttl_s
+            LOGGER.warning(f"Could not release the lock of {key}: {e}")
@@ -0,0 +1,150 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Page classification utils
+"""
+
+from io import BytesIO
+from typing import Dict, List
+
+from PIL import Image, ImageStat
+from pypdf import PdfReader, PdfWriter
+
+LABEL_TEXT = "text-dense"
+LABEL_TABLE = "table"
+LABEL_PHOTO = "photo"
+LABEL_BLANK = "blank"
+
+OCR_LABELS = (LABEL_TEXT, LABEL_TABLE)
+
+INK_LEVEL = 200  # gray level below which a pixel counts as ink
+LINE_LEVEL = 128  # gray level below which a pixel counts as part of a ruling line
+BLANK_MAX_INK = 0.005  # max share of ink pixels on a blank page
+BLANK_MAX_CHARS = 10  # max no. characters in the text layer of a blank page
+TEXT_MIN_CHARS = 200  # min no. characters in the text layer of a text page
+PHOTO_MIN_MIDTONES = 0.35  # min share of mid-tone pixels on a photo page
+PHOTO_MIN_SATURATION = 40  # min mean HSV saturation (0-255) on a photo page
+TABLE_MIN_ROW_LINES = 3  # min no. horizontal ruling lines on a table page
+TABLE_MIN_COL_LINES = 2  # min no. vertical ruling lines on a table page
+LINE_MIN_COVERAGE = 0.5  # min share of a row/column covered by ink to count as a ruling line
+
+
+def count_lines(profile: List[int], min_coverage: float = LINE_MIN_COVERAGE) -> int:
+    """
+    Count ruling lines in a projection profile
+
+    Parameters
+    ----------
+    profile : List[int]
+        Mean line-pixel intensity (0-255) of each row or column of a binarized page
+    min_coverage : float
+        Min share of the row or column covered by line pixels, by default LINE_MIN_COVERAGE
+
+    Returns
+    -------
+    int
+        Number of runs of adjacent rows or columns that are covered by line pixels
+    """
+    num_lines = 0
+    in_line = False
+    for value in profile:
+        is_line = value >= 255 * min_coverage
+        if is_line and not in_line:
+            num_lines += 1
+        in_line = is_line
+    return num_lines
+
+
+def get_page_features(image: Image.Image, text: str = "") -> Dict[str, float]:
+    """
+    Compute cheap visual and text-layer features of a rendered page
+
+    Parameters
+    ----------
+    image : Image.Image
+        Page rendered at a low resolution
+    text : str
+        Text extracted from the PDF text layer of the page, by default ""
+
+    Returns
+    -------
+    Dict[str, float]
+        Page features
+    """
+    gray = image.convert("L")
+    hist = gray.histogram()
+    num_pixels = max(sum(hist), 1)
+
+    # binarize so that ruling lines are white (255) and everything else is black (0)
+    lines = gray.point(lambda p: 255 if p < LINE_LEVEL else 0)
+    row_profile = list(lines.resize((1, lines.height), Image.Resampling.BOX).getdata())
+    col_profile = list(lines.resize((lines.width, 1), Image.Resampling.BOX).getdata())
+
+    return {
+        "ink": sum(hist[:INK_LEVEL]) / num_pixels,
+        "midtones": sum(hist[64:192]) / num_pixels,
+        "saturation": ImageStat.Stat(image.convert("HSV")).mean[1],
+        "num_chars": len(text.strip()),
+        "row_lines": count_lines(row_profile),
+        "col_lines": count_lines(col_profile),
+    }
+
+
+def classify_page(image: Image.Image, text: str = "") -> str:
+    """
+    Label a page as text-dense, table, photo or blank
+
+    Parameters
+    ----------
+    image : Image.Image
+        Page rendered at a low resolution
+    text : str
+        Text extracted from the PDF text layer of the page, by default ""
+
+    Returns
+    -------
+    str
+        Page label, one of [LABEL_TEXT, LABEL_TABLE, LABEL_PHOTO, LABEL_BLANK]
+    """
+    features = get_page_features(image, text)
+
+    if features["ink"] < BLANK_MAX_INK and features["num_chars"] < BLANK_MAX_CHARS:
+        return LABEL_BLANK
+
+    # photos are rich in mid-tones or colours and carry little selectable text
+    is_pictorial = (
+        features["midtones"] >= PHOTO_MIN_MIDTONES or features["saturation"] >= PHOTO_MIN_SATURATION
+    )
+    if is_pictorial and features["num_chars"] < TEXT_MIN_CHARS:
+        return LABEL_PHOTO
+
+    if features["row_lines"] >= TABLE_MIN_ROW_LINES and features["col_lines"] >= TABLE_MIN_COL_LINES:
+        return LABEL_TABLE
+
+    return LABEL_TEXT
+
+
+def write_pdf_subset(reader: PdfReader, page_numbers: List[int]) -> bytes:
+    """
+    Write selected pages of a PDF into a new PDF
+
+    Parameters
+    ----------
+    reader : PdfReader
+        Reader of the original PDF
+    page_numbers : List[int]
+        1-based numbers of the pages to keep
+
+    Returns
+    -------
+    bytes
+        Content of the new PDF
+    """
+    writer = PdfWriter()
+    for page_number in page_numbers:
+        writer.add_page(reader.pages[page_number - 1])
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
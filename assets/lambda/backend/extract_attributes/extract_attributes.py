@@ -17,11 +17,19 @@ import sys
 
 import boto3
 from botocore.config import Config
-from langchain import LLMChain
-from langchain_aws import ChatBedrock
-from model.bedrock import create_bedrock_client, get_model_params
-from model.parser import parse_json_string
-from prompt_summary import load_prompt_template
+from model.bedrock import create_bedrock_client
+from model.budget import MAX_CONTINUATIONS, estimate_output_tokens
+from model.cascade import CascadePolicy, run_cascade
+from model.checkpoint import Checkpoints, hash_bytes
+from model.converse import build_user_message, converse
+from model.deadline import Deadline, fits_text_call, plan_text_call
+from model.governor import Governor
+from model.hedging import EndpointSelector, HedgePolicy
+from model.parser import JsonParseError
+from model.retry_budget import RetryBudget, instrument, with_retry_budget
+from model.single_flight import SingleFlight, get_flight_key
+from model.structured import OUTPUT_MODE_COMPACT, OUTPUT_MODE_TEXT, parse_answer
+from prompt_summary import SUMMARY_ATTRIBUTES, get_document_inputs, load_prompt_template
 from utils import filled_prompt, token_count_tokenizer, truncate_document
 
 LOGGER = logging.Logger("ENTITY-EXTRACTION", level=logging.DEBUG)
@@ -34,104 +42,182 @@ LOGGER.addHandler(HANDLER)
 #       CONSTANTS
 #########################
 
-MAX_DOC_LENGTH_DIC = {
-    "anthropic.claude-3-opus-20240229-v1:0": 200_000,
-    "anthropic.claude-3-sonnet-20240229-v1:0": 200_000,
-    "anthropic.claude-3-haiku-20240307-v1:0": 200_000,
-    "anthropic.claude-v2:1": 200_000,
-    "anthropic.claude-v2": 100_000,
-    "anthropic.claude-instant-v1": 100_000,
-    "mistral.mistral-large-2402-v1:0": 32_000,
-    "mistral.mixtral-8x7b-instruct-v0:1": 32_000,
-    "mistral.mistral-7b-instruct-v0:2": 32_000,
-    "amazon.titan-text-premier-v1:0": 32_000,
-    "amazon.titan-text-express-v1": 8_000,
-    "amazon.titan-text-lite-v1": 4_000,
-    "meta.llama3-70b-instruct-v1:0": 8_000,
-    "meta.llama3-8b-instruct-v1:0": 8_000,
-    "meta.llama2-70b-chat-v1": 4_096,
-    "meta.llama2-13b-chat-v1": 4_096,
-    "cohere.command-r-plus-v1:0": 128_000,
-    "cohere.command-r-v1:0": 128_000,
-    "cohere.command-text-v14": 4_000,
-    "cohere.command-light-text-v14": 4_000,
-    "ai21.j2-ultra-v1": 8_191,
-    "ai21.j2-mid-v1,": 8_191,
-}
-
 GENERATOR_CONFIG = {
     "top_p": 1,  # cumulative probability of sampled tokens
-    "top_k": 50,  # number of the top most probable tokens to sample
     "stop_words": [],  # words after which the generation is stopped
     "max_tokens": 4_096,  # max tokens to be generated
 }
 
 BEDROCK_REGION = os.environ["BEDROCK_REGION"]
-BEDROCK_CONFIG = Config(connect_timeout=120, read_timeout=120, retries={"max_attempts": 5})
+# retries with backoff are done by model.converse
+BEDROCK_CONFIG = Config(connect_timeout=120, read_timeout=120, retries={"max_attempts": 1})
 BEDROCK_CLIENT = create_bedrock_client(BEDROCK_REGION, BEDROCK_CONFIG)
 
 S3_BUCKET = os.environ["BUCKET_NAME"]
-S3_CLIENT = boto3.client("s3")
 
 PREFIX_ATTRIBUTES = "attributes"
 
+# "text" for the JSON with all keys, "compact" for the values only, expanded into the keys by the Lambda
+SUMMARY_OUTPUT_MODE = os.environ.get("SUMMARY_OUTPUT_MODE", OUTPUT_MODE_TEXT)
+if SUMMARY_OUTPUT_MODE not in (OUTPUT_MODE_TEXT, OUTPUT_MODE_COMPACT):
+    raise ValueError(f"Unsupported summary output mode {SUMMARY_OUTPUT_MODE}")
+
+DEFAULT_MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+CASCADE_POLICY = CascadePolicy.from_env()
+# shared throughput budget of the Bedrock calls, None when disabled in config.yml
+GOVERNOR = Governor.from_env(BEDROCK_REGION)
+# duplicates slow calls to another region or equivalent model, the primary region reuses BEDROCK_CLIENT
+HEDGE_POLICY = HedgePolicy.from_env()
+ENDPOINT_SELECTOR = EndpointSelector(
+    HEDGE_POLICY,
+    lambda region, read_timeout: create_bedrock_client(region, BEDROCK_CONFIG, read_timeout),
+    clients={BEDROCK_REGION: BEDROCK_CLIENT},
+)
+# concurrent executions over the same extraction outputs share one model call, disabled unless enabled in config.yml
+SINGLE_FLIGHT = SingleFlight.from_env()
+
+
+def extract_with_model(
+    event,
+    model_id: str,
+    attributes: list,
+    usage: list,
+    deadline: Deadline,
+    retry_budget: RetryBudget,
+    checkpoints: Checkpoints,
+):
+    """
+    Summarize the documents into the attributes with one model
+
+    Parameters
+    ----------
+    event : dict
+        Lambda event with the outputs of the extraction steps
+    model_id : str
+        LLM model ID
+    attributes : list
+        Keys of the summary to be extracted
+    usage : list
+        Usage and latency of the call are appended to it
+    deadline : Deadline
+        Deadline of the invocation, bounding the client timeout and the retries
+    retry_budget : RetryBudget
+        Retry budget of the task, spent by the retries of the call
+    checkpoints : Checkpoints
+        Checkpoints of the extraction outputs, a retry of the execution reuses the answer of the model
+
+    Returns
+    -------
+    Tuple[Optional[dict], str]
+        Parsed answer, None if unparsable, and raw answer
+    """
+    # prepare prompt
+    prompt_template = load_prompt_template(event, output_mode=SUMMARY_OUTPUT_MODE, attributes=attributes)
+    prompt = prompt_template.format()
+    LOGGER.info(f"Prompt: {prompt}")
+
+    # a retry of the execution, e.g. after a later cascade tier failed, reuses the answer of this model
+    checkpoint_inputs = {"model_id": model_id, "attributes": attributes, "output_mode": SUMMARY_OUTPUT_MODE}
+    checkpoint = checkpoints.load("llm-answer", checkpoint_inputs, per_execution=True)
+    if checkpoint is not None:
+        raw_answer = checkpoint["raw_answer"]
+    else:
+
+        def answer() -> dict:
+            # right-sized output budget from the summary schema, a truncated answer is continued
+            max_tokens = estimate_output_tokens(
+                attributes, SUMMARY_OUTPUT_MODE, max_tokens=GENERATOR_CONFIG["max_tokens"]
+            )
+            LOGGER.info(f"Calling the LLM {model_id} to extract attributes with max {max_tokens} output tokens...")
+            result, endpoint = ENDPOINT_SELECTOR.call(
+                HEDGE_POLICY.get_endpoints(BEDROCK_REGION, model_id),
+                lambda endpoint, client: converse(
+                    client,
+                    endpoint.model_id,
+                    [build_user_message(prompt)],
+                    max_tokens=max_tokens,
+                    temperature=0,
+                    top_p=GENERATOR_CONFIG["top_p"],
+                    stop_sequences=GENERATOR_CONFIG["stop_words"],
+                    governor=GOVERNOR,
+                    deadline=deadline,
+                    max_continuations=MAX_CONTINUATIONS,
+                    retry_budget=retry_budget,
+                ),
+                is_valid=lambda result: bool(result.content),
+                deadline=deadline,
+            )
+            usage.append(dict(result.usage, region=endpoint.region))
+            return {"raw_answer": result.text}
+
+        flight_key = get_flight_key(checkpoints.document_hash, "llm-answer", checkpoint_inputs)
+        raw_answer = SINGLE_FLIGHT.run(flight_key, answer, deadline)[0]["raw_answer"]
+        LOGGER.info(f"LLM response: {raw_answer}")
+        checkpoints.save("llm-answer", {"raw_answer": raw_answer}, checkpoint_inputs, per_execution=True)
+
+    # parse response
+    try:
+        return parse_answer(raw_answer, SUMMARY_OUTPUT_MODE, attributes), raw_answer
+    except JsonParseError as e:
+        LOGGER.warning(f"Could not parse the answer of {model_id}, the raw answer is kept for re-parsing: {e}")
+        return None, raw_answer
+
 
 #########################
 #        HANDLER
 #########################
 
 
-def lambda_handler(event, context):  # noqa: C901
+@with_retry_budget("extract-entities")
+def lambda_handler(event, context, retry_budget: RetryBudget):
     """
-    Lambda handler
+    Lambda handler, failures are raised as RetryableError or NonRetryableError for the Retry of the task
     """
 
     LOGGER.debug(f"event: {event}")
-
-    # get model ID and params
-    GENERATOR_CONFIG["temperature"] = 0
-    model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
-
-    if model_id.split(".")[0] == "meta":
-        GENERATOR_CONFIG["max_tokens"] = 2048
-
-    model_params = get_model_params(model_id=model_id, params=GENERATOR_CONFIG)
-    LOGGER.info(f"LLM parameters: {model_id}; {model_params}")
-
-    # set up LLM
-    llm = ChatBedrock(
-        client=BEDROCK_CLIENT,
-        model_id=model_id,
-        model_kwargs=model_params,
+    deadline = Deadline.from_context(context)
+    # created per invocation, its retries are capped by the retry budget of the task and spent from it
+    s3 = instrument(boto3.client("s3", config=retry_budget.botocore_config()))
+    # the model answers are checkpointed per answers and texts of the documents, and per execution
+    document_hash = hash_bytes(json.dumps(get_document_inputs(event), sort_keys=True).encode())
+    checkpoints = Checkpoints.from_env(s3, S3_BUCKET, document_hash, event.get("execution_name"))
+
+    # a faster model rather than a timeout when the requested one does not fit in the remaining time
+    max_tokens = estimate_output_tokens(
+        SUMMARY_ATTRIBUTES, SUMMARY_OUTPUT_MODE, max_tokens=GENERATOR_CONFIG["max_tokens"]
     )
-
-    # prepare prompt template
-    prompt_template = load_prompt_template(event)
-    LOGGER.info(f"Prompt: {prompt_template}")
-
-    # run entity extraction
-    LOGGER.info(f"Calling the LLM {model_id} to extract attributes...")
-    llm_chain = LLMChain(llm=llm, prompt=prompt_template, verbose=False)
-    prompt_variables = {
-        "request": "Summarize the car accident with a narrative",
-    }
-    response = llm_chain.invoke(prompt_variables)
-    LOGGER.info(f"LLM response: {response}")
-
-    # parse response
-    try:
-        resp = response["text"]
-        resp_sub = resp[resp.index("```json\n{")+9:resp.index("}\n```")]
-        response_json = "{" + resp_sub + "}"
-    except Exception as e:
-        LOGGER.debug(f"Error parsing response: {e}")
-        response_json = {}
+    model_id = plan_text_call(deadline, DEFAULT_MODEL_ID, max_tokens)
+
+    # cheap-first cascade when enabled: only the attributes failing validation are re-asked to the next model,
+    # the tiers too slow for the remaining time are dropped
+    tiers = CASCADE_POLICY.get_tiers(model_id, lambda tier: fits_text_call(deadline, tier, max_tokens))
+    LOGGER.info(f"Model tiers: {tiers}")
+    usage = []
+    cascade = run_cascade(
+        lambda tier_model_id, attributes: extract_with_model(
+            event, tier_model_id, attributes, usage, deadline, retry_budget, checkpoints
+        ),
+        tiers,
+        SUMMARY_ATTRIBUTES,
+        CASCADE_POLICY,
+        deadline,
+    )
+    response_json = cascade.answer if cascade.parsed else {}
+    parse_error = None if cascade.parsed else "No JSON object found in the answer"
     LOGGER.info(f"Parsed response: {response_json}")
+    LOGGER.info(f"Fields per model: {cascade.field_tiers}")
 
     json_data = json.dumps(
         {
             "answer": response_json,
-            "raw_answer": response["text"]
+            "raw_answer": cascade.raw_answer,
+            "parse_error": parse_error,
+            "field_tiers": cascade.field_tiers,
+            "cascade": [{key: step[key] for key in ("model_id", "attributes", "invalid")} for step in cascade.steps],
+            "usage": usage,
+            "degradations": deadline.degradations,
+            "retries": dict(retry_budget.spent),
+            "resumed": checkpoints.resumed,
         }
     )
 
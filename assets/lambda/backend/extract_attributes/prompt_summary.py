@@ -3,10 +3,14 @@ File content:
     Prompting utils
 """
 
+import json
+from typing import List, Optional
+
 from langchain import PromptTemplate
-import re
+from model.parser import JsonParseError, parse_json_string
+from model.structured import OUTPUT_MODE_COMPACT, build_compact_instructions
 
-PROMPT_DEFAULT_HEADER = """You are an AI assistant who is expert of processing car accident insurance claims. Carefully read the document given below in <document><json></json></document> tags in. Your task is analyzing the documents and extract valuable information to facilitate the claim process. Your goal is to provide a concise summary in JSON format, focusing on four main aspects: car owner information, aggregated car damage details, estimated part cost to fix the car damages and final summarization.
+PROMPT_SUMMARY_TASK = """You are an AI assistant who is expert of processing car accident insurance claims. Carefully read the document given below in <document><json></json></document> tags in. Your task is analyzing the documents and extract valuable information to facilitate the claim process. Your goal is to provide a concise summary in JSON format, focusing on four main aspects: car owner information, aggregated car damage details, estimated part cost to fix the car damages and final summarization.
 
   1. **Car Owner Information**: Extract relevant details about the car ownerand car details, including their contact information and insurance policy details.
   2. **Aggregated Car Damage Parts**:Identify and summarize the damage to the vehicles involved in the accident from multiple photos. Aggregate the damage information from each photo into a unified summary, highlighting all affected parts and the extent of the damage.
@@ -15,33 +19,49 @@ PROMPT_DEFAULT_HEADER = """You are an AI assistant who is expert of processing c
  
   Ensure that the extracted data is concentrated on car damage and evidence, omitting any unnecessary comments or information. Your summary should be clear, concise, and structured to facilitate a fair assessment of the accident and streamline the claims process.
 
-  Format the output as JSON of attributes: 
-  <json>
-    {{
-        "PoliceReportNumber": "",
-        "DateOfIncident": "",
-        "LocationOfIncident": "",
-        "GuiltyCarOwnerName": "",
-        "GuiltyCarOwnerInsurancePolicy": "",
-        "GuiltyCarOwnerDamageDetails": "",
-        "GuiltyCarOwnerEstimatedRepairCost": "",
-        "GuiltyCarOwnerFinalClaimSummary": "",
-        "GuiltyPartyLicensePlateNumber": "",
-        "GuiltyPartyVehicleMakeAndModel": "",
-        "GuiltyPartyInjuries": "",
-        "GuiltyPartyNarrative": "",
-        "VictimCarOwnerInsurancePolicy": "",
-        "VictimCarOwnerDamageDetails": "",
-        "VictimCarOwnerEstimatedRepairCost": "",
-        "VictimCarOwnerFinalClaimSummary": "",
-        "VictimPartyLicensePlateNumber": "",
-        "VictimPartyVehicleMakeAndModel": "",
-        "VictimPartyInjuries": "",
-        "VictimPartyNarrative": "",
-    }}
-    </json>
-  Document:
-"""  
+"""
+
+PROMPT_DOCUMENT_LABEL = """  Document:
+"""
+
+SUMMARY_ATTRIBUTES = [
+    "PoliceReportNumber",
+    "DateOfIncident",
+    "LocationOfIncident",
+    "GuiltyCarOwnerName",
+    "GuiltyCarOwnerInsurancePolicy",
+    "GuiltyCarOwnerDamageDetails",
+    "GuiltyCarOwnerEstimatedRepairCost",
+    "GuiltyCarOwnerFinalClaimSummary",
+    "GuiltyPartyLicensePlateNumber",
+    "GuiltyPartyVehicleMakeAndModel",
+    "GuiltyPartyInjuries",
+    "GuiltyPartyNarrative",
+    "VictimCarOwnerInsurancePolicy",
+    "VictimCarOwnerDamageDetails",
+    "VictimCarOwnerEstimatedRepairCost",
+    "VictimCarOwnerFinalClaimSummary",
+    "VictimPartyLicensePlateNumber",
+    "VictimPartyVehicleMakeAndModel",
+    "VictimPartyInjuries",
+    "VictimPartyNarrative",
+]
+
+
+def format_output_json(attributes: List[str]) -> str:
+    """
+    Output format listing the keys of the JSON answer, braces are doubled for the prompt template
+    """
+    keys = "".join(f'        "{name}": "",\n' for name in attributes)
+    return f"  Format the output as JSON of attributes: \n  <json>\n    {{{{\n{keys}    }}}}\n    </json>\n"
+
+
+def format_output_compact(attributes: List[str]) -> str:
+    """
+    Output format of a compact positional answer, expanded into the attributes by the Lambda
+    """
+    return "  " + build_compact_instructions(attributes) + "\n"
+
 
 PROMPT_JSON_DOC = """
 <document>
@@ -56,7 +76,21 @@ output:
 """
 
 
-def load_prompt_template(event) -> PromptTemplate:
+def get_document_inputs(event) -> List[dict]:
+    """
+    Fields of the extraction outputs the prompt is built from, without the usage, retries and other fields of the
+    execution that produced them
+    """
+    inputs = []
+    for doc in event["body"]:
+        fields = {key: doc.get(key) for key in ("original_file_name", "answer", "raw_answer", "content")}
+        if "llm_answer" in doc:
+            fields["llm_answer"] = doc["llm_answer"].get("content")
+        inputs.append(fields)
+    return inputs
+
+
+def load_prompt_template(event, output_mode: str = "text", attributes: Optional[List[str]] = None) -> PromptTemplate:
     """
     Creates LangChain prompt
 
@@ -64,6 +98,10 @@ def load_prompt_template(event) -> PromptTemplate:
     ----------
     event : json, 
         with output from extraction step lambda functions
+    output_mode : str, optional
+        "text" for the JSON with all keys, "compact" for the values only, by default "text"
+    attributes : List[str], optional
+        Keys of the answer, by default all SUMMARY_ATTRIBUTES, a subset when re-asked by the cascade
 
     Returns
     -------
@@ -72,17 +110,27 @@ def load_prompt_template(event) -> PromptTemplate:
     """
 
     # prepare the prompt
-    prompt = PROMPT_DEFAULT_HEADER
+    attributes = attributes or SUMMARY_ATTRIBUTES
+    if output_mode == OUTPUT_MODE_COMPACT:
+        output_format = format_output_compact(attributes)
+    else:
+        output_format = format_output_json(attributes)
+    prompt = PROMPT_SUMMARY_TASK + output_format + PROMPT_DOCUMENT_LABEL
     for doc in event['body']:
         if 'llm_answer' in doc: # the document is an audio file
             prompt += PROMPT_JSON_DOC.format(json_doc_placeholder="Victim Narrative: " + doc['llm_answer']['content'])
         if 'original_file_name' in doc:
             print(f"the doc is: {doc}")
-            if 'raw_answer' in doc and doc['raw_answer']: # should be present from the image file
-                ans = doc['raw_answer']
-                substr = ans[ans.index("<json>")+7:ans.index("</json>")]
-                substr = substr.replace("\n", "")
-                prom = "{" + substr + "}"
+            if doc.get('answer') and isinstance(doc['answer'], dict): # parsed by the image Lambda
+                prom = json.dumps(doc['answer'], ensure_ascii=False)
+                prom = prom.replace("{", "{{").replace("}", "}}")  # literal braces in the prompt template
+                prompt += PROMPT_JSON_DOC.format(json_doc_placeholder=prom)
+            elif 'raw_answer' in doc and doc['raw_answer']: # should be present from the image file
+                try:
+                    prom = json.dumps(parse_json_string(doc['raw_answer']), ensure_ascii=False)
+                except JsonParseError:
+                    prom = doc['raw_answer']
+                prom = prom.replace("{", "{{").replace("}", "}}")  # literal braces in the prompt template
                 prompt += PROMPT_JSON_DOC.format(json_doc_placeholder=prom)
             # if 'answer' in doc and doc['answer']:
             #     ans = doc['answer']
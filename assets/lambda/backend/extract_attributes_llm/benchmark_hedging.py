@@ -0,0 +1,104 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Benchmark of hedged calls against fake Bedrock endpoints with injected tail latency
+
+Usage:
+    python benchmark_hedging.py [--calls 300] [--median-ms 50] [--tail-ms 1000] [--tail-rate 0.03]
+"""
+
+import argparse
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from model.converse import build_user_message, converse
+from model.hedging import EndpointSelector, HedgePolicy
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+
+
+class FakeBedrockClient:
+    """
+    Bedrock runtime client answering the Converse API after a random latency, slow with probability tail_rate
+    """
+
+    def __init__(self, region: str, median_s: float, tail_s: float, tail_rate: float, seed: int = 0):
+        self.meta = SimpleNamespace(region_name=region)
+        self.calls = 0
+        self._median_s, self._tail_s, self._tail_rate = median_s, tail_s, tail_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def converse(self, **request):
+        with self._lock:
+            self.calls += 1
+            slow = self._random.random() < self._tail_rate
+            latency = self._tail_s if slow else self._median_s * self._random.lognormvariate(0, 0.25)
+        time.sleep(latency)
+        return {
+            "output": {"message": {"role": "assistant", "content": [{"text": '{"answer": "42"}'}]}},
+            "stopReason": "end_turn",
+            "usage": {"inputTokens": 100, "outputTokens": 10},
+            "metrics": {"latencyMs": int(latency * 1000)},
+        }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[max(0, round(p / 100 * len(values)) - 1)]
+
+
+def run(policy: HedgePolicy, clients: dict, calls: int):
+    selector = EndpointSelector(policy, lambda region, read_timeout: clients[region], clients=clients)
+    endpoints = policy.get_endpoints("us-east-1", MODEL_ID)
+    messages = [build_user_message("Extract the answer")]
+    latencies, winners = [], {}
+    for _ in range(calls):
+        start = time.perf_counter()
+        _, endpoint = selector.call(
+            endpoints,
+            lambda endpoint, client: converse(client, endpoint.model_id, messages, max_tokens=100),
+            is_valid=lambda result: bool(result.content),
+        )
+        latencies.append(time.perf_counter() - start)
+        winners[str(endpoint)] = winners.get(str(endpoint), 0) + 1
+    return latencies, winners
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Bedrock tail latency with and without hedging")
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--median-ms", type=float, default=50)
+    parser.add_argument("--tail-ms", type=float, default=1_000)
+    parser.add_argument("--tail-rate", type=float, default=0.03, help="should stay below 1 - percentile")
+    parser.add_argument("--percentile", type=float, default=95)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'calls sent':>11}  answered by")
+    for enabled in (False, True):
+        clients = {
+            region: FakeBedrockClient(region, args.median_ms / 1000, args.tail_ms / 1000, args.tail_rate, seed)
+            for seed, region in enumerate(["us-east-1", "us-west-2"])
+        }
+        policy = HedgePolicy(
+            enabled=enabled,
+            percentile=args.percentile,
+            default_delay_s=4 * args.median_ms / 1000,
+            min_delay_s=0.0,
+            secondary_regions=["us-west-2"],
+        )
+        latencies, winners = run(policy, clients, args.calls)
+        sent = sum(client.calls for client in clients.values())
+        print(
+            f"{'hedged' if enabled else 'single':<8} {percentile(latencies, 50) * 1000:>9.0f} "
+            f"{percentile(latencies, 95) * 1000:>9.0f} {percentile(latencies, 99) * 1000:>9.0f} {sent:>11}  {winners}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Benchmark of the PDF renderers on the sample documents
+
+Usage:
+    python benchmark_renderers.py [PDF ...] [--dpi 200] [--runs 3]
+"""
+
+import argparse
+import glob
+import multiprocessing
+import os
+import resource
+import time
+
+from renderer import RENDERERS
+
+SAMPLE_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "sample_data")
+
+
+def run_renderer(renderer_name, file_paths, dpi, runs, queue):
+    """
+    Render all files in a fresh process so that peak RSS is not shared between renderers
+    """
+    renderer = RENDERERS[renderer_name]()
+    num_pages = 0
+    start = time.perf_counter()
+    try:
+        for _ in range(runs):
+            for file_path in file_paths:
+                num_pages += sum(1 for _ in renderer.render(file_path, dpi=dpi))
+    except Exception as e:
+        queue.put(e)
+        return
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KB on Linux, children covers the pdftoppm subprocesses
+    peak_rss_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    peak_rss_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    queue.put((num_pages, elapsed, peak_rss_self, peak_rss_children))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare PDF renderers")
+    parser.add_argument("files", nargs="*", help="PDF files, by default the PDFs in sample_data")
+    parser.add_argument("--dpi", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    file_paths = args.files or sorted(glob.glob(os.path.join(SAMPLE_DATA_DIR, "*.pdf")))
+    print(f"Rendering {len(file_paths)} files at {args.dpi} DPI, {args.runs} runs")
+    print(f"{'renderer':<10} {'pages':>6} {'pages/s':>8} {'peak RSS (MB)':>14} {'children RSS (MB)':>18}")
+
+    ctx = multiprocessing.get_context("spawn")
+    for renderer_name in RENDERERS:
+        queue = ctx.Queue()
+        process = ctx.Process(target=run_renderer, args=(renderer_name, file_paths, args.dpi, args.runs, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if isinstance(result, Exception):
+            print(f"{renderer_name:<10} failed: {result}")
+            continue
+        num_pages, elapsed, peak_rss_self, peak_rss_children = result
+        print(
+            f"{renderer_name:<10} {num_pages:>6} {num_pages / elapsed:>8.2f} "
+            f"{peak_rss_self:>14.1f} {peak_rss_children:>18.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
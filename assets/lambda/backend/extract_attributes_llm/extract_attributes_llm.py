@@ -13,16 +13,36 @@ This is AWS Content subject to the terms of the Customer Agreement
 import json
 import logging
 import os
+import resource
 import sys
 
 import boto3
 from botocore.config import Config
-from helpers import create_human_message_with_imgs
-from langchain_core.messages import SystemMessage
+from helpers import create_human_message_with_imgs, read_s3_object
+from model.attribute_cache import AttributeCache, run_incremental
 from model.bedrock import create_bedrock_client
+from model.budget import MAX_CONTINUATIONS, estimate_output_tokens
+from model.cascade import CascadePolicy, run_cascade
+from model.checkpoint import Checkpoints, hash_bytes
+from model.converse import converse
+from model.deadline import Deadline, fits_vision_call, plan_vision_call
+from model.governor import Governor
+from model.hedging import EndpointSelector, HedgePolicy
 from model.params import BedrockParams, ModelSpecificParams
-from model.parser import parse_json_string
-from prompt import SYSTEM_PROMPT, load_prompt_template
+from model.parser import JsonParseError
+from model.retry_budget import RetryBudget, instrument, with_retry_budget
+from model.single_flight import SingleFlight, get_flight_key
+from model.structured import (
+    OUTPUT_MODE_COMPACT,
+    OUTPUT_MODE_TEXT,
+    OUTPUT_MODE_TOOL,
+    build_tool_config,
+    get_raw_answer,
+    parse_answer,
+    resolve_output_mode,
+    supports_tool_use,
+)
+from prompt import format_attributes, get_system_prompt, load_prompt_template
 from utils import filled_prompt  # token_count_tokenizer, truncate_document
 
 LOGGER = logging.Logger("ENTITY-EXTRACTION-MULTIMODAL", level=logging.DEBUG)
@@ -35,31 +55,6 @@ LOGGER.addHandler(HANDLER)
 #       CONSTANTS
 #########################
 
-MAX_DOC_LENGTH_DIC = {
-    "anthropic.claude-3-opus-20240229-v1:0": 200_000,
-    "anthropic.claude-3-sonnet-20240229-v1:0": 200_000,
-    "anthropic.claude-3-haiku-20240307-v1:0": 200_000,
-    "anthropic.claude-v2:1": 200_000,
-    "anthropic.claude-v2": 100_000,
-    "anthropic.claude-instant-v1": 100_000,
-    "mistral.mistral-large-2402-v1:0": 32_000,
-    "mistral.mixtral-8x7b-instruct-v0:1": 32_000,
-    "mistral.mistral-7b-instruct-v0:2": 32_000,
-    "amazon.titan-text-premier-v1:0": 32_000,
-    "amazon.titan-text-express-v1": 8_000,
-    "amazon.titan-text-lite-v1": 4_000,
-    "meta.llama3-70b-instruct-v1:0": 8_000,
-    "meta.llama3-8b-instruct-v1:0": 8_000,
-    "meta.llama2-70b-chat-v1": 4_096,
-    "meta.llama2-13b-chat-v1": 4_096,
-    "cohere.command-r-plus-v1:0": 128_000,
-    "cohere.command-r-v1:0": 128_000,
-    "cohere.command-text-v14": 4_000,
-    "cohere.command-light-text-v14": 4_000,
-    "ai21.j2-ultra-v1": 8_191,
-    "ai21.j2-mid-v1,": 8_191,
-}
-
 GENERATOR_CONFIG = {
     "top_p": 1,  # cumulative probability of sampled tokens
     "top_k": 50,  # number of the top most probable tokens to sample
@@ -68,21 +63,163 @@ GENERATOR_CONFIG = {
 }
 
 BEDROCK_REGION = os.environ["BEDROCK_REGION"]
-BEDROCK_CONFIG = Config(connect_timeout=120, read_timeout=120, retries={"max_attempts": 5})
+# retries with backoff are done by model.converse
+BEDROCK_CONFIG = Config(connect_timeout=120, read_timeout=120, retries={"max_attempts": 1})
 BEDROCK_CLIENT = create_bedrock_client(BEDROCK_REGION, BEDROCK_CONFIG)
 
 S3_BUCKET = os.environ["BUCKET_NAME"]
-S3_CLIENT = boto3.client("s3")
 
 PREFIX_ATTRIBUTES = "attributes"
 
+CASCADE_POLICY = CascadePolicy.from_env()
+# shared throughput budget of the Bedrock calls, None when disabled in config.yml
+GOVERNOR = Governor.from_env(BEDROCK_REGION)
+# duplicates slow calls to another region or equivalent model, the primary region reuses BEDROCK_CLIENT
+HEDGE_POLICY = HedgePolicy.from_env()
+ENDPOINT_SELECTOR = EndpointSelector(
+    HEDGE_POLICY,
+    lambda region, read_timeout: create_bedrock_client(region, BEDROCK_CONFIG, read_timeout),
+    clients={BEDROCK_REGION: BEDROCK_CLIENT},
+)
+# concurrent executions of the same document share one model call, disabled unless enabled in config.yml
+SINGLE_FLIGHT = SingleFlight.from_env()
+
+
+def extract_with_model(
+    model_id: str,
+    attributes: list,
+    human_message: dict,
+    inference_params: BedrockParams,
+    output_mode: str,
+    thinking: bool,
+    usage: list,
+    deadline: Deadline,
+    retry_budget: RetryBudget,
+    checkpoints: Checkpoints,
+):
+    """
+    Extract the attributes with one model
+
+    Parameters
+    ----------
+    model_id : str
+        LLM model ID
+    attributes : list
+        Attributes to be extracted, listed in the prompt and in the tool schema; empty for a free-form answer
+    human_message : dict
+        Converse API user message with the document
+    inference_params : BedrockParams
+        Inference parameters
+    output_mode : str
+        Requested output mode, falls back to what the model supports
+    thinking : bool
+        Whether the model summarizes its thoughts before the answer
+    usage : list
+        Usage and latency of the call are appended to it
+    deadline : Deadline
+        Deadline of the invocation, bounding the client timeout and the retries
+    retry_budget : RetryBudget
+        Retry budget of the task, spent by the retries of the calls
+    checkpoints : Checkpoints
+        Checkpoints of the document, a retry of the execution reuses the answer of the model
+
+    Returns
+    -------
+    Tuple[Optional[dict], str]
+        Parsed answer, None if unparsable, and raw answer
+    """
+    # structured output: tool use constrained by the attributes schema where supported, optionally compact
+    output_mode = resolve_output_mode(output_mode, model_id, attributes)
+    tool_config = None
+    if output_mode != OUTPUT_MODE_TEXT and supports_tool_use(model_id):
+        tool_config = build_tool_config(attributes, compact=output_mode == OUTPUT_MODE_COMPACT)
+        system_prompt = get_system_prompt(OUTPUT_MODE_TOOL)
+    else:
+        system_prompt = get_system_prompt(output_mode, thinking, attributes)
+    LOGGER.info(f"Output mode: {output_mode}, thinking: {thinking}, tool use: {tool_config is not None}")
+
+    if attributes:
+        human_message = {
+            "role": human_message["role"],
+            "content": human_message["content"] + [{"text": format_attributes(attributes)}],
+        }
+
+    # right-sized output budget: Bedrock reserves max_tokens of the quota, a truncated text answer is continued
+    max_tokens = estimate_output_tokens(
+        attributes, output_mode, thinking and tool_config is None, max_tokens=inference_params.max_tokens
+    )
+    LOGGER.info(f"Calling LLM {model_id} with max {max_tokens} output tokens")
+
+    def call(call_max_tokens: int):
+        result, endpoint = ENDPOINT_SELECTOR.call(
+            HEDGE_POLICY.get_endpoints(BEDROCK_REGION, model_id),
+            lambda endpoint, client: converse(
+                client,
+                endpoint.model_id,
+                [human_message],
+                system=system_prompt,
+                max_tokens=call_max_tokens,
+                temperature=inference_params.temperature,
+                top_p=inference_params.top_p,
+                stop_sequences=inference_params.stop_sequences,
+                tool_config=tool_config,
+                governor=GOVERNOR,
+                deadline=deadline,
+                max_continuations=MAX_CONTINUATIONS,
+                retry_budget=retry_budget,
+            ),
+            is_valid=lambda result: bool(result.content),
+            deadline=deadline,
+        )
+        usage.append(dict(result.usage, region=endpoint.region))
+        return result
+
+    # a retry of the execution, e.g. after a later cascade tier failed, reuses the answer of this model
+    checkpoint_inputs = {
+        "model_id": model_id,
+        "attributes": attributes,
+        "output_mode": output_mode,
+        "thinking": thinking,
+        "max_tokens": inference_params.max_tokens,
+        "temperature": inference_params.temperature,
+        "images": sum("image" in block for block in human_message["content"]),
+    }
+    checkpoint = checkpoints.load("llm-answer", checkpoint_inputs, per_execution=True)
+    if checkpoint is not None:
+        raw_answer = checkpoint["raw_answer"]
+    else:
+
+        def answer() -> dict:
+            result = call(max_tokens)
+            truncated = result.stop_reason == "max_tokens" and max_tokens < inference_params.max_tokens
+            if truncated and tool_config is not None:
+                # a tool call cannot be continued, it is re-asked once with the requested answer length
+                LOGGER.warning(f"Tool input of {model_id} truncated at {max_tokens} tokens, re-asking")
+                result = call(inference_params.max_tokens)
+            return {"raw_answer": get_raw_answer(result.content)}
+
+        flight_key = get_flight_key(checkpoints.document_hash, "llm-answer", checkpoint_inputs)
+        raw_answer = SINGLE_FLIGHT.run(flight_key, answer, deadline)[0]["raw_answer"]
+        checkpoints.save("llm-answer", {"raw_answer": raw_answer}, checkpoint_inputs, per_execution=True)
+
+    try:
+        return parse_answer(raw_answer, output_mode, attributes), raw_answer
+    except JsonParseError as e:
+        LOGGER.warning(f"Could not parse the answer of {model_id}, the raw answer is kept for re-parsing: {e}")
+        return None, raw_answer
+
 
-def lambda_handler(event, context):
+@with_retry_budget("extract-attributes-llm")
+def lambda_handler(event, context, retry_budget: RetryBudget):
     """
-    Lambda handler
+    Lambda handler, failures are raised as RetryableError or NonRetryableError for the Retry of the task
     """
 
     LOGGER.debug(f"event: {event}")
+    deadline = Deadline.from_context(context)
+    # created per invocation, its retries are capped by the retry budget of the task and spent from it
+    s3 = instrument(boto3.client("s3", config=retry_budget.botocore_config()))
+    start_max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
 
     # parse event
     if "requestContext" in event:
@@ -96,9 +233,6 @@ def lambda_handler(event, context):
     GENERATOR_CONFIG["temperature"] = body["model_params"]["temperature"]
     model_id = body["model_params"]["model_id"]
 
-    if model_id.split(".")[0] == "meta":
-        GENERATOR_CONFIG["max_tokens"] = 2048
-
     file_key = body.get("file_name")
     client_id = body.get("client_id")
     # attributes = body["attributes"]
@@ -109,25 +243,17 @@ def lambda_handler(event, context):
     # get fixed model params
     model_id = body["model_params"]["model_id"]
 
-    # import Bedrock model class
-    if model_id.startswith("cohere") or model_id.startswith("ai21"):
-        from langchain_community.llms.bedrock import Bedrock
-    else:
-        from langchain_community.chat_models import BedrockChat as Bedrock
-
     fixed_params = {"STOP_WORDS": ["\n\nuser:"], "TOP_P": 0.95}
 
     # load variable model params
 
-    model_params = ModelSpecificParams(
-        model_id=model_id,
-        params=BedrockParams(
-            max_tokens=body["model_params"].get("answer_length", 1024),
-            stop_sequences=fixed_params["STOP_WORDS"],
-            temperature=body["model_params"]["temperature"],
-            top_p=fixed_params["TOP_P"],
-        ),
+    inference_params = BedrockParams(
+        max_tokens=body["model_params"].get("answer_length", 1024),
+        stop_sequences=fixed_params["STOP_WORDS"],
+        temperature=body["model_params"]["temperature"],
+        top_p=fixed_params["TOP_P"],
     )
+    model_params = ModelSpecificParams(model_id=model_id, params=inference_params)
 
     LOGGER.info(f"MODEL_PARAMS: {model_params.to_dict()}")
 
@@ -141,24 +267,18 @@ def lambda_handler(event, context):
         template=prompt_template.template,
     )
 
-    messages = [SystemMessage(content=SYSTEM_PROMPT)]
+    deadline.check("reading the document")
+    # read file from S3 straight into memory if s3_location is given
+    files = []
+    if file_key:
+        files = [(file_key, read_s3_object(s3, S3_BUCKET, file_key))]
+        LOGGER.info(f"Read {len(files[0][1])} bytes from {file_key}")
 
-    LOGGER.info("Using Bedrock LLM.")
-    llm = Bedrock(
-        client=BEDROCK_CLIENT,
-        model_id=model_id,
-        model_kwargs=model_params.to_dict(),
-        streaming=True if not model_id.startswith("ai21") else False,
+    # the model answers are checkpointed per document content and execution
+    checkpoints = Checkpoints.from_env(
+        s3, S3_BUCKET, hash_bytes(*[file_bytes for _, file_bytes in files]), event.get("execution_name")
     )
 
-    # load file to local lambda storage if s3_location is given:
-    if file_key:
-        file_key_s3 = file_key
-        ending = file_key_s3.split(".")[-1]
-        S3_CLIENT.download_file(S3_BUCKET, file_key_s3, f"/tmp/file.{ending}")
-        file = f"/tmp/file.{ending}"
-        LOGGER.info(f"Downloaded file to /tmp/file.{ending}")
-
     # ============= FEW SHOTS LOGIC: yet to be added ============
     # if client_id:
     #     LOGGER.info("Adding few-shot example for the client_id")
@@ -169,28 +289,90 @@ def lambda_handler(event, context):
     #     messages.extend(example_messages)
 
     # read example
-    human_message = create_human_message_with_imgs(filled_template, file, max_pages=20)
-    messages.append(human_message)
-    LOGGER.info("Calling LLM")
-    response = llm.invoke(messages)
+    # fit the call in the remaining time: smaller images, fewer pages or a faster model rather than a timeout
+    max_pages = min(len(files), 20) if len(files) > 1 else 20  # a single file may be a PDF of any length
+    plan = plan_vision_call(deadline, model_id, max_pages, inference_params.max_tokens)
+    model_id = plan.model_id
+    human_message, skipped_pages = create_human_message_with_imgs(
+        filled_template, files, max_pages=plan.max_pages, max_image_side=plan.max_image_side
+    )
+    LOGGER.info(f"Skipped pages: {skipped_pages}")
+    del files  # release the source document, the message only holds the kept page images
+
+    # cheap-first cascade when enabled: only the attributes failing validation are re-asked to the next model,
+    # the tiers too slow for the planned pages and images are dropped
+    attributes = body.get("attributes") or []
+    output_mode = body["model_params"].get("output_mode", OUTPUT_MODE_TEXT)
+    thinking = body["model_params"].get("thinking", True)
+    tiers = CASCADE_POLICY.get_tiers(
+        model_id, lambda tier: fits_vision_call(deadline, tier, plan, inference_params.max_tokens)
+    )
+    LOGGER.info(f"Model tiers: {tiers}")
+    usage = []
+    # schema iteration: only the attributes without a cached value for the document and these parameters are asked
+    attribute_cache = AttributeCache(
+        checkpoints,
+        {
+            "tiers": tiers,
+            "output_mode": output_mode,
+            "thinking": thinking,
+            "max_tokens": inference_params.max_tokens,
+            "temperature": inference_params.temperature,
+            "images": sum("image" in block for block in human_message["content"]),
+            "max_image_side": plan.max_image_side,
+        },
+    )
+    cascade = run_incremental(
+        lambda pending_attributes: run_cascade(
+            lambda tier_model_id, tier_attributes: extract_with_model(
+                tier_model_id,
+                tier_attributes,
+                human_message,
+                inference_params,
+                output_mode,
+                thinking,
+                usage,
+                deadline,
+                retry_budget,
+                checkpoints,
+            ),
+            tiers,
+            pending_attributes,
+            CASCADE_POLICY,
+            deadline,
+        ),
+        attributes,
+        attribute_cache,
+    )
 
-    try:
-        response_json = parse_json_string(response.content)
-    except Exception as e:
-        LOGGER.debug(f"Error parsing response: {e}")
-        response_json = {}
+    # ru_maxrss is in KB on Linux and only grows over the lifetime of a warm execution environment
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    LOGGER.info(f"Peak memory: {max_rss / 1024:.1f} MB (+{(max_rss - start_max_rss) / 1024:.1f} MB in this request)")
+
+    response_json = cascade.answer if cascade.parsed else {}
+    parse_error = None if cascade.parsed else "No JSON object found in the answer"
     LOGGER.info(f"Parsed response: {response_json}")
+    LOGGER.info(f"Fields per model: {cascade.field_tiers}")
 
     json_data = json.dumps(
         {
             "answer": response_json,
-            "raw_answer": response.content,
+            "raw_answer": cascade.raw_answer,
+            "parse_error": parse_error,
+            "field_tiers": cascade.field_tiers,
+            "cascade": [{key: step[key] for key in ("model_id", "attributes", "invalid")} for step in cascade.steps],
+            "usage": usage,
+            "degradations": deadline.degradations,
+            "retries": dict(retry_budget.spent),
+            "resumed": checkpoints.resumed,
+            "reused_attributes": cascade.reused,
             "file_key": body["file_name"],
             "original_file_name": body["file_name"],
+            "skipped_pages": skipped_pages,
         }
     )
 
-    S3_CLIENT.put_object(
+    s3.put_object(
         Body=json_data,
         Bucket=S3_BUCKET,
         Key=f"{PREFIX_ATTRIBUTES}/{body['file_name'].split('/', 1)[-1].removesuffix('.txt')}.json",
@@ -0,0 +1,192 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Model cascade: cheap-first extraction, only invalid attributes are re-asked to a stronger model
+"""
+
+import json
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from model.deadline import MIN_CALL_TIMEOUT_S
+from model.structured import Attribute, get_attribute_names
+
+# values treated as "not extracted", compared case-insensitively
+PLACEHOLDER_VALUES = {
+    "",
+    "unknown",
+    "n/a",
+    "na",
+    "none",
+    "null",
+    "not available",
+    "not provided",
+    "not mentioned",
+    "not specified",
+}
+
+# extraction of one tier: model ID and attributes to extract -> parsed answer (None if unparsable) and raw answer
+ExtractFn = Callable[[str, List[Attribute]], Tuple[Optional[Dict[str, Any]], str]]
+
+
+@dataclass
+class CascadePolicy:
+    """
+    Cascade configuration, see the cascade section of config.yml
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether extraction runs through the cascade, otherwise the requested model is used alone
+    model_ids : List[str]
+        Models from the fastest to the strongest, they replace the requested model when the cascade is enabled
+    patterns : Dict[str, str]
+        Regular expressions that the value of an attribute must fully match to be accepted
+    """
+
+    enabled: bool = False
+    model_ids: List[str] = field(default_factory=list)
+    patterns: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls, variable: str = "CASCADE_POLICY") -> "CascadePolicy":
+        config = json.loads(os.environ.get(variable) or "{}")
+        return cls(
+            enabled=bool(config.get("enabled", False)) and bool(config.get("model_ids")),
+            model_ids=list(config.get("model_ids") or []),
+            patterns=dict(config.get("patterns") or {}),
+        )
+
+    def get_tiers(self, model_id: str, fits: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """
+        Models of an extraction, from the fastest to the strongest
+
+        Parameters
+        ----------
+        model_id : str
+            Model planned for the call, e.g. the faster model chosen by the deadline planner
+        fits : Callable[[str], bool], optional
+            Whether a call to a model fits in the remaining time, the tiers that do not are dropped
+
+        Returns
+        -------
+        List[str]
+            Tiers of the cascade that fit, else the planned model alone
+        """
+        if not self.enabled:
+            return [model_id]
+        tiers = [tier for tier in self.model_ids if fits is None or fits(tier)]
+        return tiers or [model_id]
+
+    def is_valid(self, name: str, value: Any) -> bool:
+        """
+        Whether an extracted value is acceptable: present, not a placeholder and matching its pattern, if any
+        """
+        if value is None:
+            return False
+        if isinstance(value, (list, dict)):
+            return any(self.is_valid(name, item) for item in (value.values() if isinstance(value, dict) else value))
+        text = str(value).strip()
+        if text.lower() in PLACEHOLDER_VALUES or (text.startswith("<") and text.endswith(">")):
+            return False
+        pattern = self.patterns.get(name)
+        return pattern is None or re.fullmatch(pattern, text) is not None
+
+
+@dataclass
+class CascadeResult:
+    answer: Dict[str, Any]  # merged answer
+    field_tiers: Dict[str, str]  # attribute name -> model ID that produced the value
+    steps: List[Dict[str, Any]]  # model ID, requested and invalid attributes, raw answer and parsing of every call
+    reused: List[str] = field(default_factory=list)  # attributes taken from the attribute cache
+
+    @property
+    def raw_answer(self) -> str:
+        return self.steps[0]["raw_answer"] if self.steps else ""
+
+    @property
+    def parsed(self) -> bool:
+        """
+        Whether at least one tier returned a parsable answer, or the answer was taken from the attribute cache
+        """
+        return any(step["parsed"] for step in self.steps) or bool(self.reused)
+
+    @property
+    def invalid(self) -> List[str]:
+        """
+        Attributes whose value was rejected by the last tier asked for them
+        """
+        is_invalid = {}
+        for step in self.steps:
+            for name in step["attributes"]:
+                is_invalid[name] = name in step["invalid"]
+        return [name for name, value in is_invalid.items() if value]
+
+
+def run_cascade(
+    extract: ExtractFn, tiers: List[str], attributes: List[Attribute], policy: CascadePolicy, deadline=None
+) -> CascadeResult:
+    """
+    Run the extraction through the tiers, re-asking only the invalid attributes to the next tier
+
+    Without requested attributes, the keys of the first answer are used as attributes for the next tiers,
+    and an unparsable answer sends the whole document to the next tier.
+
+    Parameters
+    ----------
+    extract : ExtractFn
+        Extraction with one model
+    tiers : List[str]
+        Model IDs from the fastest to the strongest
+    attributes : List[Attribute]
+        Attributes to be extracted
+    policy : CascadePolicy
+        Validation rules
+    deadline : model.deadline.Deadline, optional
+        Deadline of the invocation, the escalation stops when less than a call timeout is left
+
+    Returns
+    -------
+    CascadeResult
+        Merged answer with the tier of every field
+    """
+    answer, field_tiers, steps = {}, {}, []
+    remaining = list(attributes)
+
+    for idx, model_id in enumerate(tiers):
+        if idx > 0 and deadline is not None and deadline.remaining() < MIN_CALL_TIMEOUT_S:
+            deadline.degrade("cascade", f"escalation to {', '.join(tiers[idx:])} skipped")
+            break
+        is_last_tier = idx == len(tiers) - 1
+        result, raw_answer = extract(model_id, remaining)
+        names = get_attribute_names(remaining) or list(result or {})
+
+        invalid = [name for name in names if not policy.is_valid(name, (result or {}).get(name))]
+        for name in names:
+            # keep the first answer as a fallback, then only overwrite with valid values or the strongest model
+            if name not in answer or name not in invalid or (is_last_tier and result is not None):
+                answer[name] = (result or {}).get(name, "")
+                field_tiers[name] = model_id
+
+        steps.append(
+            {
+                "model_id": model_id,
+                "attributes": names,
+                "invalid": invalid,
+                "parsed": result is not None,
+                "raw_answer": raw_answer,
+            }
+        )
+        if result is not None and names and not invalid:
+            break
+        if result is not None:
+            remaining = [
+                attribute for attribute in remaining or names if get_attribute_names([attribute])[0] in invalid
+            ]
+
+    return CascadeResult(answer=answer, field_tiers=field_tiers, steps=steps)
@@ -0,0 +1,434 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Model invocation with the Bedrock Converse API for every provider: images, streaming, usage and retries
+"""
+
+import logging
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+from botocore.exceptions import HTTPClientError
+from model.governor import estimate_tokens
+from model.parser import JsonParseError, parse_json_string
+from model.registry import get_model_spec
+
+LOGGER = logging.Logger("CONVERSE", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+# errors worth retrying with backoff, the others (validation, access, ...) fail immediately. Connection errors and
+# read timeouts are retried as well, botocore does not retry them since retries are done here
+RETRYABLE_ERRORS = {
+    "ThrottlingException",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "ServiceUnavailableException",
+    "InternalServerException",
+    # the same errors as events of a ConverseStream response
+    "throttlingException",
+    "modelStreamErrorException",
+    "serviceUnavailableException",
+    "internalServerException",
+}
+
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 20.0
+
+
+class ConverseError(RuntimeError):
+    def __init__(self, message: str, code: str = "", retryable: bool = False):
+        super().__init__(message)
+        self.code = code
+        self.retryable = retryable
+
+
+@dataclass
+class ConverseResult:
+    """
+    Answer of a model with its usage and latency
+
+    Attributes
+    ----------
+    model_id : str
+        Bedrock model ID
+    content : List[Dict[str, Any]]
+        Content blocks of the answer message, as returned by the Converse API
+    stop_reason : str
+        Why the generation stopped, e.g. end_turn, max_tokens, stop_sequence or tool_use
+    input_tokens : int
+        Input tokens billed
+    output_tokens : int
+        Output tokens billed
+    latency_ms : int
+        Model latency reported by Bedrock for the successful attempt
+    elapsed_s : float
+        Wall clock time of the call, retries and backoff included
+    first_token_s : float, optional
+        Time to the first streamed token, None without streaming
+    attempts : int
+        Number of attempts
+    continuations : int
+        Number of calls continuing an answer truncated by max_tokens
+    """
+
+    model_id: str
+    content: List[Dict[str, Any]] = field(default_factory=list)
+    stop_reason: str = ""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    latency_ms: int = 0
+    elapsed_s: float = 0.0
+    first_token_s: Optional[float] = None
+    attempts: int = 1
+    continuations: int = 0
+
+    @property
+    def text(self) -> str:
+        return "".join(block.get("text", "") for block in self.content)
+
+    @property
+    def usage(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_ms": self.latency_ms,
+            "elapsed_s": round(self.elapsed_s, 3),
+            "first_token_s": None if self.first_token_s is None else round(self.first_token_s, 3),
+            "attempts": self.attempts,
+            "continuations": self.continuations,
+            "stop_reason": self.stop_reason,
+        }
+
+
+def build_user_message(text: str, images: Optional[List[Tuple[str, bytes]]] = None) -> Dict[str, Any]:
+    """
+    Build a user message, images are passed as raw bytes and only encoded once by the SDK
+
+    Parameters
+    ----------
+    text : str
+        Text prompt, placed after the images
+    images : List[Tuple[str, bytes]], optional
+        Format (jpeg, png, gif or webp) and bytes of every image
+
+    Returns
+    -------
+    Dict[str, Any]
+        Converse API message
+    """
+    content = [{"image": {"format": image_format, "source": {"bytes": data}}} for image_format, data in images or []]
+    content.append({"text": text})
+    return {"role": "user", "content": content}
+
+
+def build_request(
+    model_id: str,
+    messages: List[Dict[str, Any]],
+    system: Optional[str] = None,
+    max_tokens: int = 1024,
+    temperature: float = 0.0,
+    top_p: Optional[float] = None,
+    stop_sequences: Optional[List[str]] = None,
+    tool_config: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Build the Converse API request, adapted to what the model supports according to the registry
+    """
+    spec = get_model_spec(model_id)
+    if not spec.vision and any("image" in block for message in messages for block in message["content"]):
+        raise ValueError(f"Model {model_id} does not accept images")
+
+    inference_config = {"maxTokens": min(max_tokens, spec.max_output_tokens), "temperature": temperature}
+    if top_p is not None:
+        inference_config["topP"] = top_p
+    if stop_sequences and "stop_sequences" in spec.param_mapping:
+        inference_config["stopSequences"] = stop_sequences
+
+    request = {"modelId": model_id, "messages": messages, "inferenceConfig": inference_config}
+    if system and spec.system_prompt:
+        request["system"] = [{"text": system}]
+    elif system:  # prepend the instructions to the text of the first user message
+        first = messages[0]
+        content = list(first["content"])
+        if content and "text" in content[0]:
+            content[0] = {"text": f"{system}\n\n{content[0]['text']}"}
+        else:
+            content.insert(0, {"text": system})
+        request["messages"] = [{"role": first["role"], "content": content}, *messages[1:]]
+    if tool_config:
+        request["toolConfig"] = tool_config
+    return request
+
+
+def read_stream(model_id: str, stream, on_text: Callable[[str], None], start: float) -> ConverseResult:  # noqa: C901
+    """
+    Assemble the events of a ConverseStream response into a result, calling on_text with every text delta
+    """
+    result = ConverseResult(model_id=model_id)
+    blocks: Dict[int, Dict[str, Any]] = {}
+    for event in stream:
+        error = next((name for name in event if name.endswith("Exception")), None)
+        if error is not None:
+            raise ConverseError(event[error].get("message", error), code=error, retryable=error in RETRYABLE_ERRORS)
+        if "contentBlockStart" in event:
+            tool_use = event["contentBlockStart"]["start"].get("toolUse")
+            if tool_use is not None:
+                blocks[event["contentBlockStart"]["contentBlockIndex"]] = {"toolUse": dict(tool_use, input="")}
+        elif "contentBlockDelta" in event:
+            index, delta = event["contentBlockDelta"]["contentBlockIndex"], event["contentBlockDelta"]["delta"]
+            if result.first_token_s is None:
+                result.first_token_s = time.perf_counter() - start
+            if "text" in delta:
+                blocks.setdefault(index, {"text": ""})["text"] += delta["text"]
+                on_text(delta["text"])
+            elif "toolUse" in delta:
+                blocks.setdefault(index, {"toolUse": {"input": ""}})["toolUse"]["input"] += delta["toolUse"]["input"]
+        elif "messageStop" in event:
+            result.stop_reason = event["messageStop"].get("stopReason", "")
+        elif "metadata" in event:
+            usage = event["metadata"].get("usage", {})
+            result.input_tokens = usage.get("inputTokens", 0)
+            result.output_tokens = usage.get("outputTokens", 0)
+            result.latency_ms = event["metadata"].get("metrics", {}).get("latencyMs", 0)
+
+    for index in sorted(blocks):
+        block = blocks[index]
+        if "toolUse" in block:
+            try:  # the input of a tool call cut by max_tokens is truncated
+                block["toolUse"]["input"] = parse_json_string(block["toolUse"]["input"])
+            except JsonParseError:
+                block["toolUse"]["input"] = {}
+        result.content.append(block)
+    return result
+
+
+def converse(
+    client,
+    model_id: str,
+    messages: List[Dict[str, Any]],
+    system: Optional[str] = None,
+    max_tokens: int = 1024,
+    temperature: float = 0.0,
+    top_p: Optional[float] = None,
+    stop_sequences: Optional[List[str]] = None,
+    tool_config: Optional[Dict[str, Any]] = None,
+    stream: bool = False,
+    on_text: Optional[Callable[[str], None]] = None,
+    max_attempts: int = 5,
+    governor=None,
+    max_wait_s: Optional[float] = None,
+    deadline=None,
+    max_continuations: int = 0,
+    retry_budget=None,
+) -> ConverseResult:
+    """
+    Invoke a model with the Converse API, retrying throttling and transient errors with jittered backoff
+
+    Parameters
+    ----------
+    client : botocore.client.BedrockRuntime
+        Bedrock runtime client, its own retries should be disabled to avoid retrying twice
+    model_id : str
+        Bedrock model ID
+    messages : List[Dict[str, Any]]
+        Converse API messages, see build_user_message
+    system : str, optional
+        System prompt, prepended to the first user message for models without system prompt
+    max_tokens : int, optional
+        Max output tokens, capped to the max output of the model, by default 1024
+    temperature : float, optional
+        Sampling temperature, by default 0.0
+    top_p : float, optional
+        Nucleus sampling probability, by default the model default
+    stop_sequences : List[str], optional
+        Sequences stopping the generation, ignored for models that restrict them
+    tool_config : Dict[str, Any], optional
+        Converse API tool configuration
+    stream : bool, optional
+        Whether to stream the answer, ignored for models without streaming, by default False
+    on_text : Callable[[str], None], optional
+        Called with every text delta while streaming
+    max_attempts : int, optional
+        Max attempts, by default 5
+    governor : model.governor.Governor, optional
+        Throughput governor reserving the estimated tokens before the call, by default not governed
+    max_wait_s : float, optional
+        Max time to wait for the governor's capacity, by default the governor's
+    deadline : model.deadline.Deadline, optional
+        Deadline of the invocation, no attempt or backoff is started past it
+    max_continuations : int, optional
+        Max calls continuing a text answer truncated by max_tokens, for models accepting a prefilled answer,
+        by default 0
+    retry_budget : model.retry_budget.RetryBudget, optional
+        Retry budget of the task, every retry spends from it and none is made once it is exhausted
+
+    Returns
+    -------
+    ConverseResult
+        Answer, usage and latency
+
+    Raises
+    ------
+    ConverseError
+        If the call fails with a non-retryable error or after max_attempts
+    GovernorTimeout
+        If the governor has no capacity for the call within max_wait_s
+    DeadlineExceeded
+        If the deadline passed before an attempt
+    """
+
+    def send(call_messages: List[Dict[str, Any]]) -> ConverseResult:
+        request = build_request(
+            model_id, call_messages, system, max_tokens, temperature, top_p, stop_sequences, tool_config
+        )
+        if governor is None:
+            return invoke(client, model_id, request, stream, on_text, max_attempts, deadline, retry_budget)
+
+        estimate = estimate_tokens(request["messages"], system if "system" in request else None)
+        estimate += request["inferenceConfig"]["maxTokens"]
+        wait_s = max_wait_s
+        if deadline is not None:
+            wait_s = min(governor.max_wait_s if wait_s is None else wait_s, deadline.remaining())
+        reservation = governor.reserve(model_id, estimate, wait_s, region=client.meta.region_name)
+        billed = 0  # a failed call is assumed free, its reservation is refunded
+        try:
+            result = invoke(client, model_id, request, stream, on_text, max_attempts, deadline, retry_budget)
+            billed = result.input_tokens + result.output_tokens
+            return result
+        finally:
+            governor.reconcile(reservation, billed)
+
+    result = send(messages)
+    while result.continuations < max_continuations and can_continue(result):
+        # the truncated answer is sent back as a prefilled assistant message that the model continues
+        prefill = result.text.rstrip()  # a prefill cannot end with whitespace
+        LOGGER.info(f"Answer of {model_id} truncated at {result.output_tokens} tokens, continuing it")
+        continuation = send([*messages, {"role": "assistant", "content": [{"text": prefill}]}])
+        result = merge_continuation(result, prefill, continuation)
+    return result
+
+
+def can_continue(result: ConverseResult) -> bool:
+    """
+    Whether a truncated answer can be continued: a text answer of a model accepting a prefilled answer
+    """
+    return (
+        result.stop_reason == "max_tokens"
+        and get_model_spec(result.model_id).assistant_prefill
+        and bool(result.text.strip())
+        and all("text" in block for block in result.content)
+    )
+
+
+def merge_continuation(result: ConverseResult, prefill: str, continuation: ConverseResult) -> ConverseResult:
+    """
+    Merge a truncated answer and its continuation into one result, with the usage of both calls
+    """
+    return ConverseResult(
+        model_id=result.model_id,
+        content=[{"text": prefill + continuation.text}],
+        stop_reason=continuation.stop_reason,
+        input_tokens=result.input_tokens + continuation.input_tokens,
+        output_tokens=result.output_tokens + continuation.output_tokens,
+        latency_ms=result.latency_ms + continuation.latency_ms,
+        elapsed_s=result.elapsed_s + continuation.elapsed_s,
+        first_token_s=result.first_token_s,
+        attempts=result.attempts + continuation.attempts,
+        continuations=result.continuations + 1,
+    )
+
+
+def send_request(
+    client, model_id: str, request: Dict[str, Any], stream: bool, emit: Callable[[str], None], start: float
+) -> ConverseResult:
+    """
+    Send a request once, as a ConverseStream request if stream
+    """
+    if stream:
+        response = client.converse_stream(**request)
+        return read_stream(model_id, response["stream"], emit, start)
+    response = client.converse(**request)
+    return ConverseResult(
+        model_id=model_id,
+        content=response["output"]["message"]["content"],
+        stop_reason=response.get("stopReason", ""),
+        input_tokens=response["usage"]["inputTokens"],
+        output_tokens=response["usage"]["outputTokens"],
+        latency_ms=response.get("metrics", {}).get("latencyMs", 0),
+    )
+
+
+def get_retry_delay(
+    error: ConverseError, attempt: int, max_attempts: int, deadline=None, retry_budget=None
+) -> Optional[float]:
+    """
+    Backoff before the next attempt, None if the error is not retried
+    """
+    if not error.retryable or attempt >= max_attempts:
+        return None
+    delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2**attempt))  # full jitter
+    if deadline is not None and delay >= deadline.remaining():
+        return None
+    if retry_budget is not None and not retry_budget.spend(f"bedrock:{error.code}"):
+        return None
+    return delay
+
+
+def invoke(
+    client,
+    model_id: str,
+    request: Dict[str, Any],
+    stream: bool,
+    on_text: Optional[Callable[[str], None]],
+    max_attempts: int,
+    deadline=None,
+    retry_budget=None,
+) -> ConverseResult:
+    """
+    Send a request built by build_request, see converse
+    """
+    stream = stream and get_model_spec(model_id).streaming
+    start = time.perf_counter()
+    streamed = False  # a stream that already emitted text is not retried, the callback would see it twice
+
+    def emit(text: str):
+        nonlocal streamed
+        streamed = True
+        if on_text is not None:
+            on_text(text)
+
+    attempt = 0
+    while True:
+        attempt += 1
+        if deadline is not None:
+            deadline.check(f"calling {model_id}")
+        try:
+            result = send_request(client, model_id, request, stream, emit, start)
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            error = ConverseError(str(e), code=code, retryable=code in RETRYABLE_ERRORS)
+        except (BotocoreConnectionError, HTTPClientError) as e:
+            error = ConverseError(str(e), code=type(e).__name__, retryable=True)
+        except ConverseError as e:
+            error = e
+        else:
+            result.elapsed_s, result.attempts = time.perf_counter() - start, attempt
+            LOGGER.info(f"Usage: {result.usage}")
+            return result
+
+        delay = None if streamed else get_retry_delay(error, attempt, max_attempts, deadline, retry_budget)
+        if delay is None:
+            raise error
+        LOGGER.warning(f"{model_id} failed with {error.code} (attempt {attempt}/{max_attempts}), retry in {delay:.1f}s")
+        time.sleep(delay)
@@ -0,0 +1,194 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Deadline of a Lambda invocation: time budget of the Bedrock calls and degradations taken to meet it
+"""
+
+import logging
+import math
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from model.registry import ModelSpec, get_model_spec, list_model_specs
+
+LOGGER = logging.Logger("DEADLINE", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+RESERVE_S = 5.0  # kept to write the output and return before the Lambda times out
+MIN_CALL_TIMEOUT_S = 5.0
+READ_TIMEOUTS_S = (10, 20, 40, 80, 120)  # read timeouts of the cached Bedrock clients
+
+# rough Bedrock call time: overhead, prompt processing, and generation at the model's relative throughput
+CALL_OVERHEAD_S = 1.0
+INPUT_TOKENS_PER_S = 5_000
+OUTPUT_TOKENS_PER_S = 50  # Claude 3 Sonnet, scaled by ModelSpec.relative_throughput
+IMAGE_TOKENS = 1_600  # tokens of a page image at full size
+SMALL_IMAGE_MAX_SIDE = 1_024  # side of the degraded page images, about 1,100 tokens for a portrait page
+SMALL_IMAGE_TOKENS = 1_100
+
+
+class DeadlineExceeded(TimeoutError):
+    retryable = False  # a retry of the task would run out of time the same way
+
+
+class Deadline:
+    """
+    Time budget of an invocation, created at handler entry and threaded through the I/O and model calls
+
+    Parameters
+    ----------
+    budget_s : float
+        Seconds left in the invocation
+    reserve_s : float, optional
+        Seconds kept to finish the invocation, by default RESERVE_S
+    """
+
+    def __init__(self, budget_s: float, reserve_s: float = RESERVE_S):
+        self._expires_at = time.monotonic() + budget_s - reserve_s
+        self.degradations: List[Dict[str, Any]] = []
+
+    @classmethod
+    def from_context(cls, context, reserve_s: float = RESERVE_S) -> "Deadline":
+        """
+        Deadline of a Lambda context, unlimited without a context (local runs)
+        """
+        get_remaining_time = getattr(context, "get_remaining_time_in_millis", None)
+        return cls(get_remaining_time() / 1000 if get_remaining_time else math.inf, reserve_s)
+
+    def remaining(self) -> float:
+        return max(0.0, self._expires_at - time.monotonic())
+
+    def check(self, step: str):
+        """
+        Raise DeadlineExceeded if there is no time left for a step
+        """
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"No time left for {step}")
+
+    def read_timeout(self) -> Optional[int]:
+        """
+        Largest client read timeout ending before the deadline (the shortest one past it), None for the default one
+        """
+        remaining = self.remaining()
+        if remaining >= READ_TIMEOUTS_S[-1]:
+            return None
+        return max([timeout for timeout in READ_TIMEOUTS_S if timeout <= remaining], default=READ_TIMEOUTS_S[0])
+
+    def degrade(self, step: str, detail: str):
+        """
+        Record a degradation taken to meet the deadline, returned in the Lambda output
+        """
+        LOGGER.warning(f"Degraded {step} with {self.remaining():.1f}s left: {detail}")
+        self.degradations.append({"step": step, "detail": detail, "remaining_s": round(self.remaining(), 1)})
+
+
+def estimate_call_s(model_id: str, input_tokens: int, output_tokens: int) -> float:
+    """
+    Rough duration of a Bedrock call, to compare plans rather than to predict latency
+    """
+    throughput = OUTPUT_TOKENS_PER_S * get_model_spec(model_id).relative_throughput
+    return CALL_OVERHEAD_S + input_tokens / INPUT_TOKENS_PER_S + output_tokens / throughput
+
+
+def get_fastest_model(vision: bool = False) -> ModelSpec:
+    """
+    Registered model with the highest throughput, among the vision models if vision
+    """
+    specs = [spec for spec in list_model_specs() if spec.vision or not vision]
+    return max(specs, key=lambda spec: spec.relative_throughput)
+
+
+def fits_text_call(deadline: Deadline, model_id: str, max_tokens: int, input_tokens: int = 10_000) -> bool:
+    """
+    Whether a text call to a model fits in the remaining time
+    """
+    return estimate_call_s(model_id, input_tokens, max_tokens) <= deadline.remaining()
+
+
+def plan_text_call(deadline: Deadline, model_id: str, max_tokens: int, input_tokens: int = 10_000) -> str:
+    """
+    Model of a text call: the requested one if it fits in the remaining time, else the fastest one
+    """
+    if fits_text_call(deadline, model_id, max_tokens, input_tokens):
+        return model_id
+    fastest = get_fastest_model()
+    if fastest.model_id != model_id:
+        deadline.degrade("model", f"{fastest.model_id} used instead of {model_id}")
+    return fastest.model_id
+
+
+@dataclass
+class VisionPlan:
+    model_id: str
+    max_pages: int
+    max_image_side: Optional[int] = None  # None keeps the page images as they are
+
+
+def plan_vision_call(
+    deadline: Deadline, model_id: str, max_pages: int, max_tokens: int, text_tokens: int = 2_000
+) -> VisionPlan:
+    """
+    Fit a vision call in the remaining time: smaller images first, then fewer pages, then the fastest vision model
+
+    Parameters
+    ----------
+    deadline : Deadline
+        Deadline of the invocation, the degradations are recorded on it
+    model_id : str
+        Requested model ID
+    max_pages : int
+        Max pages of the document sent to the model
+    max_tokens : int
+        Max output tokens
+    text_tokens : int, optional
+        Tokens of the prompt, by default 2,000
+
+    Returns
+    -------
+    VisionPlan
+        Model, pages and image size of the call
+    """
+    budget = deadline.remaining()
+
+    def fits(plan_model_id: str, pages: int, image_tokens: int) -> bool:
+        return estimate_call_s(plan_model_id, text_tokens + pages * image_tokens, max_tokens) <= budget
+
+    if fits(model_id, max_pages, IMAGE_TOKENS):
+        return VisionPlan(model_id, max_pages)
+    deadline.degrade("images", f"page images resized to {SMALL_IMAGE_MAX_SIDE}px")
+    if fits(model_id, max_pages, SMALL_IMAGE_TOKENS):
+        return VisionPlan(model_id, max_pages, SMALL_IMAGE_MAX_SIDE)
+
+    pages = max_pages
+    while pages > 1 and not fits(model_id, pages, SMALL_IMAGE_TOKENS):
+        pages -= 1
+    if fits(model_id, pages, SMALL_IMAGE_TOKENS):
+        deadline.degrade("pages", f"first {pages} of up to {max_pages} pages sent")
+        return VisionPlan(model_id, pages, SMALL_IMAGE_MAX_SIDE)
+
+    fastest = get_fastest_model(vision=True)
+    pages = max_pages
+    while pages > 1 and not fits(fastest.model_id, pages, SMALL_IMAGE_TOKENS):
+        pages -= 1
+    if fastest.model_id != model_id:
+        deadline.degrade("model", f"{fastest.model_id} used instead of {model_id}")
+    if pages < max_pages:
+        deadline.degrade("pages", f"first {pages} of up to {max_pages} pages sent")
+    return VisionPlan(fastest.model_id, pages, SMALL_IMAGE_MAX_SIDE)
+
+
+def fits_vision_call(
+    deadline: Deadline, model_id: str, plan: VisionPlan, max_tokens: int, text_tokens: int = 2_000
+) -> bool:
+    """
+    Whether a vision call to a model fits in the remaining time with the pages and image size of a plan
+    """
+    image_tokens = IMAGE_TOKENS if plan.max_image_side is None else SMALL_IMAGE_TOKENS
+    return estimate_call_s(model_id, text_tokens + plan.max_pages * image_tokens, max_tokens) <= deadline.remaining()
@@ -1,4 +1,13 @@
+from typing import List
+
 from langchain import PromptTemplate
+from model.structured import (
+    OUTPUT_MODE_COMPACT,
+    OUTPUT_MODE_TOOL,
+    TOOL_NAME,
+    Attribute,
+    build_compact_instructions,
+)
 
 
 PROMPT_DEFAULT_HEADER = """Extract attributes from the attached document and remember to provide a valid JSON file in the following format:"""
@@ -40,7 +49,7 @@ PROMPT_INSTRUCTIONS = """You must follow these additional instructions:
 """
 
 
-SYSTEM_PROMPT = """You are an AI assistant who is expert in extracting information from documents.
+SYSTEM_PROMPT_HEADER = """You are an AI assistant who is expert in extracting information from documents.
 Carefully read the document given provided as a collection of images where each image is a document page.
 Extract attributes listed below in <attributes></attributes> tags from the document.
 The answer must contain the extracted attributes in JSON format. Do NOT include any other information in the answer.
@@ -49,10 +58,26 @@ If the attribute requires providing a description or free-form text, the value o
 Note that some attributes are not directly stated in the document, but their values are implicitly defined in the text.
 Do your best to extract a full value for each requested attribute from the document.
 If provided, you must also follow the additional instructions in <instructions></instructions>.
-Think step by step. First, summarize your thoughts in 2-3 sentences using <thinking></thinking> tags. Next, output the JSON in <json></json> tags. Do NOT include any other information in the answer. Remember that the response MUST be a valid JSON file.
+"""
+
+OUTPUT_FORMAT_THINKING = """Think step by step. First, summarize your thoughts in 2-3 sentences using <thinking></thinking> tags. Next, output the JSON in <json></json> tags. Do NOT include any other information in the answer. Remember that the response MUST be a valid JSON file.
  
 """
 
+OUTPUT_FORMAT_JSON = """Output the JSON in <json></json> tags. Do NOT include any other information in the answer. Remember that the response MUST be a valid JSON file.
+"""  # noqa: E501
+
+OUTPUT_FORMAT_TOOL = f"""Record the extracted attributes with the {TOOL_NAME} tool.
+"""
+
+SYSTEM_PROMPT = SYSTEM_PROMPT_HEADER + OUTPUT_FORMAT_THINKING
+
+PROMPT_ATTRIBUTES = """Attributes to be extracted:
+<attributes>
+{attributes}
+</attributes>
+"""
+
 
 def load_prompt_template() -> PromptTemplate:
     """
@@ -84,3 +109,44 @@ def load_prompt_template() -> PromptTemplate:
         template=prompt,
         input_variables=input_variables,
     )
+
+
+def get_system_prompt(output_mode: str = "text", thinking: bool = True, attributes: List[Attribute] = None) -> str:
+    """
+    Creates the system prompt for the output mode
+
+    Parameters
+    ----------
+    output_mode : str, by default "text"
+        One of the output modes of model.structured
+    thinking : bool, by default True
+        Whether the model summarizes its thoughts in <thinking></thinking> tags before the answer,
+        ignored with tool use where the answer is the tool call
+    attributes : List[Attribute], by default None
+        Attributes to be extracted, used for the order of compact answers
+
+    Returns
+    -------
+    str
+        System prompt
+    """
+    if output_mode == OUTPUT_MODE_TOOL:
+        return SYSTEM_PROMPT_HEADER + OUTPUT_FORMAT_TOOL
+    if output_mode == OUTPUT_MODE_COMPACT:
+        prefix = "First, summarize your thoughts in 2-3 sentences using <thinking></thinking> tags. " if thinking else ""
+        return SYSTEM_PROMPT_HEADER + prefix + build_compact_instructions(attributes or []) + "\n"
+    return SYSTEM_PROMPT_HEADER + (OUTPUT_FORMAT_THINKING if thinking else OUTPUT_FORMAT_JSON)
+
+
+def format_attributes(attributes: List[Attribute]) -> str:
+    """
+    Lists the attributes to be extracted in <attributes></attributes> tags, one per line with its description
+    """
+    lines = []
+    for idx, attribute in enumerate(attributes):
+        if isinstance(attribute, str):
+            lines.append(f"{idx + 1}. {attribute}")
+        else:
+            description = attribute.get("description", "")
+            lines.append(f"{idx + 1}. {attribute['name']}" + (f": {description}" if description else ""))
+    return PROMPT_ATTRIBUTES.format(attributes="\n".join(lines))
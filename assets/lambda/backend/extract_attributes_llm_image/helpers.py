@@ -1,59 +1,87 @@
-import base64
 from io import BytesIO
-# from pdf2image import convert_from_path
-
-
-# def get_base64_encoded_images_from_pdf(pdf_file_path):
-#     images = convert_from_path(pdf_file_path)
-#     base64_img_strs = []
-#     for i, image in enumerate(images):
-#         buffered = BytesIO()
-
-#         image.save(buffered, format="JPEG")
-#         img_str = base64.b64encode(buffered.getvalue())
-#         base64_string = img_str.decode('utf-8')
-#         base64_img_strs.append(base64_string)
-#     return base64_img_strs
-
-
-def create_human_message_with_imgs(text, file=None, max_pages=20):
-    content = []
-    if file:
-        # if file.lower().endswith('.pdf'):
-        #     base64_img_strs = get_base64_encoded_images_from_pdf(file)
-        if file.lower().endswith(".jpeg") or file.lower().endswith(".jpg") or file.lower().endswith(".png"):
-            with open(file, "rb") as image_file:
-                binary_data = image_file.read()
-                base64_img_str = base64.b64encode(binary_data)
-                base64_img_strs = [base64_img_str.decode('utf-8')]
-
-        base64_img_strs = base64_img_strs[:max_pages]
-        if not base64_img_strs:
+from typing import List, Tuple
+
+from model.converse import build_user_message
+from page_filter import THUMBNAIL_SIZE, filter_pages
+from PIL import Image
+
+IMAGE_FORMATS = {"JPEG": "jpeg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}  # PIL format -> Bedrock image format
+
+
+def read_s3_object(s3_client, bucket: str, key: str) -> bytes:
+    """
+    Read an S3 object into a single in-memory buffer, without a local copy
+    """
+    return s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+
+
+def open_page_image(page_bytes):
+    image = Image.open(BytesIO(page_bytes))
+    image.draft("RGB", THUMBNAIL_SIZE)  # the page filter only needs a thumbnail, decode JPEGs at reduced size
+    return image
+
+
+def resize_image(image_bytes: bytes, max_side: int) -> Tuple[str, bytes]:
+    """
+    Downscale a page image so that its longest side is at most max_side, re-encoded as JPEG
+    """
+    image = Image.open(BytesIO(image_bytes))
+    if max(image.size) <= max_side:
+        return IMAGE_FORMATS.get(image.format, "jpeg"), image_bytes
+    image.draft("RGB", (max_side, max_side))  # decode JPEGs at reduced size
+    image = image.convert("RGB")
+    image.thumbnail((max_side, max_side))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return "jpeg", buffer.getvalue()
+
+
+def get_images_from_files(images_bytes):
+    images = [open_page_image(image_bytes) for image_bytes in images_bytes]
+    kept_pages, skipped_pages = filter_pages(images)
+    return [(IMAGE_FORMATS.get(images[i].format, "jpeg"), images_bytes[i]) for i in kept_pages], skipped_pages
+
+
+def create_human_message_with_imgs(text, files: List[Tuple[str, bytes]] = None, max_pages=20, max_image_side=None):
+    """
+    Build a Converse API user message, images are passed as raw bytes and only encoded once by the SDK
+
+    Parameters
+    ----------
+    text : str
+        Text prompt
+    files : List[Tuple[str, bytes]]
+        Name and content of one or more page images of a single document, by default None
+    max_pages : int
+        Max no. images sent to the model, by default 20
+    max_image_side : int, optional
+        Max side of the images sent to the model in pixels, by default the images are sent as they are
+
+    Returns
+    -------
+    Tuple[dict, List[dict]]
+        User message, and a record for every page skipped by the page filter
+    """
+    images = []
+    skipped_pages = []
+    if files:
+        if all(name.lower().endswith((".jpeg", ".jpg", ".png")) for name, _ in files):
+            images, skipped_pages = get_images_from_files([file_bytes for _, file_bytes in files])
+
+        images = images[:max_pages]
+        if max_image_side is not None:
+            images = [resize_image(image_bytes, max_image_side) for _, image_bytes in images]
+        if not images:
             raise ValueError(
                 'No images found in the file. Consider uploading a different file or adjust cutoff settings.')
 
-        for base64_img_str in base64_img_strs:
-            content.append(
-                {
-                    "type": "image",
-                    "source": {
-                        "type": "base64",
-                        "media_type": f"image/jpeg",
-                        "data": base64_img_str,
-                    },
-                },
-            )
-    content.append({"type": "text", "text": text})
-    return {'role': 'user', 'content': content}
+    return build_user_message(text, images), skipped_pages
 
 
 def create_assistant_response(marking_file):
     with open(marking_file) as f:
         marking_text = f.read()
-        content = [{
-            "type": "text",
-                    "text": marking_text
-        }]
+        content = [{"text": marking_text}]
     return {'role': 'assistant', 'content': content}
 
 
@@ -8,9 +8,13 @@ File content:
 """
 
 import boto3
+from botocore.config import Config
+from model.registry import map_inference_params
 
 
-def create_bedrock_client(bedrock_region, bedrock_config=None):
+def create_bedrock_client(bedrock_region, bedrock_config=None, read_timeout=None):
+    if read_timeout is not None:  # shorter timeout of a call close to the Lambda deadline
+        bedrock_config = (bedrock_config or Config()).merge(Config(read_timeout=read_timeout))
     return boto3.client(
         service_name="bedrock-runtime",
         region_name=bedrock_region,
@@ -30,58 +34,13 @@ def get_model_params(
     model_id : str
         LLM model ID
     params : dict
-        Model-specific inference parameters
+        Generic inference parameters: max_tokens, stop_words, temperature, top_p and top_k
 
     Returns
     -------
     dict
-        Bedrock-aligned inference parameters
+        Bedrock-aligned inference parameters, named and capped by the model registry
     """
 
-    model_params = {}
-
-    if model_id.startswith("ai21"):
-        model_params = {
-            "maxTokens": params["max_tokens"],
-            "stopSequences": params["stop_words"],
-            "temperature": params["temperature"],
-            "topP": params["top_p"],
-            "topKReturn": params["top_k"],
-        }
-    elif model_id.startswith("amazon"):
-        model_params = {
-            "maxTokenCount": params["max_tokens"],
-            "stopSequences": [],
-            "temperature": params["temperature"],
-            "topP": params["top_p"],
-        }
-    elif model_id.startswith("anthropic"):
-        model_params = {
-            "max_tokens": params["max_tokens"],
-            "stop_sequences": params["stop_words"],
-            "temperature": params["temperature"],
-            "top_p": params["top_p"],
-            "top_k": params["top_k"],
-        }
-    elif model_id.startswith("cohere"):
-        model_params = {
-            "max_tokens": params["max_tokens"],
-            "temperature": params["temperature"],
-            "p": params["top_p"],
-            "k": params["top_k"],
-        }
-    elif model_id.startswith("meta"):
-        model_params = {
-            "max_gen_len": params["max_tokens"],
-            "temperature": params["temperature"],
-            "top_p": params["top_p"],
-        }
-    elif model_id.startswith("mistral"):
-        model_params = {
-            "max_tokens": params["max_tokens"],
-            "temperature": params["temperature"],
-            "top_p": params["top_p"],
-            "top_k": params["top_k"],
-        }
-
-    return model_params
+    generic_params = {"stop_sequences" if name == "stop_words" else name: value for name, value in params.items()}
+    return map_inference_params(model_id, generic_params)
@@ -0,0 +1,258 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Hedged Bedrock calls: a slow call is duplicated to the fastest other region or equivalent model
+"""
+
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+LOGGER = logging.Logger("HEDGING", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    region: str
+    model_id: str
+
+    def __str__(self) -> str:
+        return f"{self.region}#{self.model_id}"
+
+
+@dataclass
+class HedgePolicy:
+    """
+    Hedging configuration, see the hedging section of config.yml
+
+    Attributes
+    ----------
+    enabled : bool
+        Whether slow calls are duplicated, otherwise only the requested endpoint is called
+    percentile : float
+        Latency percentile of the endpoint after which the call is duplicated
+    default_delay_s : float
+        Delay before duplicating a call while the endpoint has fewer than min_samples latencies
+    min_delay_s : float
+        Lower bound of the delay, so that a fast endpoint does not duplicate most of its calls
+    min_samples : int
+        Latencies needed before the percentile is trusted
+    window : int
+        Latencies kept per endpoint
+    max_hedges : int
+        Max duplicates of a call
+    secondary_regions : List[str]
+        Regions serving the same model, tried in latency order
+    equivalent_models : Dict[str, List[str]]
+        Models accepted in place of a model, they must support the same features (images, tool use)
+    """
+
+    enabled: bool = False
+    percentile: float = 95.0
+    default_delay_s: float = 20.0
+    min_delay_s: float = 2.0
+    min_samples: int = 20
+    window: int = 200
+    max_hedges: int = 1
+    secondary_regions: List[str] = field(default_factory=list)
+    equivalent_models: Dict[str, List[str]] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls, variable: str = "HEDGE_POLICY") -> "HedgePolicy":
+        config = json.loads(os.environ.get(variable) or "{}")
+        return cls(
+            enabled=bool(config.get("enabled", False)),
+            percentile=float(config.get("percentile", cls.percentile)),
+            default_delay_s=float(config.get("default_delay_s", cls.default_delay_s)),
+            min_delay_s=float(config.get("min_delay_s", cls.min_delay_s)),
+            min_samples=int(config.get("min_samples", cls.min_samples)),
+            window=int(config.get("window", cls.window)),
+            max_hedges=int(config.get("max_hedges", cls.max_hedges)),
+            secondary_regions=list(config.get("secondary_regions") or []),
+            equivalent_models=dict(config.get("equivalent_models") or {}),
+        )
+
+    def get_endpoints(self, region: str, model_id: str) -> List[Endpoint]:
+        """
+        Requested endpoint first, then the same model in the secondary regions and the equivalent models
+        """
+        endpoints = [Endpoint(region, model_id)]
+        if self.enabled:
+            endpoints += [Endpoint(other, model_id) for other in self.secondary_regions if other != region]
+            endpoints += [Endpoint(region, other) for other in self.equivalent_models.get(model_id, [])]
+        return endpoints
+
+
+class LatencyStats:
+    """
+    Rolling latencies of the successful calls of every endpoint, shared by the threads of a Lambda environment
+    """
+
+    def __init__(self, window: int = 200):
+        self._latencies: Dict[Endpoint, Deque[float]] = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: Endpoint, latency_s: float):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self._window)).append(latency_s)
+
+    def count(self, endpoint: Endpoint) -> int:
+        with self._lock:
+            return len(self._latencies.get(endpoint, ()))
+
+    def percentile(self, endpoint: Endpoint, percentile: float) -> Optional[float]:
+        """
+        Nearest-rank percentile of the latencies of an endpoint, None without latencies
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(endpoint, ()))
+        if not latencies:
+            return None
+        return latencies[max(0, math.ceil(percentile / 100 * len(latencies)) - 1)]
+
+
+class EndpointSelector:
+    """
+    Latency-aware endpoint selection and hedged calls
+
+    Parameters
+    ----------
+    policy : HedgePolicy
+        Hedging configuration
+    client_factory : Callable[[str, Optional[int]], Any]
+        Creates the Bedrock runtime client of a region with a read timeout, None for the default one
+    clients : Dict[str, Any], optional
+        Clients with the default read timeout already created, per region
+    """
+
+    def __init__(
+        self,
+        policy: HedgePolicy,
+        client_factory: Callable[[str, Optional[int]], Any],
+        clients: Dict[str, Any] = None,
+    ):
+        self.policy = policy
+        self.stats = LatencyStats(policy.window)
+        self._client_factory = client_factory
+        self._clients = {(region, None): client for region, client in (clients or {}).items()}
+        self._lock = threading.Lock()
+
+    def get_client(self, region: str, read_timeout: Optional[int] = None):
+        with self._lock:
+            if (region, read_timeout) not in self._clients:
+                self._clients[(region, read_timeout)] = self._client_factory(region, read_timeout)
+            return self._clients[(region, read_timeout)]
+
+    def rank(self, endpoints: List[Endpoint]) -> List[Endpoint]:
+        """
+        Order the endpoints by median latency, endpoints without enough latencies keep their configured order
+        """
+
+        def median(endpoint: Endpoint) -> float:
+            if self.stats.count(endpoint) < self.policy.min_samples:
+                return math.inf
+            return self.stats.percentile(endpoint, 50)
+
+        return sorted(endpoints, key=median)
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        """
+        Seconds to wait for an endpoint before duplicating its call
+        """
+        if self.stats.count(endpoint) < self.policy.min_samples:
+            return self.policy.default_delay_s
+        return max(self.policy.min_delay_s, self.stats.percentile(endpoint, self.policy.percentile))
+
+    def _timed(self, call: Callable[[Endpoint, Any], Any], endpoint: Endpoint, read_timeout: Optional[int]):
+        start = time.perf_counter()
+        result = call(endpoint, self.get_client(endpoint.region, read_timeout))
+        self.stats.record(endpoint, time.perf_counter() - start)
+        return result
+
+    def call(
+        self,
+        endpoints: List[Endpoint],
+        call: Callable[[Endpoint, Any], Any],
+        is_valid: Optional[Callable[[Any], bool]] = None,
+        deadline=None,
+    ) -> Tuple[Any, Endpoint]:
+        """
+        Call the fastest endpoint, and the next one if it has not answered after its hedge delay or failed
+
+        The first valid answer is returned. Duplicates not started yet are cancelled, a running one cannot be
+        interrupted: it completes in the background, its latency is recorded and its answer discarded.
+
+        Parameters
+        ----------
+        endpoints : List[Endpoint]
+            Candidate endpoints, see HedgePolicy.get_endpoints
+        call : Callable[[Endpoint, Any], Any]
+            Call of an endpoint with the client of its region
+        is_valid : Callable[[Any], bool], optional
+            Whether an answer is acceptable, an invalid answer is only returned when no other endpoint answered
+        deadline : model.deadline.Deadline, optional
+            Deadline of the invocation, the clients' read timeout ends before it
+
+        Returns
+        -------
+        Tuple[Any, Endpoint]
+            Answer and the endpoint that produced it
+
+        Raises
+        ------
+        Exception
+            The error of the last endpoint when none of them answered
+        """
+        ranked = self.rank(endpoints)[: 1 + self.policy.max_hedges] if self.policy.enabled else endpoints[:1]
+        read_timeout = None if deadline is None else deadline.read_timeout()
+        if len(ranked) == 1:
+            return self._timed(call, ranked[0], read_timeout), ranked[0]
+
+        executor = ThreadPoolExecutor(max_workers=len(ranked), thread_name_prefix="hedge")
+        pending = {executor.submit(self._timed, call, ranked[0], read_timeout): ranked[0]}
+        launched, fallback, error = 1, None, None
+        try:
+            while pending:
+                timeout = self.hedge_delay(ranked[launched - 1]) if launched < len(ranked) else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    endpoint = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:  # noqa: BLE001 the other endpoints may still answer
+                        LOGGER.warning(f"{endpoint} failed: {e}")
+                        error = e
+                        continue
+                    if is_valid is None or is_valid(result):
+                        if endpoint != ranked[0]:
+                            LOGGER.info(f"Hedged call to {endpoint} answered first")
+                        return result, endpoint
+                    LOGGER.warning(f"{endpoint} returned an invalid answer")
+                    fallback = fallback or (result, endpoint)
+
+                # duplicate the call when the hedge delay passed or when every running call failed
+                if launched < len(ranked) and (not done or not pending):
+                    LOGGER.info(f"Hedging the call to {ranked[launched - 1]} with {ranked[launched]}")
+                    pending[executor.submit(self._timed, call, ranked[launched], read_timeout)] = ranked[launched]
+                    launched += 1
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        if fallback is not None:
+            return fallback
+        raise error
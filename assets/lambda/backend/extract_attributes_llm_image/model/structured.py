@@ -0,0 +1,191 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Structured output helpers: schema-constrained tool use and compact positional answers
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from model.parser import parse_json, parse_json_string
+from model.registry import get_model_spec
+
+OUTPUT_MODE_TEXT = "text"  # JSON in the text of the answer, parsed with model.parser
+OUTPUT_MODE_TOOL = "tool"  # JSON constrained by a tool schema the model is forced to call
+OUTPUT_MODE_COMPACT = "compact"  # values only, in the order of the attributes, expanded into the full key set
+OUTPUT_MODES = (OUTPUT_MODE_TEXT, OUTPUT_MODE_TOOL, OUTPUT_MODE_COMPACT)
+
+TOOL_NAME = "record_attributes"
+TOOL_DESCRIPTION = "Record the attributes extracted from the document."
+
+Attribute = Union[str, Dict[str, str]]  # attribute name, or dict with "name" and optional "description"
+
+
+def supports_tool_use(model_id: str) -> bool:
+    """
+    Whether the model can be forced to answer with a tool call
+    """
+    return get_model_spec(model_id).tool_choice
+
+
+def get_attribute_names(attributes: List[Attribute]) -> List[str]:
+    return [attribute if isinstance(attribute, str) else attribute["name"] for attribute in attributes]
+
+
+def resolve_output_mode(output_mode: str, model_id: str, attributes: List[Attribute]) -> str:
+    """
+    Return the output mode to use, falling back to what the model and the request support
+
+    Parameters
+    ----------
+    output_mode : str
+        Requested output mode, one of OUTPUT_MODES
+    model_id : str
+        LLM model ID
+    attributes : List[Attribute]
+        Attributes to be extracted, compact answers need their names
+
+    Returns
+    -------
+    str
+        Output mode
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode {output_mode}, expected one of {OUTPUT_MODES}")
+    if output_mode == OUTPUT_MODE_COMPACT and not attributes:
+        output_mode = OUTPUT_MODE_TOOL
+    if output_mode == OUTPUT_MODE_TOOL and not supports_tool_use(model_id):
+        output_mode = OUTPUT_MODE_TEXT
+    return output_mode
+
+
+def build_attributes_schema(attributes: List[Attribute], compact: bool = False) -> Dict[str, Any]:
+    """
+    Build the JSON schema of the answer
+
+    Parameters
+    ----------
+    attributes : List[Attribute]
+        Attributes to be extracted, an empty list accepts any object
+    compact : bool, optional
+        Whether the answer is a list of values in the order of the attributes, by default False
+
+    Returns
+    -------
+    Dict[str, Any]
+        JSON schema
+    """
+    names = get_attribute_names(attributes)
+    if compact:
+        order = "; ".join(f"{idx + 1}. {name}" for idx, name in enumerate(names))
+        return {
+            "type": "object",
+            "properties": {
+                "values": {
+                    "type": "array",
+                    "description": f"Values of the attributes in this order: {order}. Use an empty string if unknown.",
+                    "minItems": len(names),
+                    "maxItems": len(names),
+                }
+            },
+            "required": ["values"],
+        }
+
+    properties = {}
+    for attribute in attributes:
+        name = attribute if isinstance(attribute, str) else attribute["name"]
+        description = "" if isinstance(attribute, str) else attribute.get("description", "")
+        properties[name] = {"description": description} if description else {}
+    return {"type": "object", "properties": properties, "required": names}
+
+
+def build_tool_config(attributes: List[Attribute], compact: bool = False) -> Dict[str, Any]:
+    """
+    Build the Converse API tool configuration forcing the model to answer with the attributes schema
+    """
+    return {
+        "tools": [
+            {
+                "toolSpec": {
+                    "name": TOOL_NAME,
+                    "description": TOOL_DESCRIPTION,
+                    "inputSchema": {"json": build_attributes_schema(attributes, compact)},
+                }
+            }
+        ],
+        "toolChoice": {"tool": {"name": TOOL_NAME}},
+    }
+
+
+def get_tool_input(content: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Return the input of the attributes tool call from the content of a Converse API message, if any
+    """
+    for block in content:
+        tool_use = block.get("toolUse")
+        if tool_use is not None and tool_use.get("name") == TOOL_NAME:
+            return tool_use.get("input")
+    return None
+
+
+def get_raw_answer(content: List[Dict[str, Any]]) -> str:
+    """
+    Return the answer of a Converse API message: the JSON input of the attributes tool call, if any, else the text
+    """
+    tool_input = get_tool_input(content)
+    if tool_input is not None:
+        return json.dumps(tool_input, ensure_ascii=False)
+    return "".join(block.get("text", "") for block in content)
+
+
+def parse_answer(raw_answer: str, output_mode: str, attributes: List[Attribute]) -> Dict[str, Any]:
+    """
+    Parse the answer into attributes, expanding compact answers into the full key set
+
+    Raises
+    ------
+    JsonParseError
+        If the answer contains no JSON
+    """
+    if output_mode == OUTPUT_MODE_COMPACT:
+        return expand_positional(parse_json(raw_answer), attributes)
+    return parse_json_string(raw_answer)
+
+
+def build_compact_instructions(attributes: List[Attribute]) -> str:
+    """
+    Prompt instructions asking for a compact positional answer, for models without tool use
+    """
+    names = get_attribute_names(attributes)
+    template = json.dumps([f"<{name}>" for name in names], ensure_ascii=False)
+    return (
+        "Output only a JSON list with the values of the attributes in the order of this template, "
+        f"using an empty string for unknown values, in <json></json> tags: <json>{template}</json>"
+    )
+
+
+def expand_positional(values: Any, attributes: List[Attribute]) -> Dict[str, Any]:
+    """
+    Expand a compact positional answer into the full key set
+
+    Parameters
+    ----------
+    values : Any
+        List of values in the order of the attributes, or a dict with such a list under "values"
+    attributes : List[Attribute]
+        Attributes to be extracted
+
+    Returns
+    -------
+    Dict[str, Any]
+        Attribute names mapped to their values, missing values are empty strings and extra values are dropped
+    """
+    if isinstance(values, dict):
+        values = values.get("values", [])
+    if not isinstance(values, list):
+        values = [values]
+    names = get_attribute_names(attributes)
+    return {name: values[idx] if idx < len(values) else "" for idx, name in enumerate(names)}
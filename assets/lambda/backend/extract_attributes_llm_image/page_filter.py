@@ -0,0 +1,109 @@
+"""
+Copyright 2024 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+
+This is AWS Content subject to the terms of the Customer Agreement
+----------------------------------------------------------------------
+File content:
+    Blank page and near-duplicate page filtering
+"""
+
+import hashlib
+from typing import List, Tuple
+
+from PIL import Image, ImageStat
+
+THUMBNAIL_SIZE = (256, 256)  # max size of the thumbnail used to measure ink coverage
+INK_LEVEL = 200  # gray level below which a pixel counts as ink
+BLANK_MAX_INK = 0.005  # max share of ink pixels on a blank page
+HASH_SIZE = 8  # side of the difference hash grid, i.e. the hash has HASH_SIZE**2 bits
+DUPLICATE_MAX_DISTANCE = 8  # max Hamming distance between the hashes of near-duplicate pages
+PHOTO_MIN_MIDTONES = 0.35  # min share of mid-tone pixels on a photo, as in the page classifier
+PHOTO_MIN_SATURATION = 40  # min mean HSV saturation (0-255) on a photo, as in the page classifier
+
+
+def get_ink_coverage(image: Image.Image) -> float:
+    """
+    Share of dark pixels on the page
+    """
+    thumbnail = image.convert("L")
+    thumbnail.thumbnail(THUMBNAIL_SIZE)
+    hist = thumbnail.histogram()
+    return sum(hist[:INK_LEVEL]) / max(sum(hist), 1)
+
+
+def get_difference_hash(image: Image.Image, hash_size: int = HASH_SIZE) -> int:
+    """
+    Perceptual difference hash (dHash) of the page
+    """
+    pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR).getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | int(left > right)
+    return bits
+
+
+def is_photo_like(image: Image.Image) -> bool:
+    """
+    Whether the page is rich in mid-tones or colours, like a photo
+    """
+    hist = image.convert("L").histogram()
+    midtones = sum(hist[64:192]) / max(sum(hist), 1)
+    return midtones >= PHOTO_MIN_MIDTONES or ImageStat.Stat(image.convert("HSV")).mean[1] >= PHOTO_MIN_SATURATION
+
+
+def get_pixel_digest(image: Image.Image) -> str:
+    """
+    Digest of the decoded pixels of the page, equal for identical pages only
+    """
+    return hashlib.sha256(f"{image.mode}{image.size}".encode() + image.tobytes()).hexdigest()
+
+
+def filter_pages(images: List[Image.Image]) -> Tuple[List[int], List[dict]]:
+    """
+    Drop blank pages and collapse near-duplicate pages
+
+    Near-duplicates are only collapsed if both pages are photos, e.g. several shots of the same damage. Document pages
+    built on the same layout have close hashes and thumbnails even when their values differ, so they are only
+    collapsed if their pixels are identical, e.g. a page uploaded twice.
+
+    Parameters
+    ----------
+    images : List[Image.Image]
+        Rendered pages or photos in document order
+
+    Returns
+    -------
+    Tuple[List[int], List[dict]]
+        0-based indices of the pages to keep, and a record for every skipped page
+    """
+    kept, skipped = [], []
+    kept_pages = []  # (hash, photo_like, pixel digest) of every kept page
+
+    for idx, image in enumerate(images):
+        thumbnail = image.convert("RGB")
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        ink_coverage = get_ink_coverage(thumbnail)
+        if ink_coverage < BLANK_MAX_INK:
+            skipped.append({"page": idx + 1, "reason": "blank", "ink_coverage": round(ink_coverage, 4)})
+            continue
+
+        page_hash = get_difference_hash(thumbnail)
+        photo_like = is_photo_like(thumbnail)
+        digest = get_pixel_digest(image)
+        duplicate_of = None
+        for kept_idx, (kept_hash, kept_photo_like, kept_digest) in zip(kept, kept_pages):
+            is_near_duplicate = bin(page_hash ^ kept_hash).count("1") <= DUPLICATE_MAX_DISTANCE
+            if digest == kept_digest or (is_near_duplicate and photo_like and kept_photo_like):
+                duplicate_of = kept_idx
+                break
+        if duplicate_of is not None:
+            skipped.append({"page": idx + 1, "reason": "duplicate", "duplicate_of": duplicate_of + 1})
+            continue
+
+        kept.append(idx)
+        kept_pages.append((page_hash, photo_like, digest))
+
+    return kept, skipped
@@ -1,8 +1,7 @@
-import warnings
-
 from griptape.tokenizers import (
     AmazonBedrockTokenizer
 )
+from model.registry import get_model_spec
 
 
 def token_count_tokenizer(text: str, model: str) -> int:
@@ -14,49 +13,19 @@ def token_count_tokenizer(text: str, model: str) -> int:
     text : str
         the string part which needs to be tokenized
     model
-        model id currently selected in app
+        model id currently selected in app, its tokenizer is looked up in the model registry
 
     Returns
     -------
     int
         the estimated token count based on the model
     """
-    if model.split(".")[0] == "anthropic":
-        tokenizer = AmazonBedrockTokenizer(model="anthropic.claude-")
-        token_count = tokenizer.count_tokens(text)
-
-    elif model.split(".")[0] == "mistral":
-        tokenizer = AmazonBedrockTokenizer(model="meta.llama2-13b-chat-v1")
-        token_count = tokenizer.count_tokens(text)
-
-    elif model.split(".")[0] == "amazon":
-        tokenizer = AmazonBedrockTokenizer(
-            model="amazon.titan-text-express-v1")
-        token_count = tokenizer.count_tokens(text)
-
-    elif model.split(".")[0] == "meta":
-        tokenizer = AmazonBedrockTokenizer(model="meta.llama2-13b-chat-v1")
-        token_count = tokenizer.count_tokens(text)
-
-    elif model.split(".")[0] == "cohere":
-        tokenizer = AmazonBedrockTokenizer(model="cohere.command-r-v1:0")
-        token_count = tokenizer.count_tokens(text)
-
-    elif model.split(".")[0] == "ai21":
-        tokenizer = AmazonBedrockTokenizer(model="ai21.j2-ultra-v1")
-        token_count = tokenizer.count_tokens(text)
-
-    else:
-        warnings.warn(
-            "Currently we support tokenizers [anthropic, amazon, jurassic, meta, cohere, mistralai]")
-        tokenizer = AmazonBedrockTokenizer(model="anthropic.claude-")
-        token_count = tokenizer.count_tokens(text)
-        # raise NotImplementedError
-    return token_count
+    tokenizer = AmazonBedrockTokenizer(model=get_model_spec(model).tokenizer_model)
+    return tokenizer.count_tokens(text)
 
 
 def truncate_document(
-    document: str, token_count_total: int, num_token_prompt: int, model: str, max_token_model: int = 8_000
+    document: str, token_count_total: int, num_token_prompt: int, model: str, max_token_model: int = None
 ) -> str:
     """
     Truncates the text to the token count
@@ -72,13 +41,15 @@ def truncate_document(
     model
         model id currently selected in app
     max_token_model
-        max number of tokens the model accepts
+        max number of tokens the model accepts, by default the context window in the model registry
 
     Returns
     -------
     str
         the truncated document
     """
+    max_token_model = max_token_model or get_model_spec(model).context_window
+
     # split document into words
     doc_words = document.split(" ")
 
@@ -0,0 +1,70 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Lambda that plans the documents of a claim to be processed and memoizes their outputs
+"""
+
+#########################
+#   LIBRARIES & LOGGER
+#########################
+
+import json
+import logging
+import os
+import sys
+from dataclasses import asdict
+
+import boto3
+from model.claim import Claim, ClaimPlan, get_output_fingerprint, get_s3_hash_function
+
+LOGGER = logging.Logger("CLAIM", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+
+#########################
+#       CONSTANTS
+#########################
+
+S3_BUCKET = os.environ["BUCKET_NAME"]
+S3_CLIENT = boto3.client("s3")
+
+
+#########################
+#        HANDLER
+#########################
+
+
+def lambda_handler(event, context):
+    """
+    Lambda handler, called by the state machine before and after the Map over the documents of a claim
+
+    The "plan" action returns the documents to be processed, which replace the documents of the execution input,
+    and the plan of the claim. The "commit" action memoizes the outputs of the Map and returns the outputs of all
+    documents of the claim, the input of the summary.
+    """
+    LOGGER.info(f"Received input: {event}")
+    body = event["body"]
+    action = event["action"]
+
+    if action == "plan":
+        claim = Claim.from_s3(S3_CLIENT, S3_BUCKET, body["claim_id"])
+        plan = claim.plan(
+            body.get("documents", []), get_output_fingerprint(body), get_s3_hash_function(S3_CLIENT, S3_BUCKET)
+        )
+        output = {"documents": plan.pending, "claim": asdict(plan)}
+    elif action == "commit":
+        plan = ClaimPlan(**body["claim"])
+        claim = Claim.from_s3(S3_CLIENT, S3_BUCKET, plan.claim_id)
+        output = claim.commit(plan, body["document_results"], event.get("execution_name"))
+    else:
+        raise ValueError(f"Unsupported claim action {action}")
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(output),
+    }
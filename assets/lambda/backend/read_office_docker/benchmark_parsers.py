@@ -0,0 +1,79 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Benchmark of the native parsers against the Unstructured loaders
+
+Usage:
+    python benchmark_parsers.py CORPUS_DIR [--runs 3] [--skip-unstructured]
+"""
+
+import argparse
+import pathlib
+import time
+from collections import defaultdict
+
+from parsers import NATIVE_PARSERS, format_pages
+
+UNSTRUCTURED_LOADERS = {
+    ".docx": "UnstructuredWordDocumentLoader",
+    ".xlsx": "UnstructuredExcelLoader",
+    ".xlsm": "UnstructuredExcelLoader",
+    ".pptx": "UnstructuredPowerPointLoader",
+    ".html": "UnstructuredHTMLLoader",
+    ".htm": "UnstructuredHTMLLoader",
+}
+
+
+def parse_native(file_path: pathlib.Path) -> str:
+    return format_pages(NATIVE_PARSERS[file_path.suffix.lower()](str(file_path)))
+
+
+def parse_unstructured(file_path: pathlib.Path) -> str:
+    from langchain_community import document_loaders
+
+    loader_cls = getattr(document_loaders, UNSTRUCTURED_LOADERS[file_path.suffix.lower()])
+    data = loader_cls(str(file_path), mode="elements").load()
+    return format_pages([(element.metadata.get("page_number", 1), element.page_content) for element in data])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare Office document parsers")
+    parser.add_argument("corpus_dir", help="Directory with .docx, .xlsx, .pptx and .html files")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--skip-unstructured", action="store_true")
+    args = parser.parse_args()
+
+    file_paths = sorted(
+        path for path in pathlib.Path(args.corpus_dir).rglob("*") if path.suffix.lower() in UNSTRUCTURED_LOADERS
+    )
+    backends = {"native": parse_native}
+    if not args.skip_unstructured:
+        backends["unstructured"] = parse_unstructured
+
+    print(f"Parsing {len(file_paths)} files, {args.runs} runs")
+    print(f"{'backend':<14} {'extension':<10} {'files':>6} {'docs/s':>8} {'MB/s':>8} {'chars':>10}")
+    for backend_name, parse in backends.items():
+        elapsed = defaultdict(float)
+        num_bytes, num_chars, num_files = defaultdict(int), defaultdict(int), defaultdict(int)
+        for file_path in file_paths:
+            extension = file_path.suffix.lower()
+            start = time.perf_counter()
+            for _ in range(args.runs):
+                text = parse(file_path)
+            elapsed[extension] += (time.perf_counter() - start) / args.runs
+            num_bytes[extension] += file_path.stat().st_size
+            num_chars[extension] += len(text)
+            num_files[extension] += 1
+
+        for extension in sorted(num_files):
+            print(
+                f"{backend_name:<14} {extension:<10} {num_files[extension]:>6} "
+                f"{num_files[extension] / elapsed[extension]:>8.2f} "
+                f"{num_bytes[extension] / 2**20 / elapsed[extension]:>8.2f} {num_chars[extension]:>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
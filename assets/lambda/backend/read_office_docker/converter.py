@@ -0,0 +1,164 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Warm LibreOffice converter for legacy Office formats
+"""
+
+import logging
+import os
+import pathlib
+import socket
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+LOGGER = logging.getLogger(__name__)
+
+SOFFICE_PATH = os.environ.get("SOFFICE_PATH", "/opt/libreoffice/program/soffice")
+SOFFICE_PYTHON = os.environ.get("SOFFICE_PYTHON", "/opt/libreoffice/program/python")  # runs the unoserver daemon
+UNOSERVER_PATH = os.environ.get("UNOSERVER_PATH", "/opt/unoserver")  # unoserver installed for SOFFICE_PYTHON
+UNOSERVER_HOST = "127.0.0.1"
+UNOSERVER_PORT = 2003
+UNO_PORT = 2002
+USER_INSTALLATION = "/tmp/libreoffice_profile"
+
+STARTUP_TIMEOUT_S = 30  # max time for LibreOffice to start accepting conversions
+CONVERSION_TIMEOUT_S = 60  # max time for a single conversion, the converter is restarted after a timeout
+
+LEGACY_CONVERSIONS = {".doc": "docx", ".ppt": "pptx", ".xls": "xlsx"}  # legacy extension -> modern format
+
+
+class ConversionError(Exception):
+    pass
+
+
+class LibreOfficeConverter:
+    """
+    Headless LibreOffice kept alive across invocations of the container through an unoserver daemon
+
+    Conversions are queued on a single worker, since LibreOffice converts one document at a time.
+    A conversion that exceeds the timeout or a daemon that died triggers a restart.
+    """
+
+    def __init__(self, conversion_timeout: float = CONVERSION_TIMEOUT_S):
+        self._conversion_timeout = conversion_timeout
+        self._process = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="libreoffice")
+        self.num_conversions = 0
+        self.num_restarts = 0
+
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """
+        Start the daemon and wait until it accepts conversions
+        """
+        start = time.perf_counter()
+        self._process = subprocess.Popen(
+            [
+                SOFFICE_PYTHON,
+                "-m",
+                "unoserver.server",
+                "--executable",
+                SOFFICE_PATH,
+                "--interface",
+                UNOSERVER_HOST,
+                "--port",
+                str(UNOSERVER_PORT),
+                "--uno-port",
+                str(UNO_PORT),
+                "--user-installation",
+                USER_INSTALLATION,
+            ],
+            env={**os.environ, "HOME": "/tmp", "PYTHONPATH": UNOSERVER_PATH},
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,  # stop soffice together with the daemon
+        )
+
+        while time.perf_counter() - start < STARTUP_TIMEOUT_S:
+            if not self.is_alive():
+                raise ConversionError(f"LibreOffice daemon exited with code {self._process.returncode}")
+            try:
+                with socket.create_connection((UNOSERVER_HOST, UNOSERVER_PORT), timeout=1):
+                    break
+            except OSError:
+                time.sleep(0.2)
+        else:
+            self.stop()
+            raise ConversionError(f"LibreOffice daemon did not start within {STARTUP_TIMEOUT_S}s")
+
+        LOGGER.info(f"Started LibreOffice daemon in {time.perf_counter() - start:.2f}s")
+
+    def stop(self):
+        """
+        Stop the daemon and the LibreOffice process it started
+        """
+        if self._process is None:
+            return
+        try:
+            os.killpg(self._process.pid, 15)
+            self._process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            os.killpg(self._process.pid, 9)
+            self._process.wait()
+        except ProcessLookupError:
+            pass
+        self._process = None
+
+    def restart(self):
+        self.num_restarts += 1
+        LOGGER.warning(f"Restarting LibreOffice daemon (restart no. {self.num_restarts})")
+        self.stop()
+        self.start()
+
+    def _convert(self, in_path: str, out_path: str, convert_to: str):
+        from unoserver.client import UnoClient
+
+        UnoClient(UNOSERVER_HOST, str(UNOSERVER_PORT)).convert(inpath=in_path, outpath=out_path, convert_to=convert_to)
+
+    def convert(self, in_path: str, convert_to: str) -> str:
+        """
+        Convert a document with the warm LibreOffice instance
+
+        Parameters
+        ----------
+        in_path : str
+            Path to the document
+        convert_to : str
+            Extension of the target format, e.g. "docx"
+
+        Returns
+        -------
+        str
+            Path to the converted document, next to the original one
+        """
+        if not self.is_alive():
+            if self._process is not None:
+                self.restart()
+            else:
+                self.start()
+
+        out_path = str(pathlib.Path(in_path).with_suffix(f".{convert_to}"))
+        start = time.perf_counter()
+        future = self._executor.submit(self._convert, in_path, out_path, convert_to)
+        try:
+            future.result(timeout=self._conversion_timeout)
+        except FutureTimeoutError as e:
+            self.restart()  # killing LibreOffice also releases the queued worker
+            raise ConversionError(f"Conversion of {in_path} timed out after {self._conversion_timeout}s") from e
+        except Exception as e:
+            if not self.is_alive():
+                self.restart()
+            raise ConversionError(f"Conversion of {in_path} failed: {e}") from e
+
+        self.num_conversions += 1
+        LOGGER.info(
+            f"Converted {in_path} to {convert_to} in {time.perf_counter() - start:.2f}s "
+            f"(conversion no. {self.num_conversions} of this container)"
+        )
+        return out_path
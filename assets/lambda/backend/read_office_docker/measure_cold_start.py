@@ -0,0 +1,76 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Offline cold-start check: imports the Lambda module in fresh interpreters with network access blocked
+    and reports the init duration. Exits with an error if init touches the network or is too slow.
+
+Usage:
+    python measure_cold_start.py [--runs 5] [--max-init-s 3]
+"""
+
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+
+INIT_SCRIPT = """
+import socket
+import time
+
+def blocked(*args, **kwargs):
+    raise OSError("network access during init")
+
+socket.socket.connect = blocked
+socket.create_connection = blocked
+socket.getaddrinfo = blocked
+
+start = time.perf_counter()
+import read_office  # noqa: F401
+print(time.perf_counter() - start)
+"""
+
+LAMBDA_ENV = {
+    "BUCKET_NAME": "cold-start-check",
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "POWERPOINT_EXTENSIONS": json.dumps([".ppt", ".pptx"]),
+    "WORD_EXTENSIONS": json.dumps([".doc", ".docx"]),
+    "EXCEL_EXTENSIONS": json.dumps([".xls", ".xlsx"]),
+    "HTML_EXTENSIONS": json.dumps([".html", ".htm"]),
+    "MARKDOWN_EXTENSIONS": json.dumps([".md", ".markdown"]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the init duration of the office Lambda without network")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-init-s", type=float, default=3.0)
+    args = parser.parse_args()
+
+    env = {**os.environ, **LAMBDA_ENV}
+    durations = []
+    for _ in range(args.runs):
+        result = subprocess.run(
+            [sys.executable, "-c", INIT_SCRIPT],
+            cwd=pathlib.Path(__file__).parent,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            print(f"Init failed without network:\n{result.stderr}")
+            sys.exit(1)
+        durations.append(float(result.stdout.strip().splitlines()[-1]))
+
+    print(f"Init duration over {args.runs} runs: median {statistics.median(durations):.3f}s, max {max(durations):.3f}s")
+    if max(durations) > args.max_init_s:
+        print(f"Init is slower than {args.max_init_s}s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Native parsers for Office and HTML documents
+"""
+
+import datetime
+import re
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+Element = Tuple[int, str]  # page number and text of a document element
+
+HTML_SKIPPED_TAGS = ["head", "script", "style", "noscript", "template", "svg"]
+HTML_BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "caption", "dd", "div", "dl", "dt", "figcaption", "figure",
+    "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header", "hr", "li", "main", "nav", "ol", "p", "pre",
+    "section", "tr", "ul",
+}  # fmt: skip
+
+
+def format_cell(value: Any) -> str:
+    """
+    Render a cell value as single-line text
+    """
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    elif isinstance(value, datetime.datetime) and value.time() == datetime.time():
+        value = value.date()
+    return re.sub(r"\s+", " ", str(value)).strip().replace("|", "\\|")
+
+
+def iter_table_lines(rows: Iterable[Iterable[Any]], width: Optional[int] = None) -> Iterator[str]:
+    """
+    Render table rows as the lines of a markdown table, the first row is used as header
+
+    Rows are streamed when the width of the table is known upfront, otherwise they are collected
+    to find the last non-empty column.
+    """
+    rows = ([format_cell(value) for value in row] for row in rows)
+    rows = (row for row in rows if any(row))
+    if width is None:
+        rows = list(rows)
+        width = max((max((idx + 1 for idx, value in enumerate(row) if value), default=0) for row in rows), default=0)
+
+    for idx, row in enumerate(rows):
+        row = row[:width] + [""] * (width - len(row))
+        yield "| " + " | ".join(row) + " |"
+        if idx == 0:
+            yield "|" + "---|" * width
+
+
+def format_table(rows: Iterable[Iterable[Any]]) -> str:
+    """
+    Render table rows as a markdown table, the first row is used as header
+    """
+    return "\n".join(iter_table_lines(rows))
+
+
+def iter_page_lines(elements: Iterable[Element]) -> Iterator[str]:
+    """
+    Stream the lines of the document text annotated with [page N] markers
+    """
+    page_nb = 1
+    yield f"[page {page_nb}]\n"
+    for page_number, text in elements:
+        if page_number > page_nb:
+            page_nb = page_number
+            yield f"[page {page_nb}]\n"
+        if text and text.strip() != "":
+            yield f"{text}\n"
+
+
+def format_pages(elements: Iterable[Element]) -> str:
+    """
+    Join document elements into text annotated with [page N] markers
+    """
+    return "".join(iter_page_lines(elements))
+
+
+def parse_docx(file_path: str) -> Iterator[Element]:
+    """
+    Parse a Word document, pages are delimited by explicit and rendered page breaks
+    """
+    from docx import Document
+    from docx.oxml.ns import qn
+    from docx.table import Table
+
+    document = Document(file_path)
+    page_number, has_elements = 1, False
+
+    for block in document.element.body.iterchildren():
+        if block.tag == qn("w:tbl"):
+            rows = [[cell.text for cell in row.cells] for row in Table(block, document).rows]
+            yield page_number, format_table(rows)
+            has_elements = True
+            continue
+        if block.tag != qn("w:p"):
+            continue
+
+        # split the paragraph at page breaks; Word also writes a rendered break right after an explicit one
+        text, after_explicit_break = "", False
+        for node in block.iter(qn("w:t"), qn("w:tab"), qn("w:br"), qn("w:cr"), qn("w:lastRenderedPageBreak")):
+            if node.tag == qn("w:t"):
+                text += node.text or ""
+                after_explicit_break = False
+            elif node.tag == qn("w:tab"):
+                text += "\t"
+            elif node.tag == qn("w:br") and node.get(qn("w:type")) == "page":
+                yield page_number, text
+                text, page_number, after_explicit_break, has_elements = "", page_number + 1, True, True
+            elif node.tag == qn("w:lastRenderedPageBreak"):
+                if not after_explicit_break and (text or has_elements):
+                    yield page_number, text
+                    text, page_number, has_elements = "", page_number + 1, True
+            else:
+                text += "\n"
+        yield page_number, text
+        has_elements = True
+
+
+def parse_xlsx(file_path: str) -> Iterator[Element]:
+    """
+    Parse an Excel workbook in read-only streaming mode, every sheet is a page rendered as a markdown table
+
+    Rows are yielded one at a time when the sheet declares its dimensions.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for idx, sheet in enumerate(workbook.worksheets):
+            yield idx + 1, f"Sheet: {sheet.title}"
+            for line in iter_table_lines(sheet.iter_rows(values_only=True), width=sheet.max_column):
+                yield idx + 1, line
+    finally:
+        workbook.close()
+
+
+def iter_pptx_shapes(shapes) -> Iterator:
+    """
+    Iterate over the shapes of a slide, including the shapes nested in groups
+    """
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
+
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            yield from iter_pptx_shapes(shape.shapes)
+        else:
+            yield shape
+
+
+def parse_pptx(file_path: str) -> Iterator[Element]:
+    """
+    Parse a PowerPoint presentation, every slide is a page
+    """
+    from pptx import Presentation
+
+    presentation = Presentation(file_path)
+    for idx, slide in enumerate(presentation.slides):
+        for shape in iter_pptx_shapes(slide.shapes):
+            if shape.has_text_frame:
+                yield from ((idx + 1, paragraph.text) for paragraph in shape.text_frame.paragraphs)
+            elif getattr(shape, "has_table", False) and shape.has_table:
+                rows = [[cell.text for cell in row.cells] for row in shape.table.rows]
+                yield idx + 1, format_table(rows)
+        if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+            yield idx + 1, slide.notes_slide.notes_text_frame.text
+
+
+def parse_html(file_path: str) -> Iterator[Element]:
+    """
+    Parse an HTML page into its block-level texts, tables are rendered as markdown tables
+    """
+    import lxml.html
+
+    with open(file_path, "rb") as f:
+        root = lxml.html.fromstring(f.read())
+
+    for element in list(root.iter(*HTML_SKIPPED_TAGS)):
+        element.drop_tree()
+
+    # replace tables by their markdown rendering, innermost tables first
+    for table in reversed(list(root.iter("table"))):
+        rows = [[cell.text_content() for cell in row.iter("td", "th")] for row in table.iter("tr")]
+        rendered = lxml.html.Element("pre")
+        rendered.text = f"\n{format_table(rows)}\n"
+        rendered.tail = table.tail
+        table.getparent().replace(table, rendered)
+
+    for element in root.iter():
+        if element.tag == "br" or element.tag in HTML_BLOCK_TAGS:
+            element.tail = "\n" + (element.tail or "")
+
+    lines = (re.sub(r"[^\S\n]+", " ", line).strip() for line in root.text_content().split("\n"))
+    yield from ((1, line) for line in lines if line)
+
+
+def parse_text(file_path: str) -> Iterator[Element]:
+    """
+    Read a plain text or markdown document
+    """
+    with open(file_path, encoding="utf-8", errors="replace") as f:
+        yield 1, f.read()
+
+
+NATIVE_PARSERS: Dict[str, Callable[[str], Iterator[Element]]] = {
+    ".docx": parse_docx,
+    ".xlsx": parse_xlsx,
+    ".xlsm": parse_xlsx,
+    ".pptx": parse_pptx,
+    ".html": parse_html,
+    ".htm": parse_html,
+    ".md": parse_text,
+    ".markdown": parse_text,
+}
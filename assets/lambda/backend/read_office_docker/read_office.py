@@ -10,22 +10,20 @@ File content:
 #        IMPORTS
 #########################
 
+import functools
+import hashlib
 import json
 import logging
 import os
 import pathlib
 import sys
+from typing import Iterator, Tuple
 
 import boto3
-import nltk
-from langchain_community.document_loaders import (
-    TextLoader,
-    UnstructuredExcelLoader,
-    UnstructuredHTMLLoader,
-    UnstructuredPowerPointLoader,
-    UnstructuredWordDocumentLoader,
-)
-from utils import get_document_text
+from botocore.exceptions import ClientError
+from converter import LEGACY_CONVERSIONS, ConversionError, LibreOfficeConverter
+from parsers import NATIVE_PARSERS, iter_page_lines
+from s3_stream import S3TextWriter
 
 #########################
 #       CONSTANTS
@@ -39,7 +37,13 @@ LOGGER.addHandler(HANDLER)
 
 S3_BUCKET = os.environ["BUCKET_NAME"]
 
-NLTK_DATA = "/tmp/nltk_data"
+NLTK_DATA = "/tmp/nltk_data"  # download location of the NLTK resources missing from the image
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "averaged_perceptron_tagger": "taggers/averaged_perceptron_tagger",
+    "averaged_perceptron_tagger_eng": "taggers/averaged_perceptron_tagger_eng",
+}
 TMP_DIR = "/tmp"
 
 PREFIX_ORIGINALS = "originals"
@@ -51,9 +55,123 @@ EXCEL_EXTENSIONS = json.loads(os.environ["EXCEL_EXTENSIONS"])
 HTML_EXTENSIONS = json.loads(os.environ["HTML_EXTENSIONS"])
 MARKDOWN_EXTENSIONS = json.loads(os.environ["MARKDOWN_EXTENSIONS"])
 
+# metadata of the processed text: hash of the document it was extracted from, a re-uploaded document is processed again
+SOURCE_HASH_METADATA = "source-hash"
+
 S3_CLIENT = boto3.client("s3")
-nltk.download("punkt", download_dir=NLTK_DATA)
-nltk.download("averaged_perceptron_tagger", download_dir=NLTK_DATA)
+CONVERTER = LibreOfficeConverter()  # started on the first legacy document, then kept warm across invocations
+
+
+#########################
+#        PARSING
+#########################
+
+
+@functools.lru_cache(maxsize=None)
+def ensure_nltk_data():
+    """
+    Make the NLTK resources used by Unstructured available, only downloading the ones missing from the image
+    """
+    import nltk
+
+    if NLTK_DATA not in nltk.data.path:
+        nltk.data.path.append(NLTK_DATA)
+    for name, resource_path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(resource_path)
+        except LookupError:
+            LOGGER.warning(f"NLTK resource {name} not found in the image, downloading it to {NLTK_DATA}")
+            nltk.download(name, download_dir=NLTK_DATA, quiet=True)
+
+
+def load_with_unstructured(local_file_path: str, extension: str) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily load a document with the Unstructured loaders, used when a native parser is missing or fails
+
+    Parameters
+    ----------
+    local_file_path : str
+        Path to the document
+    extension : str
+        File extension, including the dot
+
+    Yields
+    ------
+    Tuple[int, str]
+        Page number and text of a document element
+    """
+    from langchain_community.document_loaders import (
+        TextLoader,
+        UnstructuredExcelLoader,
+        UnstructuredHTMLLoader,
+        UnstructuredPowerPointLoader,
+        UnstructuredWordDocumentLoader,
+    )
+
+    ensure_nltk_data()
+
+    if extension in POWERPOINT_EXTENSIONS:
+        loader = UnstructuredPowerPointLoader(local_file_path, mode="elements")
+    elif extension in WORD_EXTENSIONS:
+        loader = UnstructuredWordDocumentLoader(local_file_path, mode="elements")
+    elif extension in EXCEL_EXTENSIONS:
+        loader = UnstructuredExcelLoader(local_file_path, mode="elements")
+    elif extension in HTML_EXTENSIONS:
+        loader = UnstructuredHTMLLoader(local_file_path, mode="elements")
+    elif extension in MARKDOWN_EXTENSIONS:
+        loader = TextLoader(local_file_path)
+
+    num_elements = 0
+    for element in loader.lazy_load():
+        num_elements += 1
+        yield element.metadata.get("page_number", 1), element.page_content
+    LOGGER.info(f"Loaded {num_elements} elements with {type(loader).__name__}")
+
+
+def write_document(local_file_path: str, extension: str, writer: S3TextWriter):
+    """
+    Parse a document into [page N]-annotated text streamed to the writer, with a native parser if there is one
+    for the format
+
+    Legacy .doc, .ppt and .xls files are first converted to their modern format by the warm LibreOffice converter.
+    """
+    convert_to = LEGACY_CONVERSIONS.get(extension.lower())
+    if convert_to is not None:
+        try:
+            local_file_path = CONVERTER.convert(local_file_path, convert_to)
+            extension = f".{convert_to}"
+        except ConversionError as e:
+            LOGGER.warning(f"LibreOffice conversion failed, falling back to Unstructured: {e}")
+
+    parser = NATIVE_PARSERS.get(extension.lower())
+    if parser is not None:
+        try:
+            writer.writelines(iter_page_lines(parser(local_file_path)))
+            return
+        except Exception as e:
+            LOGGER.warning(f"Native {extension} parser failed, falling back to Unstructured: {e}")
+            writer.discard()
+    writer.writelines(iter_page_lines(load_with_unstructured(local_file_path, extension)))
+
+
+def get_object_head(bucket: str, key: str) -> dict:
+    """
+    Head of an S3 object without downloading it, None if it does not exist
+    """
+    try:
+        return S3_CLIENT.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return None
+        raise
+
+
+def get_source_hash(bucket: str, key: str) -> str:
+    """
+    Hash of a document from its ETag and size, stored with the extracted text to tell when the document changed
+    """
+    head = S3_CLIENT.head_object(Bucket=bucket, Key=key)
+    return hashlib.sha256(f"{head['ETag']}:{head['ContentLength']}".encode()).hexdigest()
 
 
 #########################
@@ -74,14 +192,10 @@ def lambda_handler(event, context):  # noqa: C901
     file_key = f"{PREFIX_PROCESSED}/{file_name.split('/', 1)[-1].rsplit('.')[0]}.txt"
     LOGGER.info(f"file_name: {file_name}")
 
-    doc_text = get_document_text(
-        bucket_name=S3_BUCKET,
-        prefix=PREFIX_PROCESSED,
-        file_name=f"{file_name.split('/', 1)[-1].rsplit('.')[0]}.txt",
-        max_length=None,
-    )
-
-    if doc_text is None:
+    # the processed text is reused if it was extracted from the current content of the document
+    source_hash = get_source_hash(S3_BUCKET, file_name)
+    processed = get_object_head(S3_BUCKET, file_key)
+    if processed is None or processed["Metadata"].get(SOURCE_HASH_METADATA) != source_hash:
         object_path = pathlib.Path(file_name)
         local_file_path = f"/tmp/{file_name.split('/', 1)[-1]}"
 
@@ -92,33 +206,8 @@ def lambda_handler(event, context):  # noqa: C901
 
         extension = object_path.suffix
 
-        if extension in POWERPOINT_EXTENSIONS:
-            loader = UnstructuredPowerPointLoader(local_file_path, mode="elements")
-        elif extension in WORD_EXTENSIONS:
-            loader = UnstructuredWordDocumentLoader(local_file_path, mode="elements")
-        elif extension in EXCEL_EXTENSIONS:
-            loader = UnstructuredExcelLoader(local_file_path, mode="elements")
-        elif extension in HTML_EXTENSIONS:
-            loader = UnstructuredHTMLLoader(local_file_path, mode="elements")
-        elif extension in MARKDOWN_EXTENSIONS:
-            loader = TextLoader(local_file_path)
-
-        data = loader.load()
-
-        LOGGER.info(f"data: {data}")
-
-        pagne_nb = 1
-        raw_text = f"[page {pagne_nb}]\n"
-
-        for element in data:
-            if "page_number" in element.metadata and element.metadata["page_number"] > pagne_nb:
-                pagne_nb = element.metadata["page_number"]
-                raw_text += f"[page {pagne_nb}]\n"
-
-            if element.page_content and element.page_content.strip() != "":
-                raw_text += element.page_content + "\n"
-
-        S3_CLIENT.put_object(Body=raw_text.encode(), Bucket=S3_BUCKET, Key=file_key)
+        with S3TextWriter(S3_CLIENT, S3_BUCKET, file_key, metadata={SOURCE_HASH_METADATA: source_hash}) as writer:
+            write_document(local_file_path, extension, writer)
 
         LOGGER.info(f"Finished processing doc {file_name}")
 
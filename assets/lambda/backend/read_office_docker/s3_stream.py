@@ -0,0 +1,116 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Streaming text upload to S3
+"""
+
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+PART_SIZE = 8 * 2**20  # bytes per multipart part, S3 requires at least 5 MiB for all parts but the last
+
+
+class S3TextWriter:
+    """
+    Write text to an S3 object as it is produced, holding at most one part in memory
+
+    Objects smaller than a part are uploaded with a single put_object, larger ones with a multipart upload
+    that is completed on close and aborted on error.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        key: str,
+        content_type: str = "text/plain",
+        part_size: int = PART_SIZE,
+        metadata: dict = None,
+    ):
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._key = key
+        self._content_type = content_type
+        self._metadata = metadata or {}
+        self._part_size = part_size
+        self._buffer = bytearray()
+        self._upload_id = None
+        self._parts = []
+        self.num_bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, text: str):
+        data = text.encode()
+        self._buffer += data
+        self.num_bytes += len(data)
+        if len(self._buffer) >= self._part_size:
+            self._upload_part()
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            response = self._s3_client.create_multipart_upload(
+                Bucket=self._bucket, Key=self._key, ContentType=self._content_type, Metadata=self._metadata
+            )
+            self._upload_id = response["UploadId"]
+
+        part_number = len(self._parts) + 1
+        response = self._s3_client.upload_part(
+            Body=bytes(self._buffer),
+            Bucket=self._bucket,
+            Key=self._key,
+            PartNumber=part_number,
+            UploadId=self._upload_id,
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+        self._buffer.clear()
+
+    def discard(self):
+        """
+        Drop the text written so far and abort the multipart upload, if any, so that writing can start over
+        """
+        if self._upload_id is not None:
+            self._s3_client.abort_multipart_upload(Bucket=self._bucket, Key=self._key, UploadId=self._upload_id)
+        self._buffer.clear()
+        self._upload_id = None
+        self._parts = []
+        self.num_bytes = 0
+
+    def close(self):
+        """
+        Upload the remaining text and complete the object
+        """
+        if self._upload_id is None:
+            self._s3_client.put_object(
+                Body=bytes(self._buffer),
+                Bucket=self._bucket,
+                Key=self._key,
+                ContentType=self._content_type,
+                Metadata=self._metadata,
+            )
+        else:
+            if self._buffer:
+                self._upload_part()
+            self._s3_client.complete_multipart_upload(
+                Bucket=self._bucket,
+                Key=self._key,
+                UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts},
+            )
+        num_parts = len(self._parts) or 1
+        LOGGER.info(f"Uploaded {self.num_bytes} bytes to s3://{self._bucket}/{self._key} in {num_parts} part(s)")
+        self._buffer.clear()
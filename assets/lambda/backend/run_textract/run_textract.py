@@ -17,8 +17,11 @@ import os
 import sys
 
 import boto3
+from botocore.exceptions import ClientError
+from checkpoint import MISSING_CODES, Checkpoints, get_document_hash
+from single_flight import SingleFlight, get_flight_key
 from textractor import Textractor
-from textractor.data.constants import TextractFeatures
+from textractor.data.constants import TextractAPI, TextractFeatures
 from utils import extract_content_by_pages, get_document_text
 
 LOGGER = logging.Logger("TEXTRACT", level=logging.DEBUG)
@@ -39,6 +42,32 @@ TEXTRACT_CLIENT = boto3.client("textract")
 TEXTRACT_REGION = os.environ["TEXTRACT_REGION"]
 USE_TABLE = os.environ["USE_TABLE"]
 
+# concurrent executions of the same document share its Textract job, disabled unless enabled in config.yml
+SINGLE_FLIGHT = SingleFlight.from_env()
+
+# metadata of the processed text: hash of the document it was extracted from, a re-uploaded document is processed again
+SOURCE_HASH_METADATA = "source-hash"
+
+
+def get_source_hash(key: str) -> str:
+    """
+    Hash of the document a processed text was extracted from, None if there is no processed text
+    """
+    try:
+        return S3_CLIENT.head_object(Bucket=S3_BUCKET, Key=key)["Metadata"].get(SOURCE_HASH_METADATA)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in MISSING_CODES:
+            return None
+        raise
+
+
+def list_tables(table_prefix: str) -> list:
+    """
+    Keys of the CSV tables extracted with a processed text
+    """
+    s3_response = S3_CLIENT.list_objects_v2(Bucket=S3_BUCKET, Prefix=f"{table_prefix}/")
+    return [obj["Key"] for obj in s3_response.get("Contents", []) if obj["Key"].split(".")[-1] == "csv"]
+
 
 #########################
 #        HANDLER
@@ -62,22 +91,27 @@ def lambda_handler(event, context):  # noqa: C901
 
     file_name = body["file_name"]
     file_key = f"{PREFIX_PROCESSED}/{file_name.split('/', 1)[-1].rsplit('.')[0]}.txt"
+    table_prefix = file_key.split(".txt")[0]
     csv_tables = []
 
-    # check if processed file exists
-    doc_text = get_document_text(
-        bucket_name=S3_BUCKET,
-        prefix=PREFIX_PROCESSED,
-        file_name=f"{file_name.split('/', 1)[-1].rsplit('.')[0]}.txt",
-        max_length=None,
-    )
+    # check if processed file exists, and was extracted from the current content of the document
+    document_hash = get_document_hash(S3_CLIENT, S3_BUCKET, file_name)
+    metadata = {SOURCE_HASH_METADATA: document_hash}
+    doc_text = None
+    if get_source_hash(file_key) == document_hash:
+        doc_text = get_document_text(
+            bucket_name=S3_BUCKET,
+            prefix=PREFIX_PROCESSED,
+            file_name=f"{file_name.split('/', 1)[-1].rsplit('.')[0]}.txt",
+            max_length=None,
+        )
 
     # check if file is a TXT
     if doc_text is None and file_name.endswith(".txt"):
         s3_resource = boto3.resource("s3")
         content_object = s3_resource.Object(S3_BUCKET, file_name)
         doc_text = content_object.get()["Body"].read().decode("utf-8")
-        S3_CLIENT.put_object(Body=doc_text.encode(), Bucket=S3_BUCKET, Key=file_key)
+        S3_CLIENT.put_object(Body=doc_text.encode(), Bucket=S3_BUCKET, Key=file_key, Metadata=metadata)
         LOGGER.info(f"Uploaded text to: {file_key}")
 
     # run Textract
@@ -87,17 +121,37 @@ def lambda_handler(event, context):  # noqa: C901
         if not USE_TABLE:
             extractor_kwargs = {"features": [TextractFeatures.LAYOUT], "save_image": False}
         file_source = f"s3://{S3_BUCKET}/{file_name}"
-        parsed_document = extractor.start_document_analysis(file_source, **extractor_kwargs)
 
-        # extract text content
-        doc_text, tables = extract_content_by_pages(parsed_document, LOGGER)
-
-        # save processed text to S3
-        S3_CLIENT.put_object(Body=doc_text.encode(), Bucket=S3_BUCKET, Key=file_key)
+        # a retry or a re-submission of the same document resumes the Textract job instead of starting a new one
+        checkpoints = Checkpoints.from_env(S3_CLIENT, S3_BUCKET, document_hash, event.get("execution_name"))
+        checkpoint_inputs = {"features": [feature.name for feature in extractor_kwargs["features"]]}
+        checkpoint = checkpoints.load("textract-job", checkpoint_inputs)
+        if checkpoint is not None:
+            try:
+                parsed_document = extractor.get_result(checkpoint["job_id"], TextractAPI.ANALYZE)
+                doc_text, tables = extract_content_by_pages(parsed_document, LOGGER)
+            except Exception as e:  # noqa: BLE001 e.g. a job whose results expired, it is started again
+                LOGGER.warning(f"Could not resume the Textract job {checkpoint['job_id']}: {e}")
+        if doc_text is None:
+            # the first concurrent caller starts the job, the others get its results
+            job, _ = SINGLE_FLIGHT.run(
+                get_flight_key(checkpoints.document_hash, "textract-job", checkpoint_inputs),
+                lambda: {"job_id": extractor.start_document_analysis(file_source, **extractor_kwargs).job_id},
+            )
+            checkpoints.save("textract-job", job, checkpoint_inputs)
+            parsed_document = extractor.get_result(job["job_id"], TextractAPI.ANALYZE)
+
+            # extract text content
+            doc_text, tables = extract_content_by_pages(parsed_document, LOGGER)
+
+        # save processed text to S3, replacing the tables of a previous version of the document
+        S3_CLIENT.put_object(Body=doc_text.encode(), Bucket=S3_BUCKET, Key=file_key, Metadata=metadata)
         LOGGER.info(f"Uploaded text to: {file_key}")
+        for table_key in list_tables(table_prefix):
+            S3_CLIENT.delete_object(Bucket=S3_BUCKET, Key=table_key)
         for title, table in tables.items():
             csv_title = title.replace("Title:", "").strip() + ".csv"
-            table_key = file_key.split(".txt")[0] + "/" + csv_title
+            table_key = table_prefix + "/" + csv_title
             csv_buffer = io.StringIO()
             table.to_csv(csv_buffer)
             S3_CLIENT.put_object(Body=csv_buffer.getvalue(), Bucket=S3_BUCKET, Key=table_key)
@@ -108,13 +162,9 @@ def lambda_handler(event, context):  # noqa: C901
     else:
         LOGGER.info("Found processed file. Skipping Textract...")
         if USE_TABLE:
-            table_prefix = file_key.split(".txt")[0]
             LOGGER.info(f"Found processed file. Skipping Textract. Retrieve csv tables with prefix {table_prefix}...")
-            s3_response = S3_CLIENT.list_objects_v2(Bucket=S3_BUCKET, Prefix=f"{table_prefix}/")
-            try:
-                related_files = [obj["Key"] for obj in s3_response["Contents"]]
-                csv_tables = [f for f in related_files if f.split(".")[-1] == "csv"]
-            except KeyError:
+            csv_tables = list_tables(table_prefix)
+            if not csv_tables:
                 LOGGER.debug("No related table found")
 
     return {
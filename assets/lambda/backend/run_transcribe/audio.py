@@ -0,0 +1,328 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Audio preprocessing utilities: silence trimming, mono downmix and resampling
+"""
+
+import bisect
+import io
+import wave
+from typing import BinaryIO, Callable, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+
+TARGET_SAMPLE_RATE = 16_000  # sample rate of the audio sent to Transcribe, enough for speech
+FRAME_S = 0.03  # length of the frames used to detect speech
+SILENCE_MARGIN_DB = 12  # frames louder than the noise floor by this margin count as speech
+MIN_THRESHOLD_DB = -55  # frames quieter than this (dBFS) never count as speech
+MAX_THRESHOLD_DB = -35  # frames louder than this (dBFS) always count as speech
+MIN_SILENCE_S = 1.0  # internal silences shorter than this are kept as is
+KEEP_SILENCE_S = 0.25  # silence kept on each side of a speech segment
+MAX_PART_S = 600  # max length of the parts of a long recording that are transcribed concurrently
+SPLIT_SEARCH_S = 30  # length of the window before the max part length searched for the quietest split point
+BLOCK_FRAMES = 1 << 16  # no. frames of the original recording decoded at once
+BLOCK_NUM_FRAMES = 1 << 16  # no. speech detection frames whose energy is computed at once
+
+
+def decode_pcm(frames: bytes, sample_width: int, num_channels: int) -> np.ndarray:
+    """
+    Decode PCM WAV frames and downmix them to mono
+
+    Parameters
+    ----------
+    frames : bytes
+        Interleaved PCM frames
+    sample_width : int
+        Size of a sample in bytes
+    num_channels : int
+        No. channels
+
+    Returns
+    -------
+    np.ndarray
+        Mono samples in [-1, 1]
+    """
+    if sample_width == 1:  # 8-bit PCM is unsigned
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 3:  # 24-bit PCM, left-align every sample in 32 bits
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        padded = np.zeros((raw.shape[0], 4), dtype=np.uint8)
+        padded[:, 1:] = raw
+        samples = padded.view("<i4").ravel().astype(np.float32) / 2**31
+    else:
+        samples = np.frombuffer(frames, dtype=f"<i{sample_width}").astype(np.float32) / 2 ** (8 * sample_width - 1)
+
+    if num_channels == 1:
+        return samples
+    return samples.reshape(-1, num_channels).mean(axis=1, dtype=np.float32)
+
+
+class Resampler:
+    """
+    Resample mono samples with linear interpolation, block by block
+
+    A moving average over one target sample period limits aliasing. Positions are computed per block, relative to
+    the block, so that memory does not grow with the length of the recording.
+    """
+
+    def __init__(self, sample_rate: int, target_sample_rate: int = TARGET_SAMPLE_RATE):
+        self.ratio = sample_rate / target_sample_rate
+        width = max(int(round(self.ratio)), 1)
+        self.kernel = np.full(width, 1 / width, dtype=np.float32)
+        self.delay = (len(self.kernel) - 1) / 2  # lag of the causal moving average, in original samples
+        self.history = np.zeros(len(self.kernel) - 1, dtype=np.float32)  # last samples, for the moving average
+        self.previous = np.zeros(1, dtype=np.float32)  # last filtered sample, for the interpolation
+        self.num_filtered = 0
+        self.num_resampled = 0
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Resample the next block of samples, the output lags behind the input by less than two samples
+        """
+        if len(self.kernel) > 1:
+            padded = np.concatenate((self.history, samples))
+            self.history = padded[len(padded) - len(self.history) :]
+            samples = np.convolve(padded, self.kernel, mode="valid")
+
+        # the buffer starts with the last filtered sample of the previous block, at index num_filtered - 1
+        buffer = np.concatenate((self.previous, samples))
+        buffer_start = self.num_filtered - 1
+        self.num_filtered += len(samples)
+        self.previous = buffer[-1:]
+
+        last = int(np.floor((self.num_filtered - 1 - self.delay) / self.ratio))
+        if last < self.num_resampled:
+            return np.zeros(0, dtype=np.float32)
+        positions = np.arange(self.num_resampled, last + 1) * self.ratio + (self.delay - buffer_start)
+        self.num_resampled = last + 1
+
+        idx = np.minimum(positions.astype(np.int64), len(buffer) - 2)
+        weights = (positions - idx).astype(np.float32)
+        return buffer[idx] * (1 - weights) + buffer[idx + 1] * weights
+
+    def flush(self) -> np.ndarray:
+        """
+        Resample the end of the recording, padded with silence
+        """
+        return self.process(np.zeros(len(self.kernel) + 1, dtype=np.float32))
+
+
+def iter_wav_blocks(
+    wav: wave.Wave_read, target_sample_rate: int = TARGET_SAMPLE_RATE, block_frames: int = BLOCK_FRAMES
+) -> Iterator[np.ndarray]:
+    """
+    Decode an open WAV recording block by block, downmixed to mono and resampled to target_sample_rate
+    """
+    sample_rate = wav.getframerate()
+    resampler = Resampler(sample_rate, target_sample_rate) if sample_rate != target_sample_rate else None
+    while True:
+        frames = wav.readframes(block_frames)
+        if not frames:
+            break
+        block = decode_pcm(frames, wav.getsampwidth(), wav.getnchannels())
+        yield block if resampler is None else resampler.process(block)
+    if resampler is not None:
+        yield resampler.flush()
+
+
+def read_wav(
+    source: Union[bytes, BinaryIO], target_sample_rate: int = TARGET_SAMPLE_RATE, block_frames: int = BLOCK_FRAMES
+) -> np.ndarray:
+    """
+    Decode PCM WAV content block by block, downmixed to mono and resampled
+
+    Only the resampled mono samples are held in memory, the original recording is read as a stream
+
+    Parameters
+    ----------
+    source : Union[bytes, BinaryIO]
+        Content of the WAV file, or a stream of it such as the body of an S3 object
+    target_sample_rate : int
+        Sample rate of the output, by default TARGET_SAMPLE_RATE
+    block_frames : int
+        No. frames decoded at once, by default BLOCK_FRAMES
+
+    Returns
+    -------
+    np.ndarray
+        Mono samples in [-1, 1] at target_sample_rate
+    """
+    with wave.open(io.BytesIO(source) if isinstance(source, bytes) else source) as wav:
+        samples = np.zeros(int(round(wav.getnframes() * target_sample_rate / wav.getframerate())), dtype=np.float32)
+        num_samples = 0
+        for block in iter_wav_blocks(wav, target_sample_rate, block_frames):
+            block = block[: len(samples) - num_samples]
+            samples[num_samples : num_samples + len(block)] = block
+            num_samples += len(block)
+
+    return samples[:num_samples]
+
+
+def write_wav(samples: np.ndarray, sample_rate: int) -> bytes:
+    """
+    Encode mono samples in [-1, 1] as 16-bit PCM WAV
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes((np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def get_speech_segments(samples: np.ndarray, sample_rate: int) -> List[Tuple[int, int]]:
+    """
+    Locate speech with an energy-based detector
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        Mono samples
+    sample_rate : int
+        Sample rate
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        Start and end sample of every segment to keep, padded with KEEP_SILENCE_S and merged
+        across silences shorter than MIN_SILENCE_S
+    """
+    frame_len = max(int(sample_rate * FRAME_S), 1)
+    num_frames = len(samples) // frame_len
+    if num_frames == 0:
+        return []
+
+    frame_db = np.empty(num_frames, dtype=np.float32)
+    for first in range(0, num_frames, BLOCK_NUM_FRAMES):
+        last = min(first + BLOCK_NUM_FRAMES, num_frames)
+        frames = samples[first * frame_len : last * frame_len].reshape(last - first, frame_len)
+        frame_db[first:last] = 20 * np.log10(np.sqrt(np.mean(frames**2, axis=1)) + 1e-10)
+    noise_floor_db = np.percentile(frame_db, 10)
+    threshold_db = min(max(noise_floor_db + SILENCE_MARGIN_DB, MIN_THRESHOLD_DB), MAX_THRESHOLD_DB)
+    is_speech = np.concatenate(([0], (frame_db > threshold_db).astype(np.int8), [0]))
+
+    # runs of speech frames, as [start, end) frame indices
+    edges = np.flatnonzero(np.diff(is_speech))
+    runs = []
+    for start, end in zip(edges[::2] * frame_len, edges[1::2] * frame_len):
+        if runs and start - runs[-1][1] < MIN_SILENCE_S * sample_rate:
+            runs[-1] = (runs[-1][0], end)
+        else:
+            runs.append((start, end))
+
+    padding = int(KEEP_SILENCE_S * sample_rate)
+    return [(max(int(start) - padding, 0), min(int(end) + padding, len(samples))) for start, end in runs]
+
+
+def preprocess_wav(source: Union[bytes, BinaryIO]) -> Tuple[np.ndarray, List[Dict[str, float]]]:
+    """
+    Downmix to mono, resample to TARGET_SAMPLE_RATE and cut silences out of a WAV recording
+
+    Parameters
+    ----------
+    source : Union[bytes, BinaryIO]
+        Content of the original WAV file, or a stream of it such as the body of an S3 object
+
+    Returns
+    -------
+    Tuple[np.ndarray, List[Dict[str, float]]]
+        Preprocessed mono samples at TARGET_SAMPLE_RATE, and the timestamp map with one entry per kept segment:
+        its start and end in the preprocessed audio and its start in the original audio, in seconds
+    """
+    samples = read_wav(source)
+
+    # keep recordings without detected speech as is, so that Transcribe still returns an (empty) transcript
+    segments = get_speech_segments(samples, TARGET_SAMPLE_RATE) or [(0, len(samples))]
+
+    # segments are sorted and disjoint, so the kept audio is moved to the front of the same buffer
+    timestamp_map = []
+    offset = 0
+    for start, end in segments:
+        samples[offset : offset + end - start] = samples[start:end]
+        timestamp_map.append(
+            {
+                "start": round(offset / TARGET_SAMPLE_RATE, 3),
+                "end": round((offset + end - start) / TARGET_SAMPLE_RATE, 3),
+                "original_start": round(start / TARGET_SAMPLE_RATE, 3),
+            }
+        )
+        offset += end - start
+
+    return samples[:offset], timestamp_map
+
+
+def split_audio(samples: np.ndarray, sample_rate: int, max_part_s: float = MAX_PART_S) -> List[Tuple[int, int]]:
+    """
+    Split a long recording into parts at the quietest frame before every max_part_s boundary
+
+    Parameters
+    ----------
+    samples : np.ndarray
+        Mono samples
+    sample_rate : int
+        Sample rate
+    max_part_s : float
+        Max length of a part in seconds, by default MAX_PART_S
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        Start and end sample of every part
+    """
+    max_len = int(max_part_s * sample_rate)
+    frame_len = max(int(sample_rate * FRAME_S), 1)
+    search_len = min(int(SPLIT_SEARCH_S * sample_rate), max_len)
+
+    parts = []
+    start = 0
+    while len(samples) - start > max_len:
+        window_start = start + max_len - search_len
+        num_frames = search_len // frame_len
+        frames = samples[window_start : window_start + num_frames * frame_len].reshape(num_frames, frame_len)
+        split = window_start + int(np.argmin(np.mean(frames**2, axis=1))) * frame_len
+        parts.append((start, split))
+        start = split
+    parts.append((start, len(samples)))
+    return parts
+
+
+def map_timestamps(data, map_time: Callable[[float], float]):
+    """
+    Apply map_time to all start_time and end_time fields of a Transcribe output, in place
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in ("start_time", "end_time") and isinstance(value, str):
+                data[key] = f"{map_time(float(value)):.3f}"
+            else:
+                map_timestamps(value, map_time)
+    elif isinstance(data, list):
+        for item in data:
+            map_timestamps(item, map_time)
+    return data
+
+
+def get_time_mapper(timestamp_map: List[Dict[str, float]]) -> Callable[[float], float]:
+    """
+    Build a function that maps a time in the preprocessed audio to the original audio
+
+    Parameters
+    ----------
+    timestamp_map : List[Dict[str, float]]
+        Timestamp map returned by preprocess_wav
+
+    Returns
+    -------
+    Callable[[float], float]
+        Time mapping, in seconds
+    """
+    starts = [segment["start"] for segment in timestamp_map]
+
+    def map_time(time: float) -> float:
+        segment = timestamp_map[max(bisect.bisect_right(starts, time) - 1, 0)]
+        return segment["original_start"] + time - segment["start"]
+
+    return map_time
@@ -0,0 +1,245 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Stage checkpoints: small records of finished work that a retried or re-submitted task resumes from
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+LOGGER = logging.Logger("CHECKPOINT", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+CHECKPOINT_PREFIX = "checkpoints"  # expired by a lifecycle rule of the data bucket
+SCHEMA_VERSION = 1  # records of another version are ignored
+MISSING_CODES = {"NoSuchKey", "404", "NotFound"}
+
+
+def hash_bytes(*parts: bytes) -> str:
+    """
+    Hash of the content of a document, e.g. the page images read by a Lambda
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()[:32]
+
+
+def get_document_hash(s3_client, bucket: str, key: str) -> str:
+    """
+    Hash of an S3 object from its ETag and size, without reading it
+    """
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    return hash_bytes(f"{head['ETag']}:{head['ContentLength']}".encode())
+
+
+def get_fingerprint(inputs: Optional[Dict[str, Any]]) -> str:
+    """
+    Hash of the inputs a stage's result depends on, e.g. the model and its parameters
+    """
+    return hashlib.sha256(json.dumps(inputs or {}, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class S3CheckpointStore:
+    """
+    Checkpoint records stored as JSON objects under a prefix of the data bucket
+    """
+
+    def __init__(self, s3_client, bucket: str, prefix: str = CHECKPOINT_PREFIX):
+        self._s3_client = s3_client
+        self._bucket = bucket
+        self._prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            response = self._s3_client.get_object(Bucket=self._bucket, Key=f"{self._prefix}/{key}")
+        except ClientError as e:
+            if e.response["Error"]["Code"] in MISSING_CODES:
+                return None
+            raise
+        return json.loads(response["Body"].read())
+
+    def put(self, key: str, record: Dict[str, Any]):
+        self._s3_client.put_object(
+            Body=json.dumps(record).encode(),
+            Bucket=self._bucket,
+            Key=f"{self._prefix}/{key}",
+            ContentType="application/json",
+        )
+
+    def exists(self, object_key: str) -> bool:
+        try:
+            self._s3_client.head_object(Bucket=self._bucket, Key=object_key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in MISSING_CODES:
+                return False
+            raise
+
+    def list(self, prefix: str) -> List[str]:
+        paginator = self._s3_client.get_paginator("list_objects_v2")
+        keys = []
+        for page in paginator.paginate(Bucket=self._bucket, Prefix=f"{self._prefix}/{prefix}"):
+            keys.extend(obj["Key"][len(self._prefix) + 1 :] for obj in page.get("Contents", []))
+        return keys
+
+    def delete(self, key: str):
+        self._s3_client.delete_object(Bucket=self._bucket, Key=f"{self._prefix}/{key}")
+
+
+class LocalCheckpointStore:
+    """
+    Checkpoint records stored as JSON files in a directory, for local runs and tests
+
+    The directory stands for the bucket: the artifacts of a record are files relative to it.
+    """
+
+    def __init__(self, directory: str, prefix: str = CHECKPOINT_PREFIX):
+        self._directory = directory
+        self._prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self._directory, self._prefix, key)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def put(self, key: str, record: Dict[str, Any]):
+        path = os.path.join(self._directory, self._prefix, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(record, f)
+
+    def exists(self, object_key: str) -> bool:
+        return os.path.exists(os.path.join(self._directory, object_key))
+
+    def list(self, prefix: str) -> List[str]:
+        root = os.path.join(self._directory, self._prefix)
+        keys = []
+        for directory, _, files in os.walk(root):
+            keys.extend(os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/") for name in files)
+        return sorted(key for key in keys if key.startswith(prefix))
+
+    def delete(self, key: str):
+        path = os.path.join(self._directory, self._prefix, key)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class Checkpoints:
+    """
+    Checkpoints of the stages of a document, keyed by the document hash, the stage and its inputs
+
+    A deterministic stage (rendered pages, OCR, transcription) is resumed by any execution processing the same
+    document. A stage with per_execution=True (model answers) is only resumed by retries of its execution, so a
+    re-submitted document gets a new answer. Checkpoints never fail a task: a record that cannot be read or
+    written is logged and the stage runs.
+
+    Parameters
+    ----------
+    store : S3CheckpointStore or LocalCheckpointStore, optional
+        Record store, None disables the checkpoints
+    document_hash : str
+        Hash of the document content, see get_document_hash and hash_bytes
+    execution_name : str, optional
+        Name of the Step Functions execution, None for API invocations
+    """
+
+    def __init__(self, store, document_hash: str, execution_name: Optional[str] = None):
+        self.store = store
+        self.document_hash = document_hash
+        self.execution_name = execution_name
+        self.resumed: List[str] = []  # stages resumed from a checkpoint, returned in the Lambda output
+
+    @classmethod
+    def from_env(
+        cls,
+        s3_client,
+        bucket: str,
+        document_hash: str,
+        execution_name: Optional[str] = None,
+        variable: str = "CHECKPOINTS_ENABLED",
+        directory_variable: str = "CHECKPOINT_DIR",
+    ) -> "Checkpoints":
+        """
+        Checkpoints in the data bucket, unless disabled in the checkpoints section of config.yml
+
+        For local runs, CHECKPOINT_DIR stores them in a local directory instead, standing for the bucket.
+        """
+        if os.environ.get(variable, "True") != "True":
+            return cls(None, document_hash, execution_name)
+        directory = os.environ.get(directory_variable)
+        store = LocalCheckpointStore(directory) if directory else S3CheckpointStore(s3_client, bucket)
+        return cls(store, document_hash, execution_name)
+
+    def _key(self, stage: str, inputs: Optional[Dict[str, Any]], per_execution: bool) -> Optional[str]:
+        if self.store is None or (per_execution and not self.execution_name):
+            return None
+        if per_execution:
+            inputs = dict(inputs or {}, execution_name=self.execution_name)
+        return f"{self.document_hash}/{stage}/{get_fingerprint(inputs)}.json"
+
+    def load(
+        self, stage: str, inputs: Optional[Dict[str, Any]] = None, per_execution: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Data of the latest valid checkpoint of a stage, None if the stage has to run
+
+        A checkpoint is valid if it has the current schema version and all its artifacts still exist.
+        """
+        key = self._key(stage, inputs, per_execution)
+        if key is None:
+            return None
+        try:
+            record = self.store.get(key)
+            if record is None or record.get("version") != SCHEMA_VERSION:
+                return None
+            missing = [artifact for artifact in record.get("artifacts", []) if not self.store.exists(artifact)]
+        except Exception as e:  # noqa: BLE001 the stage runs without its checkpoint
+            LOGGER.warning(f"Could not read the checkpoint {key}: {e}")
+            return None
+        if missing:
+            LOGGER.info(f"Checkpoint {key} is stale, missing artifacts: {missing}")
+            return None
+        LOGGER.info(f"Resuming {stage} from the checkpoint of {record.get('execution_name')}")
+        self.resumed.append(stage)
+        return record["data"]
+
+    def save(
+        self,
+        stage: str,
+        data: Dict[str, Any],
+        inputs: Optional[Dict[str, Any]] = None,
+        artifacts: Iterable[str] = (),
+        per_execution: bool = False,
+    ):
+        """
+        Record the result of a stage with the S3 keys of the artifacts it depends on
+        """
+        key = self._key(stage, inputs, per_execution)
+        if key is None:
+            return
+        record = {
+            "version": SCHEMA_VERSION,
+            "stage": stage,
+            "execution_name": self.execution_name,
+            "created_at": int(time.time()),
+            "artifacts": [artifact for artifact in artifacts if artifact],
+            "data": data,
+        }
+        try:
+            self.store.put(key, record)
+        except Exception as e:  # noqa: BLE001 the result is returned without its checkpoint
+            LOGGER.warning(f"Could not write the checkpoint {key}: {e}")
@@ -0,0 +1,84 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Incremental JSON reading and writing with bounded memory
+"""
+
+import json
+from typing import IO, Any, Iterable, Iterator, Tuple
+
+import ijson
+
+CONTAINER_START_EVENTS = ("start_map", "start_array")
+
+
+def iter_json_values(stream: IO[bytes], prefixes: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the values found at the given prefixes of a JSON document, one at a time
+
+    Only the value currently being built is held in memory, so a list of items can be processed
+    without loading the whole document.
+
+    Parameters
+    ----------
+    stream : IO[bytes]
+        File-like JSON source, e.g. the body of an S3 object
+    prefixes : Iterable[str]
+        ijson prefixes of the values to extract, e.g. "results.items.item" for every element of results.items
+
+    Yields
+    ------
+    Tuple[str, Any]
+        Prefix and value
+    """
+    prefixes = set(prefixes)
+    current_prefix, builder = None, None
+
+    for prefix, event, value in ijson.parse(stream, use_float=True):
+        if current_prefix is None:
+            if prefix not in prefixes or event == "map_key" or event.startswith("end_"):
+                continue
+            current_prefix, builder = prefix, ijson.ObjectBuilder()
+
+        builder.event(event, value)
+        if prefix == current_prefix and event != "map_key" and event not in CONTAINER_START_EVENTS:
+            yield current_prefix, builder.value
+            current_prefix, builder = None, None
+
+
+def get_json_value(stream: IO[bytes], prefix: str, default: Any = None) -> Any:
+    """
+    Return the first value found at the prefix of a JSON document, without parsing the rest of it
+    """
+    for _, value in iter_json_values(stream, [prefix]):
+        return value
+    return default
+
+
+class JsonArrayWriter:
+    """
+    Write the elements of a JSON array to a file one at a time
+    """
+
+    def __init__(self, fileobj: IO[str]):
+        self._fileobj = fileobj
+        self._count = 0
+
+    def __enter__(self):
+        self._fileobj.write("[")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._fileobj.write("]")
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def write(self, value: Any):
+        if self._count:
+            self._fileobj.write(", ")
+        json.dump(value, self._fileobj)
+        self._count += 1
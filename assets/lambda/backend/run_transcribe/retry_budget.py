@@ -0,0 +1,240 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Retry budget of a task, shared by the botocore clients, the Lambda code and the Step Functions retries
+"""
+
+import functools
+import json
+import logging
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from botocore.exceptions import ConnectionError as BotocoreConnectionError
+from botocore.exceptions import HTTPClientError
+
+LOGGER = logging.Logger("RETRY-BUDGET", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+DEFAULT_RETRY_BUDGET = 3  # retries of a task without a budget in its payload, e.g. API invocations
+METRICS_NAMESPACE = "Tabulate"
+
+# service errors worth retrying, the others (validation, access, missing object, ...) fail the same way again
+RETRYABLE_ERROR_CODES = {
+    "ThrottlingException",
+    "Throttling",
+    "TooManyRequestsException",
+    "LimitExceededException",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "SlowDown",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "InternalError",
+    "InternalFailureException",
+    "InternalServerException",
+    "InternalServerError",
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "RequestTimeout",
+    "RequestTimeoutException",
+}
+
+
+class RetryableError(Exception):
+    """
+    Transient failure of a task, retried by Step Functions while the budget allows it
+    """
+
+
+class NonRetryableError(Exception):
+    """
+    Failure of a task that a retry would not fix, or that already spent its budget
+    """
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Classify an error: throttling, transient service errors and connection errors are retryable
+
+    Errors may carry their own classification in a retryable attribute, e.g. ConverseError, GovernorTimeout
+    (capacity comes back) and DeadlineExceeded (a retry would time out again).
+    """
+    if isinstance(error, RetryableError):
+        return True
+    if isinstance(error, NonRetryableError):
+        return False
+    retryable = getattr(error, "retryable", None)
+    if retryable is not None:
+        return bool(retryable)
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in RETRYABLE_ERROR_CODES
+    return isinstance(error, (BotocoreConnectionError, HTTPClientError))
+
+
+class RetryBudget:
+    """
+    Retries allowed to a task across the layers that retry: the botocore clients, the retry loops of the
+    Lambda code and the Step Functions Retry of the task
+
+    Step Functions restarts a failed task with the same payload, so the task's budget and its retry count
+    ($$.State.RetryCount) are passed in the payload and every attempt starts with the budget left. An attempt
+    that already retried in the Lambda code does not ask Step Functions for a restart: its error is not a
+    transient one, and the task cannot retry more than its budget in total.
+
+    Parameters
+    ----------
+    stage : str
+        Name of the task, dimension of the metrics
+    budget : int, optional
+        Retries of the task, by default DEFAULT_RETRY_BUDGET
+    state_retries : int, optional
+        Retries of the task already made by Step Functions, by default 0
+    """
+
+    def __init__(self, stage: str, budget: int = DEFAULT_RETRY_BUDGET, state_retries: int = 0):
+        self.stage = stage
+        self.budget = budget
+        self.state_retries = state_retries
+        self.spent: Counter = Counter()
+
+    @classmethod
+    def from_event(cls, event: dict, stage: str) -> "RetryBudget":
+        """
+        Budget of a Lambda invocation, from the retry_budget, retry_count and state_name fields of a Step Functions
+        payload, the state name replaces the default stage name in the metrics
+        """
+        return cls(
+            event.get("state_name", stage),
+            int(event.get("retry_budget", DEFAULT_RETRY_BUDGET)),
+            int(event.get("retry_count", 0)),
+        )
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.budget - self.state_retries - sum(self.spent.values()))
+
+    def spend(self, reason: str, retries: int = 1) -> bool:
+        """
+        Spend retries before retrying, False if the budget is exhausted and the error should be raised
+        """
+        if self.remaining < retries:
+            LOGGER.warning(f"Retry budget of {self.stage} exhausted, {reason} is not retried")
+            return False
+        self.spent[reason] += retries
+        return True
+
+    def record(self, reason: str, retries: int):
+        """
+        Record retries already made, e.g. by a botocore client, even beyond the budget
+        """
+        if retries:
+            self.spent[reason] += retries
+
+    def botocore_config(self, **kwargs) -> Config:
+        """
+        Client configuration retrying at most the remaining budget, instrument the client to record its retries
+        """
+        return Config(retries={"max_attempts": 1 + self.remaining, "mode": "standard"}, **kwargs)
+
+    def can_restart(self, error: BaseException) -> bool:
+        """
+        Whether Step Functions should retry the task after this error
+        """
+        return is_retryable(error) and not self.spent and self.remaining > 0
+
+    def escalate(self, error: BaseException) -> Exception:
+        """
+        Error to fail the task with, its type is matched by the Retry of the task in the state machine
+        """
+        if isinstance(error, (RetryableError, NonRetryableError)):
+            return error
+        message = f"{type(error).__name__}: {error}"
+        return RetryableError(message) if self.can_restart(error) else NonRetryableError(message)
+
+    def emit_metrics(self):
+        """
+        Log the retries of the invocation in the CloudWatch embedded metric format
+        """
+        print(
+            json.dumps(
+                {
+                    "_aws": {
+                        "Timestamp": int(time.time() * 1000),
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": METRICS_NAMESPACE,
+                                "Dimensions": [["Stage"]],
+                                "Metrics": [
+                                    {"Name": "RetriesSpent", "Unit": "Count"},
+                                    {"Name": "StateRetries", "Unit": "Count"},
+                                ],
+                            }
+                        ],
+                    },
+                    "Stage": self.stage,
+                    "RetriesSpent": sum(self.spent.values()),
+                    "StateRetries": self.state_retries,
+                    "RetryBudget": self.budget,
+                    "RetryReasons": dict(self.spent),
+                }
+            )
+        )
+
+
+# budget of the running invocation, a Lambda execution environment serves one invocation at a time
+_ACTIVE: Optional[RetryBudget] = None
+
+
+def instrument(client):
+    """
+    Record the retries of a botocore client in the budget of the running invocation
+
+    Clients are created once per execution environment, the hook charges whichever invocation is running.
+    """
+
+    def record_retries(http_response, parsed, model, **kwargs):
+        attempts = (parsed or {}).get("ResponseMetadata", {}).get("RetryAttempts", 0)
+        if _ACTIVE is not None and attempts:
+            _ACTIVE.record(f"{client.meta.service_model.service_name}:{model.name}", attempts)
+
+    client.meta.events.register("after-call.*.*", record_retries)
+    return client
+
+
+def with_retry_budget(stage: str) -> Callable:
+    """
+    Decorate a Lambda handler taking the retry budget as third argument
+
+    The budget is created from the event, failures are classified for the Retry of the task and the retries
+    spent are logged as metrics.
+    """
+
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        def wrapper(event: Dict, context):
+            global _ACTIVE
+            _ACTIVE = retry_budget = RetryBudget.from_event(event, stage)
+            try:
+                return handler(event, context, retry_budget)
+            except Exception as e:
+                error = retry_budget.escalate(e)
+                if error is e:
+                    raise
+                LOGGER.error(f"{stage} failed with {type(error).__name__}: {e}")
+                raise error from e
+            finally:
+                _ACTIVE = None
+                retry_budget.emit_metrics()
+
+        return wrapper
+
+    return decorator
@@ -1,24 +1,123 @@
 import json
 import boto3
+from botocore.exceptions import ClientError
 import os
 import sys
 import logging
-import time
+import wave
 from urllib.parse import unquote_plus
 
+from audio import TARGET_SAMPLE_RATE, get_time_mapper, preprocess_wav, split_audio, write_wav
+from checkpoint import Checkpoints, get_document_hash
+from retry_budget import RetryBudget, instrument, with_retry_budget
+from single_flight import SingleFlight, get_flight_key
+from transcription import read_transcript, start_transcription_job, wait_for_transcription_jobs, write_transcript
+
 #########################
 #       CONSTANTS
 #########################
 
 S3_BUCKET = os.environ["BUCKET_NAME"]
 
+PREFIX_PREPROCESSED = "preprocessed"
+PREFIX_TRANSCRIPT_PARTS = "transcripts/parts"
+LOCAL_TRANSCRIPT_PATH = "/tmp/transcript.json"
+
+# concurrent executions of the same recording share its transcription jobs, disabled unless enabled in config.yml
+SINGLE_FLIGHT = SingleFlight.from_env()
+
 LOGGER = logging.Logger("TEXTRACT", level=logging.DEBUG)
 HANDLER = logging.StreamHandler(sys.stdout)
 HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
 LOGGER.addHandler(HANDLER)
 
 
-def lambda_handler(event, context):
+def start_transcription_jobs(s3, transcribe, source_key: str, file_extension: str, file_stem: str):
+    """
+    Preprocess a recording and start one transcription job per part
+
+    Returns
+    -------
+    dict
+        Job names, output keys, offsets of the parts and key of the timestamp map
+    """
+    # Trim silences, downmix and resample PCM recordings, and split long ones at silences
+    media_keys = [source_key]
+    offsets = [0.0]
+    media_params = {}
+    timestamp_map = None
+    if file_extension == "wav":
+        try:
+            # the original recording is decoded as a stream, only the preprocessed audio is held in memory
+            original_audio = s3.get_object(Bucket=S3_BUCKET, Key=source_key)["Body"]
+            samples, timestamp_map = preprocess_wav(original_audio)
+            original_audio.close()
+            parts = split_audio(samples, TARGET_SAMPLE_RATE)
+            media_keys, offsets = [], []
+            for idx, (start, end) in enumerate(parts):
+                media_key = f"{PREFIX_PREPROCESSED}/{file_stem}"
+                if len(parts) > 1:
+                    media_key = f"{media_key}.part{idx}.wav"
+                s3.put_object(
+                    Bucket=S3_BUCKET,
+                    Key=media_key,
+                    Body=write_wav(samples[start:end], TARGET_SAMPLE_RATE),
+                    ContentType="audio/wav",
+                )
+                media_keys.append(media_key)
+                offsets.append(start / TARGET_SAMPLE_RATE)
+            s3.put_object(
+                Bucket=S3_BUCKET,
+                Key=f"{PREFIX_PREPROCESSED}/{file_stem}.timestamps.json",
+                Body=json.dumps(timestamp_map).encode('utf-8'),
+                ContentType="application/json",
+            )
+            media_params = {"MediaSampleRateHertz": TARGET_SAMPLE_RATE}
+            LOGGER.info(
+                f"Preprocessed audio: {len(timestamp_map)} segments, {timestamp_map[-1]['end']}s kept "
+                f"in {len(parts)} parts"
+            )
+            del original_audio, samples
+        except (wave.Error, EOFError) as e:
+            LOGGER.warning(f"Could not preprocess {source_key}, sending the original audio: {e}")
+
+    # Start one transcription job per part, they run concurrently. Raw outputs are never written to output_key, the
+    # transcript mapped to the original recording is, so a retry or a resumed job maps the raw outputs again
+    output_keys = [f"{PREFIX_TRANSCRIPT_PARTS}/{file_stem}.part{idx}.json" for idx in range(len(media_keys))]
+    job_names = [
+        start_transcription_job(
+            transcribe,
+            media_uri=f"s3://{S3_BUCKET}/{media_key}",
+            media_format=file_extension,
+            output_bucket=S3_BUCKET,
+            output_key=part_output_key,
+            media_params=media_params,
+        )
+        for media_key, part_output_key in zip(media_keys, output_keys)
+    ]
+    LOGGER.info(f"Started transcription jobs: {job_names}")
+
+    timestamps_key = f"{PREFIX_PREPROCESSED}/{file_stem}.timestamps.json" if timestamp_map else None
+    return {"job_names": job_names, "output_keys": output_keys, "offsets": offsets, "timestamps_key": timestamps_key}
+
+
+def resume_transcription_jobs(transcribe, jobs: dict):
+    """
+    Wait for the jobs of a checkpoint, None if one of them failed or no longer exists and they are started again
+    """
+    try:
+        statuses = wait_for_transcription_jobs(transcribe, jobs["job_names"])
+    except ClientError as e:
+        LOGGER.warning(f"Could not resume the transcription jobs {jobs['job_names']}: {e}")
+        return None
+    if any(status != "COMPLETED" for status in statuses.values()):
+        LOGGER.warning(f"Resumed transcription jobs failed, starting them again: {statuses}")
+        return None
+    return statuses
+
+
+@with_retry_budget("extract-audio")
+def lambda_handler(event, context, retry_budget: RetryBudget):
     # parse event
     if "requestContext" in event:
         LOGGER.info("Received HTTP request.")
@@ -28,9 +127,9 @@ def lambda_handler(event, context):
     LOGGER.info(f"Received input: {body}")
 
 
-    # Initialize AWS clients
-    transcribe = boto3.client('transcribe')
-    s3 = boto3.client('s3')
+    # Initialize AWS clients, their retries are spent from the retry budget of the task
+    transcribe = instrument(boto3.client('transcribe', config=retry_budget.botocore_config()))
+    s3 = instrument(boto3.client('s3', config=retry_budget.botocore_config()))
     
     # Get the S3 bucket and file key from the event
     source_key = body["file_name"]
@@ -39,44 +138,73 @@ def lambda_handler(event, context):
     output_bucket = S3_BUCKET
     
     try:
-        # Create a unique job name (using timestamp to avoid conflicts)
-        job_name = f"transcription_{int(time.time())}"
-        
         # Get the file extension
         file_extension = source_key.split('.')[-1].lower()
-        
-        # Construct the S3 URI for the source audio file
-        media_uri = f"s3://{S3_BUCKET}/{source_key}"
-        
-        # Start transcription job
-        output_key = f"transcripts/{source_key.split('/')[-1]}.txt"
-
-        response = transcribe.start_transcription_job(
-            TranscriptionJobName=job_name,
-            Media={'MediaFileUri': media_uri},
-            MediaFormat=file_extension,
-            LanguageCode='en-US',  # You can modify this based on your audio language
-            OutputBucketName=output_bucket,
-            OutputKey=output_key
+        file_stem = source_key.split('/')[-1]
+        output_key = f"transcripts/{file_stem}.txt"
+
+        # a retry or a re-submission of the same recording waits for the jobs it already started
+        checkpoints = Checkpoints.from_env(
+            s3, S3_BUCKET, get_document_hash(s3, S3_BUCKET, source_key), event.get("execution_name")
         )
-        
-        # Wait for the transcription job to complete
-        while True:
-            status = transcribe.get_transcription_job(TranscriptionJobName=job_name)
-            if status['TranscriptionJob']['TranscriptionJobStatus'] in ['COMPLETED', 'FAILED']:
-                break
-            time.sleep(5)
-        
-        if status['TranscriptionJob']['TranscriptionJobStatus'] == 'COMPLETED':
-            output_location = f"s3://{output_bucket}/transcripts/{source_key.split('/')[-1]}.txt"
-
-            obj = s3.get_object(Bucket=output_bucket, Key=output_key)
-            data = obj["Body"].read().decode('utf8')
-            json_data = json.loads(data)
-            content = json_data["results"]["transcripts"][0]["transcript"]
+        checkpoint_inputs = {
+            "output_key": output_key,
+            "parts_prefix": PREFIX_TRANSCRIPT_PARTS,
+            "sample_rate": TARGET_SAMPLE_RATE,
+        }
+        jobs = checkpoints.load("transcription-jobs", checkpoint_inputs)
+        statuses = resume_transcription_jobs(transcribe, jobs) if jobs is not None else None
+        if statuses is None:
+            # concurrent executions of the same recording wait for the jobs started by the first one
+            jobs, _ = SINGLE_FLIGHT.run(
+                get_flight_key(checkpoints.document_hash, "transcription-jobs", checkpoint_inputs),
+                lambda: start_transcription_jobs(s3, transcribe, source_key, file_extension, file_stem),
+            )
+            checkpoints.save("transcription-jobs", jobs, checkpoint_inputs, artifacts=[jobs["timestamps_key"]])
+
+            # Wait for the transcription jobs to complete
+            statuses = wait_for_transcription_jobs(transcribe, jobs["job_names"])
+        timestamp_map = None
+        if jobs["timestamps_key"]:
+            timestamp_map = json.loads(s3.get_object(Bucket=S3_BUCKET, Key=jobs["timestamps_key"])["Body"].read())
+        job_names, output_keys, offsets = jobs["job_names"], jobs["output_keys"], jobs["offsets"]
+        job_name = ",".join(job_names)
+
+        if all(status == 'COMPLETED' for status in statuses.values()):
+            output_location = f"s3://{output_bucket}/{output_key}"
+
+            def open_part(idx):
+                return s3.get_object(Bucket=output_bucket, Key=output_keys[idx])["Body"]
+
+            # Stitch parts and map transcript offsets back to the original recording, streaming item by item
+            if timestamp_map or len(output_keys) > 1:
+                with open(LOCAL_TRANSCRIPT_PATH, "w") as f:
+                    content = write_transcript(
+                        open_part,
+                        offsets,
+                        f,
+                        map_time=get_time_mapper(timestamp_map) if timestamp_map else None,
+                        job_name=job_name,
+                    )
+                s3.upload_file(
+                    LOCAL_TRANSCRIPT_PATH,
+                    output_bucket,
+                    output_key,
+                    ExtraArgs={"ContentType": "application/json"},
+                )
+                os.remove(LOCAL_TRANSCRIPT_PATH)
+            else:
+                s3.copy_object(
+                    Bucket=output_bucket,
+                    Key=output_key,
+                    CopySource={"Bucket": output_bucket, "Key": output_keys[0]},
+                    ContentType="application/json",
+                    MetadataDirective="REPLACE",
+                )
+                content = read_transcript(open_part(0))
             response = s3.put_object(
                 Bucket=output_bucket,
-                Key = f"transcripts/{source_key.split('/')[-1]}_plain.txt",
+                Key = f"transcripts/{file_stem}_plain.txt",
                 Body=content.encode('utf-8'))
 
             return {
@@ -87,13 +215,15 @@ def lambda_handler(event, context):
                     'jobName': job_name,
                     'outputLocation': output_location,
                     'content': content,
-                    'output': json_data
                 })
             }
         else:
-            raise Exception("Transcription job failed")
+            raise Exception(f"Transcription job failed: {statuses}")
             
     except Exception as e:
+        # a transient error is retried by Step Functions, a failed job or a bad recording fails the same way again
+        if retry_budget.can_restart(e):
+            raise
         print(e)
         return {
             'statusCode': 500,
@@ -0,0 +1,292 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Transcribe job utilities: concurrent jobs and streamed stitching of partial transcripts
+"""
+
+import json
+import time
+import uuid
+from collections import defaultdict
+from typing import IO, Callable, Dict, Iterable, List
+
+from audio import map_timestamps
+from json_stream import JsonArrayWriter, get_json_value, iter_json_values
+
+LANGUAGE_CODE = "en-US"
+MAX_SPEAKERS = 5  # max no. speakers Transcribe distinguishes in a recording
+POLL_INTERVAL_S = 5  # interval between two checks of the job status
+
+TRANSCRIPT_PREFIX = "results.transcripts.item.transcript"
+ITEM_PREFIX = "results.items.item"
+SPEAKER_SEGMENT_PREFIX = "results.speaker_labels.segments.item"
+AUDIO_SEGMENT_PREFIX = "results.audio_segments.item"
+
+
+def start_transcription_job(
+    client,
+    media_uri: str,
+    media_format: str,
+    output_bucket: str,
+    output_key: str,
+    media_params: dict = None,
+) -> str:
+    """
+    Start a Transcribe job with speaker labels and return its unique name
+    """
+    job_name = f"transcription_{uuid.uuid4().hex}"
+    client.start_transcription_job(
+        TranscriptionJobName=job_name,
+        Media={"MediaFileUri": media_uri},
+        MediaFormat=media_format,
+        LanguageCode=LANGUAGE_CODE,
+        OutputBucketName=output_bucket,
+        OutputKey=output_key,
+        Settings={"ShowSpeakerLabels": True, "MaxSpeakerLabels": MAX_SPEAKERS},
+        **(media_params or {}),
+    )
+    return job_name
+
+
+def wait_for_transcription_jobs(
+    client,
+    job_names: List[str],
+    poll_interval: float = POLL_INTERVAL_S,
+) -> Dict[str, str]:
+    """
+    Wait until all jobs are either completed or failed
+
+    Returns
+    -------
+    Dict[str, str]
+        Final status of every job
+    """
+    statuses = {}
+    pending = list(job_names)
+    while pending:
+        for job_name in list(pending):
+            job = client.get_transcription_job(TranscriptionJobName=job_name)["TranscriptionJob"]
+            if job["TranscriptionJobStatus"] in ["COMPLETED", "FAILED"]:
+                statuses[job_name] = job["TranscriptionJobStatus"]
+                pending.remove(job_name)
+        if pending:
+            time.sleep(poll_interval)
+    return statuses
+
+
+def summarize_speakers(segments: Iterable[dict]) -> dict:
+    """
+    Seconds of speech per speaker label, and the first and last speakers of a transcript
+    """
+    summary = {"speaking_time": defaultdict(float), "first": None, "last": None}
+    for segment in segments:
+        label = segment["speaker_label"]
+        summary["speaking_time"][label] += float(segment["end_time"]) - float(segment["start_time"])
+        summary["first"] = summary["first"] or label
+        summary["last"] = label
+    return summary
+
+
+def match_speakers(summaries: List[dict]) -> List[Dict[str, str]]:
+    """
+    Map the speaker labels of every part to the labels of the whole recording
+
+    Transcribe labels speakers independently in every job, so continuity is a heuristic: the speaker talking at
+    the end of a part is assumed to keep talking at the start of the next one, and the remaining speakers are
+    paired by speaking time with the speakers of the previous parts.
+
+    Parameters
+    ----------
+    summaries : List[dict]
+        Speaker summaries of consecutive parts of a recording, see summarize_speakers
+
+    Returns
+    -------
+    List[Dict[str, str]]
+        Label mapping of every part
+    """
+    speaker_maps = []
+    total_time = defaultdict(float)
+    num_speakers = 0
+    last_speaker = None
+
+    for summary in summaries:
+        speaking_time = summary["speaking_time"]
+        speaker_map = {}
+
+        if summary["first"] is not None and last_speaker is not None:
+            speaker_map[summary["first"]] = last_speaker
+        known_speakers = sorted(total_time, key=total_time.get, reverse=True)
+        for label in sorted(speaking_time, key=speaking_time.get, reverse=True):
+            if label in speaker_map:
+                continue
+            available = [speaker for speaker in known_speakers if speaker not in speaker_map.values()]
+            if available:
+                speaker_map[label] = available[0]
+            else:
+                speaker_map[label] = f"spk_{num_speakers}"
+                num_speakers += 1
+
+        for label, seconds in speaking_time.items():
+            total_time[speaker_map[label]] += seconds
+        if summary["last"] is not None:
+            last_speaker = speaker_map[summary["last"]]
+        speaker_maps.append(speaker_map)
+
+    return speaker_maps
+
+
+def relabel_speakers(data, speaker_map: Dict[str, str]):
+    """
+    Replace the speaker_label fields of a Transcribe output, in place
+    """
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key == "speaker_label" and isinstance(value, str):
+                data[key] = speaker_map.get(value, value)
+            else:
+                relabel_speakers(value, speaker_map)
+    elif isinstance(data, list):
+        for item in data:
+            relabel_speakers(item, speaker_map)
+    return data
+
+
+def read_transcript(stream: IO[bytes]) -> str:
+    """
+    Read the plain transcript from a Transcribe output without parsing the word-level items
+    """
+    return get_json_value(stream, TRANSCRIPT_PREFIX, default="")
+
+
+def write_items(
+    open_part: Callable[[int], IO[bytes]],
+    fileobj: IO[str],
+    time_mappers: List[Callable[[float], float]],
+    speaker_maps: List[Dict[str, str]],
+) -> List[int]:
+    """
+    Stream the word-level items of every part, ids restart at 0 in every part and are shifted
+
+    Returns
+    -------
+    List[int]
+        Id of the first item of every part in the merged output
+    """
+    item_offsets = []
+    with JsonArrayWriter(fileobj) as writer:
+        for idx, (map_part_time, speaker_map) in enumerate(zip(time_mappers, speaker_maps)):
+            item_offsets.append(writer.count)
+            for _, item in iter_json_values(open_part(idx), [ITEM_PREFIX]):
+                map_timestamps(item, map_part_time)
+                relabel_speakers(item, speaker_map)
+                if "id" in item:
+                    item["id"] += item_offsets[idx]
+                writer.write(item)
+    return item_offsets
+
+
+def write_speaker_segments(
+    open_part: Callable[[int], IO[bytes]],
+    fileobj: IO[str],
+    time_mappers: List[Callable[[float], float]],
+    speaker_maps: List[Dict[str, str]],
+):
+    """
+    Stream the speaker turns of every part, with the speaker labels matched across parts
+    """
+    with JsonArrayWriter(fileobj) as writer:
+        for idx, (map_part_time, speaker_map) in enumerate(zip(time_mappers, speaker_maps)):
+            for _, segment in iter_json_values(open_part(idx), [SPEAKER_SEGMENT_PREFIX]):
+                map_timestamps(segment, map_part_time)
+                writer.write(relabel_speakers(segment, speaker_map))
+
+
+def write_audio_segments(
+    open_part: Callable[[int], IO[bytes]],
+    fileobj: IO[str],
+    time_mappers: List[Callable[[float], float]],
+    speaker_maps: List[Dict[str, str]],
+    item_offsets: List[int],
+):
+    """
+    Stream the audio segments of every part, their ids and the ids of their items are shifted like the items
+    """
+    with JsonArrayWriter(fileobj) as writer:
+        for idx, (map_part_time, speaker_map) in enumerate(zip(time_mappers, speaker_maps)):
+            segment_offset = writer.count
+            for _, segment in iter_json_values(open_part(idx), [AUDIO_SEGMENT_PREFIX]):
+                map_timestamps(segment, map_part_time)
+                relabel_speakers(segment, speaker_map)
+                segment["id"] = segment.get("id", 0) + segment_offset
+                segment["items"] = [item_id + item_offsets[idx] for item_id in segment.get("items", [])]
+                writer.write(segment)
+
+
+def write_transcript(
+    open_part: Callable[[int], IO[bytes]],
+    offsets: List[float],
+    fileobj: IO[str],
+    map_time: Callable[[float], float] = None,
+    job_name: str = "",
+) -> str:
+    """
+    Stream the Transcribe outputs of consecutive parts of a recording into a single Transcribe output
+
+    Parts are read element by element, so memory does not grow with the length of the recording.
+
+    Parameters
+    ----------
+    open_part : Callable[[int], IO[bytes]]
+        Function that opens a new stream over the Transcribe output of a part, every part is read several times
+    offsets : List[float]
+        Start of every part in the transcribed audio, in seconds
+    fileobj : IO[str]
+        File the merged Transcribe output is written to
+    map_time : Callable[[float], float]
+        Mapping from the transcribed audio to the original recording, by default None
+    job_name : str
+        Name of the merged job, by default ""
+
+    Returns
+    -------
+    str
+        Plain transcript of the whole recording
+    """
+    num_parts = len(offsets)
+    part_time_mappers = [
+        lambda time, offset=offset: map_time(time + offset) if map_time else time + offset for offset in offsets
+    ]
+
+    # first pass: plain transcripts and speaker turns
+    transcripts, summaries = [], []
+    for idx in range(num_parts):
+        segments = []
+        for prefix, value in iter_json_values(open_part(idx), [TRANSCRIPT_PREFIX, SPEAKER_SEGMENT_PREFIX]):
+            if prefix == TRANSCRIPT_PREFIX:
+                transcripts.append(value)
+            else:
+                segments.append({key: value[key] for key in ("speaker_label", "start_time", "end_time")})
+        summaries.append(summarize_speakers(segments))
+    speaker_maps = match_speakers(summaries)
+    transcript = " ".join(part_transcript for part_transcript in transcripts if part_transcript)
+
+    fileobj.write(f'{{"jobName": {json.dumps(job_name)}, "status": "COMPLETED", "results": {{')
+    fileobj.write(f'"transcripts": {json.dumps([{"transcript": transcript}])}')
+
+    fileobj.write(', "items": ')
+    item_offsets = write_items(open_part, fileobj, part_time_mappers, speaker_maps)
+
+    num_speakers = len({label for speaker_map in speaker_maps for label in speaker_map.values()})
+    if num_speakers:
+        fileobj.write(f', "speaker_labels": {{"speakers": {num_speakers}, "segments": ')
+        write_speaker_segments(open_part, fileobj, part_time_mappers, speaker_maps)
+        fileobj.write("}")
+
+    fileobj.write(', "audio_segments": ')
+    write_audio_segments(open_part, fileobj, part_time_mappers, speaker_maps, item_offsets)
+
+    fileobj.write("}}")
+    return transcript
@@ -0,0 +1,125 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Attribute cache: values extracted from a document, reused when only the attribute set changes
+"""
+
+import logging
+import sys
+from typing import Any, Callable, Dict, List
+
+from model.cascade import CascadeResult
+from model.checkpoint import Checkpoints, get_fingerprint
+from model.structured import Attribute, get_attribute_names
+
+LOGGER = logging.Logger("ATTRIBUTE-CACHE", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+STAGE = "attribute-values"
+
+
+def get_attribute_fingerprint(attribute: Attribute) -> str:
+    """
+    Hash of an attribute definition, a reworded description is a new attribute
+    """
+    return get_fingerprint({"attribute": attribute})
+
+
+class AttributeCache:
+    """
+    Values of the attributes extracted from a document, keyed by attribute definition
+
+    Users iterate on attribute lists: adding a field or rewording a description re-runs the extraction. The cache
+    is a checkpoint of the document for the extraction parameters (models, output mode, temperature, ...), so only
+    new or changed attributes are extracted and merged with the cached values. It shares the store and the
+    lifetime of the checkpoints, and is disabled with them.
+
+    Parameters
+    ----------
+    checkpoints : Checkpoints
+        Checkpoints of the document
+    inputs : Dict[str, Any]
+        Extraction parameters the values depend on, other than the attributes
+    """
+
+    def __init__(self, checkpoints: Checkpoints, inputs: Dict[str, Any]):
+        self.checkpoints = checkpoints
+        self.inputs = inputs
+        self._values = None
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Cached values by attribute fingerprint, with the name and the model ID of each value, read once
+        """
+        if self._values is None:
+            data = self.checkpoints.load(STAGE, self.inputs)
+            self._values = (data or {}).get("values", {})
+        return self._values
+
+    def save(self, attributes: List[Attribute], result: CascadeResult):
+        """
+        Add the values of a parsed extraction to the cache, unparsable answers and invalid values are not cached,
+        so that they are extracted again on the next run
+        """
+        if not result.parsed:
+            return
+        values = dict(self.load())
+        invalid = set(result.invalid)
+        for attribute, name in zip(attributes, get_attribute_names(attributes)):
+            if name in result.answer and name not in invalid:
+                values[get_attribute_fingerprint(attribute)] = {
+                    "name": name,
+                    "value": result.answer[name],
+                    "model_id": result.field_tiers.get(name),
+                }
+        self.checkpoints.save(STAGE, {"values": values}, self.inputs)
+        self._values = values
+
+
+def run_incremental(
+    run: Callable[[List[Attribute]], CascadeResult], attributes: List[Attribute], cache: AttributeCache
+) -> CascadeResult:
+    """
+    Extract only the attributes without a cached value and merge them with the cached ones
+
+    Parameters
+    ----------
+    run : Callable[[List[Attribute]], CascadeResult]
+        Extraction of a list of attributes, e.g. run_cascade, its prompt and schema only list these attributes
+    attributes : List[Attribute]
+        Requested attributes, without attributes the answer is free-form and nothing is cached
+    cache : AttributeCache
+        Cache of the document
+
+    Returns
+    -------
+    CascadeResult
+        Answer with the requested attributes in order, the cached ones are listed in its reused attribute
+    """
+    if not attributes:
+        return run(attributes)
+
+    values = cache.load()
+    fingerprints = [get_attribute_fingerprint(attribute) for attribute in attributes]
+    pending = [attribute for attribute, fingerprint in zip(attributes, fingerprints) if fingerprint not in values]
+    LOGGER.info(f"{len(attributes) - len(pending)} of {len(attributes)} attributes cached")
+
+    result = CascadeResult(answer={}, field_tiers={}, steps=[])
+    if pending:
+        result = run(pending)
+        cache.save(pending, result)
+
+    answer, field_tiers, reused = {}, {}, []
+    for name, fingerprint in zip(get_attribute_names(attributes), fingerprints):
+        if fingerprint in values:
+            answer[name] = values[fingerprint]["value"]
+            field_tiers[name] = values[fingerprint]["model_id"]
+            reused.append(name)
+        else:
+            answer[name] = result.answer.get(name, "")
+            field_tiers[name] = result.field_tiers.get(name)
+    return CascadeResult(answer=answer, field_tiers=field_tiers, steps=result.steps, reused=reused)
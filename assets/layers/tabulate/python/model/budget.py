@@ -0,0 +1,63 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Output token budget of an extraction, estimated from the requested attributes
+"""
+
+import re
+from typing import List
+
+from model.structured import OUTPUT_MODE_COMPACT, Attribute, get_attribute_names
+
+CHARS_PER_TOKEN = 4
+ANSWER_OVERHEAD_TOKENS = 50  # braces, tags and sentence around the JSON
+THINKING_TOKENS = 400  # summary of the model's thoughts before the answer
+KEY_OVERHEAD_TOKENS = 4  # quotes, colon, comma and indentation of a key
+SHORT_VALUE_TOKENS = 30  # names, dates, amounts, identifiers
+LONG_VALUE_TOKENS = 250  # narratives and summaries
+LONG_VALUE_PATTERN = re.compile(r"narrative|summary|details|description|explanation|statement", re.IGNORECASE)
+SAFETY_MARGIN = 1.5
+MIN_OUTPUT_TOKENS = 256
+MAX_CONTINUATIONS = 2  # a truncated answer is continued at most this many times
+
+
+def is_long_value(attribute: Attribute) -> bool:
+    text = attribute if isinstance(attribute, str) else f"{attribute['name']} {attribute.get('description', '')}"
+    return LONG_VALUE_PATTERN.search(text) is not None
+
+
+def estimate_output_tokens(
+    attributes: List[Attribute], output_mode: str, thinking: bool = False, max_tokens: int = 4_096
+) -> int:
+    """
+    Estimate the output tokens of an extraction, with a safety margin
+
+    Bedrock reserves max_tokens of the quota for every call, so a right-sized limit lets more calls run
+    in parallel. An underestimate only costs a continuation of the truncated answer.
+
+    Parameters
+    ----------
+    attributes : List[Attribute]
+        Attributes to be extracted, without attributes the answer is free-form and max_tokens is kept
+    output_mode : str
+        Output mode, compact answers have no keys
+    thinking : bool, optional
+        Whether the model summarizes its thoughts before the answer, by default False
+    max_tokens : int, optional
+        Upper bound, e.g. the answer length requested by the user, by default 4,096
+
+    Returns
+    -------
+    int
+        Max output tokens of the call
+    """
+    if not attributes:
+        return max_tokens
+    tokens = ANSWER_OVERHEAD_TOKENS + (THINKING_TOKENS if thinking else 0)
+    for attribute, name in zip(attributes, get_attribute_names(attributes)):
+        if output_mode != OUTPUT_MODE_COMPACT:
+            tokens += KEY_OVERHEAD_TOKENS + len(name) // CHARS_PER_TOKEN
+        tokens += LONG_VALUE_TOKENS if is_long_value(attribute) else SHORT_VALUE_TOKENS
+    return min(max_tokens, max(MIN_OUTPUT_TOKENS, int(tokens * SAFETY_MARGIN)))
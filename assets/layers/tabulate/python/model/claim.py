@@ -0,0 +1,225 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Claims: documents arriving over time, with the content hash and memoized extraction output of each document
+"""
+
+import hashlib
+import logging
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+from model.checkpoint import MISSING_CODES, LocalCheckpointStore, S3CheckpointStore, get_document_hash, get_fingerprint
+
+LOGGER = logging.Logger("CLAIM", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+CLAIM_PREFIX = "claims"  # not expired, a claim keeps its documents until they are deleted
+DOCUMENTS_PREFIX = "documents"  # one manifest entry per document, concurrent executions never overwrite each other
+SCHEMA_VERSION = 1  # manifest entries and outputs of another version are ignored
+CLAIM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+# fields of the execution input the output of a document depends on, a change reprocesses all documents
+OUTPUT_INPUTS = ("attributes", "instructions", "few_shots", "model_params", "parsing_mode")
+
+
+def get_output_fingerprint(execution_input: Dict[str, Any]) -> str:
+    """
+    Hash of the extraction parameters of an execution, outputs memoized with other parameters are not reused
+    """
+    return get_fingerprint({name: execution_input.get(name) for name in OUTPUT_INPUTS})
+
+
+@dataclass
+class ClaimPlan:
+    claim_id: str
+    fingerprint: str
+    documents: List[str] = field(default_factory=list)  # all documents of the claim, in the order they were added
+    hashes: Dict[str, str] = field(default_factory=dict)
+    pending: List[str] = field(default_factory=list)  # new or changed documents, processed by the execution
+    removed: List[str] = field(default_factory=list)  # deleted documents, removed from the manifest
+
+
+class Claim:
+    """
+    Documents of a claim and their memoized outputs, stored under claims/<claim_id>/ in the data bucket
+
+    A claim grows as photos, reports and statements arrive. An execution adding documents to a claim only
+    processes the documents without an output for their current content and the current extraction parameters,
+    the summary is recomputed from the outputs of all documents of the claim.
+
+    Parameters
+    ----------
+    store : S3CheckpointStore or LocalCheckpointStore
+        Record store with the claim prefix
+    claim_id : str
+        ID of the claim, letters, digits, dashes and underscores
+    """
+
+    def __init__(self, store, claim_id: str):
+        self.store = store
+        self.claim_id = claim_id
+        self.prefix = get_claim_prefix(claim_id)
+
+    @classmethod
+    def from_s3(cls, s3_client, bucket: str, claim_id: str) -> "Claim":
+        return cls(S3CheckpointStore(s3_client, bucket, prefix=get_claim_prefix(claim_id)), claim_id)
+
+    @classmethod
+    def from_directory(cls, directory: str, claim_id: str) -> "Claim":
+        """
+        Claim stored in a local directory, for local runs and tests
+        """
+        return cls(LocalCheckpointStore(directory, prefix=get_claim_prefix(claim_id)), claim_id)
+
+    def load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Manifest of the claim: content hash and time added of each document in the order they were added, empty
+        for a new claim
+        """
+        entries = []
+        for key in self.store.list(f"{DOCUMENTS_PREFIX}/"):
+            entry = self.store.get(key)
+            if entry is not None and entry.get("version") == SCHEMA_VERSION:
+                entries.append(entry)
+        entries.sort(key=lambda entry: (entry["added_at"], entry["file_name"]))
+        return {entry["file_name"]: entry for entry in entries}
+
+    def plan(self, documents: List[str], fingerprint: str, get_hash: Callable[[str], Optional[str]]) -> ClaimPlan:
+        """
+        Add documents to the claim and select the ones to be processed
+
+        Parameters
+        ----------
+        documents : List[str]
+            S3 keys of the documents added by the execution, may include documents of the claim
+        fingerprint : str
+            Fingerprint of the extraction parameters, see get_output_fingerprint
+        get_hash : Callable[[str], Optional[str]]
+            Content hash of a document, None if it was deleted (it is removed from the claim)
+
+        Returns
+        -------
+        ClaimPlan
+            Documents of the claim with their hashes and the new or changed documents
+        """
+        known = list(self.load_manifest())
+        plan = ClaimPlan(self.claim_id, fingerprint)
+        for document in dict.fromkeys(known + list(documents)):
+            document_hash = get_hash(document)
+            if document_hash is None:
+                LOGGER.warning(f"Document {document} of claim {self.claim_id} no longer exists, it is removed")
+                plan.removed.append(document)
+                continue
+            plan.documents.append(document)
+            plan.hashes[document] = document_hash
+            if not self.store.exists(f"{self.prefix}/{self._output_key(document_hash, fingerprint)}"):
+                plan.pending.append(document)
+        LOGGER.info(f"Claim {self.claim_id}: {len(plan.pending)} of {len(plan.documents)} documents to be processed")
+        return plan
+
+    def commit(
+        self, plan: ClaimPlan, results: List[Dict[str, Any]], execution_name: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Memoize the outputs of the processed documents and update the manifest of the claim
+
+        Failed documents (outputs with an error) are not memoized, the next execution processes them again.
+
+        Parameters
+        ----------
+        plan : ClaimPlan
+            Plan of the execution
+        results : List[Dict[str, Any]]
+            Outputs of the Map over the pending documents, in the same order
+        execution_name : str, optional
+            Name of the execution, recorded with the outputs
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            Outputs of all documents of the claim, input of the summary
+        """
+        outputs = dict(zip(plan.pending, results))
+        for document, output in outputs.items():
+            if isinstance(output, dict) and "error" in output:
+                LOGGER.warning(f"Document {document} failed, its output is not memoized")
+                continue
+            record = {
+                "version": SCHEMA_VERSION,
+                "file_name": document,
+                "execution_name": execution_name,
+                "created_at": int(time.time()),
+                "output": output,
+            }
+            self.store.put(self._output_key(plan.hashes[document], plan.fingerprint), record)
+
+        claim_outputs = []
+        for document in plan.documents:
+            if document in outputs:
+                claim_outputs.append(outputs[document])
+                continue
+            record = self.store.get(self._output_key(plan.hashes[document], plan.fingerprint))
+            if record is None or record.get("version") != SCHEMA_VERSION:
+                LOGGER.warning(f"Output of document {document} is missing, it is left out of the summary")
+                continue
+            claim_outputs.append(record["output"])
+
+        # one entry per document, the documents added by a concurrent execution are left untouched
+        now = int(time.time())
+        for document in plan.documents:
+            entry = self.store.get(self._entry_key(document))
+            if entry is not None and entry.get("version") != SCHEMA_VERSION:
+                entry = None
+            if entry is not None and entry["hash"] == plan.hashes[document]:
+                continue
+            record = {
+                "version": SCHEMA_VERSION,
+                "file_name": document,
+                "hash": plan.hashes[document],
+                "added_at": entry["added_at"] if entry is not None else now,
+                "updated_at": now,
+            }
+            self.store.put(self._entry_key(document), record)
+        for document in plan.removed:
+            self.store.delete(self._entry_key(document))
+        return claim_outputs
+
+    @staticmethod
+    def _output_key(document_hash: str, fingerprint: str) -> str:
+        return f"outputs/{document_hash}/{fingerprint}.json"
+
+    @staticmethod
+    def _entry_key(document: str) -> str:
+        return f"{DOCUMENTS_PREFIX}/{hashlib.sha256(document.encode()).hexdigest()[:32]}.json"
+
+
+def get_claim_prefix(claim_id: str) -> str:
+    if not CLAIM_ID_PATTERN.match(claim_id or ""):
+        raise ValueError(f"Invalid claim ID {claim_id!r}, use letters, digits, dashes and underscores")
+    return f"{CLAIM_PREFIX}/{claim_id}"
+
+
+def get_s3_hash_function(s3_client, bucket: str) -> Callable[[str], Optional[str]]:
+    """
+    Content hash of the documents of a claim from their ETags, None for deleted documents
+    """
+
+    def get_hash(key: str) -> Optional[str]:
+        try:
+            return get_document_hash(s3_client, bucket, key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in MISSING_CODES:
+                return None
+            raise
+
+    return get_hash
+
@@ -0,0 +1,296 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Bedrock throughput governor: token buckets per model and region, shared by all Lambdas through DynamoDB
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.exceptions import ClientError
+
+LOGGER = logging.Logger("GOVERNOR", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+CHARS_PER_TOKEN = 4  # rough estimate for English text
+IMAGE_TOKENS = 1_600  # upper bound of the tokens of an image resized by the model
+MAX_WAIT_S = 60.0
+MAX_SLEEP_S = 5.0  # waits are split so that the bucket is re-read as other callers refund tokens
+
+
+class GovernorTimeout(TimeoutError):
+    retryable = True  # the capacity comes back, a later attempt of the task may get it
+
+
+@dataclass(frozen=True)
+class Quota:
+    """
+    Bedrock quota of a model in a region, both buckets hold one minute of capacity
+    """
+
+    requests_per_minute: float
+    tokens_per_minute: float
+
+
+@dataclass
+class BucketState:
+    requests: float
+    tokens: float
+    updated_at: float
+    version: int = 0
+
+
+def refill(state: Optional[BucketState], quota: Quota, now: float) -> BucketState:
+    """
+    Return the state of the buckets at time now, a missing state is a full bucket
+    """
+    if state is None:
+        return BucketState(quota.requests_per_minute, quota.tokens_per_minute, now)
+    elapsed = max(0.0, now - state.updated_at)
+    return BucketState(
+        requests=min(quota.requests_per_minute, state.requests + elapsed * quota.requests_per_minute / 60),
+        tokens=min(quota.tokens_per_minute, state.tokens + elapsed * quota.tokens_per_minute / 60),
+        updated_at=now,
+        version=state.version,
+    )
+
+
+def take(state: BucketState, quota: Quota, requests: float, tokens: float) -> Tuple[Optional[BucketState], float]:
+    """
+    Take requests and tokens from refilled buckets
+
+    A reservation larger than the bucket is granted when the bucket is full, the debt is then paid by the refill.
+
+    Returns
+    -------
+    Tuple[Optional[BucketState], float]
+        New state and 0 if granted, else None and the seconds until the buckets may hold enough
+    """
+    tokens_needed = min(tokens, quota.tokens_per_minute)
+    missing_requests = max(0.0, requests - state.requests)
+    missing_tokens = max(0.0, tokens_needed - state.tokens)
+    if missing_requests or missing_tokens:
+        wait = max(missing_requests * 60 / quota.requests_per_minute, missing_tokens * 60 / quota.tokens_per_minute)
+        return None, wait
+    return BucketState(state.requests - requests, state.tokens - tokens, state.updated_at, state.version), 0.0
+
+
+class InMemoryBucketStore:
+    """
+    Buckets of a single process, for local runs or when no table is configured
+    """
+
+    def __init__(self):
+        self._states: Dict[str, BucketState] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, quota: Quota, requests: float, tokens: float, now: float) -> float:
+        with self._lock:
+            state, wait = take(refill(self._states.get(key), quota, now), quota, requests, tokens)
+            if state is not None:
+                self._states[key] = state
+            return wait
+
+    def adjust(self, key: str, quota: Quota, tokens: float, now: float):
+        with self._lock:
+            state = refill(self._states.get(key), quota, now)
+            state.tokens = min(quota.tokens_per_minute, state.tokens - tokens)
+            self._states[key] = state
+
+
+class DynamoDBBucketStore:
+    """
+    Buckets shared by all Lambdas, one item per model and region updated with optimistic locking
+
+    Parameters
+    ----------
+    table_name : str
+        DynamoDB table with the string partition key "bucket_key"
+    max_conflicts : int, optional
+        Max concurrent update conflicts before giving up on an update, by default 10
+    """
+
+    def __init__(self, table_name: str, max_conflicts: int = 10, dynamodb_resource=None):
+        self._table = (dynamodb_resource or boto3.resource("dynamodb")).Table(table_name)
+        self._max_conflicts = max_conflicts
+
+    def acquire(self, key: str, quota: Quota, requests: float, tokens: float, now: float) -> float:
+        for _ in range(self._max_conflicts):
+            current = self._read(key)
+            state, wait = take(refill(current, quota, now), quota, requests, tokens)
+            if state is None:
+                return wait
+            if self._write(key, state, current):
+                return 0.0
+        LOGGER.warning(f"Too many concurrent updates of {key}, the call is not throttled")
+        return 0.0
+
+    def adjust(self, key: str, quota: Quota, tokens: float, now: float):
+        for _ in range(self._max_conflicts):
+            current = self._read(key)
+            state = refill(current, quota, now)
+            state.tokens = min(quota.tokens_per_minute, state.tokens - tokens)
+            if self._write(key, state, current):
+                return
+        LOGGER.warning(f"Too many concurrent updates of {key}, {tokens:+.0f} tokens are not reconciled")
+
+    def _read(self, key: str) -> Optional[BucketState]:
+        item = self._table.get_item(Key={"bucket_key": key}, ConsistentRead=True).get("Item")
+        if item is None:
+            return None
+        return BucketState(
+            requests=float(item["requests"]),
+            tokens=float(item["tokens"]),
+            updated_at=float(item["updated_at"]),
+            version=int(item["version"]),
+        )
+
+    def _write(self, key: str, state: BucketState, current: Optional[BucketState]) -> bool:
+        condition = {"ConditionExpression": "attribute_not_exists(bucket_key)"}
+        if current is not None:
+            condition = {
+                "ConditionExpression": "version = :version",
+                "ExpressionAttributeValues": {":version": current.version},
+            }
+        try:
+            self._table.put_item(
+                Item={
+                    "bucket_key": key,
+                    "requests": Decimal(str(round(state.requests, 3))),
+                    "tokens": Decimal(str(round(state.tokens, 1))),
+                    "updated_at": Decimal(str(round(state.updated_at, 3))),
+                    "version": state.version + 1,
+                },
+                **condition,
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+
+@dataclass
+class Reservation:
+    key: str
+    quota: Optional[Quota]
+    tokens: float
+    waited_s: float = 0.0
+
+
+class Governor:
+    """
+    Throughput governor: a call reserves its estimated tokens before being sent, waiting for the buckets
+    to refill up to a deadline, and the reservation is reconciled with the billed tokens afterwards
+
+    Parameters
+    ----------
+    store : InMemoryBucketStore or DynamoDBBucketStore
+        Bucket store
+    quotas : Dict[str, Quota]
+        Quotas per model ID, models without quota are not governed
+    region : str
+        Bedrock region, the quotas are per region
+    max_wait_s : float, optional
+        Default max time to wait for capacity, by default 60 seconds
+    """
+
+    def __init__(self, store, quotas: Dict[str, Quota], region: str, max_wait_s: float = MAX_WAIT_S):
+        self.store = store
+        self.quotas = quotas
+        self.region = region
+        self.max_wait_s = max_wait_s
+
+    @classmethod
+    def from_env(cls, region: str, policy_variable: str = "GOVERNOR_POLICY", table_variable: str = "GOVERNOR_TABLE"):
+        """
+        Create the governor of the governor section of config.yml, None when disabled
+        """
+        policy = json.loads(os.environ.get(policy_variable) or "{}")
+        if not policy.get("enabled", False):
+            return None
+        quotas = {model_id: Quota(**quota) for model_id, quota in (policy.get("quotas") or {}).items()}
+        table_name = os.environ.get(table_variable)
+        store = DynamoDBBucketStore(table_name) if table_name else InMemoryBucketStore()
+        return cls(store, quotas, region, float(policy.get("max_wait_s", MAX_WAIT_S)))
+
+    def reserve(
+        self, model_id: str, tokens: float, max_wait_s: Optional[float] = None, region: Optional[str] = None
+    ) -> Reservation:
+        """
+        Reserve one request and the estimated tokens of a call, waiting for capacity
+
+        Parameters
+        ----------
+        model_id : str
+            Bedrock model ID
+        tokens : float
+            Estimated input and output tokens
+        max_wait_s : float, optional
+            Max time to wait for capacity, by default the governor's
+        region : str, optional
+            Region of the call, by default the governor's
+
+        Returns
+        -------
+        Reservation
+            Reservation to be reconciled after the call
+
+        Raises
+        ------
+        GovernorTimeout
+            If the capacity is not available before the deadline
+        """
+        key = f"{region or self.region}#{model_id}"
+        quota = self.quotas.get(model_id)
+        if quota is None:
+            return Reservation(key, None, tokens)
+
+        start = time.time()
+        deadline = start + (self.max_wait_s if max_wait_s is None else max_wait_s)
+        while True:
+            now = time.time()
+            wait = self.store.acquire(key, quota, 1, tokens, now)
+            if wait == 0:
+                if now > start + 0.1:
+                    LOGGER.info(f"Waited {now - start:.1f}s for {tokens:.0f} tokens of {key}")
+                return Reservation(key, quota, tokens, now - start)
+            if now + wait > deadline:
+                raise GovernorTimeout(f"No capacity for {tokens:.0f} tokens of {key} within {deadline - start:.0f}s")
+            time.sleep(min(wait, MAX_SLEEP_S) * random.uniform(1.0, 1.2))  # jitter spreads the waiting callers
+
+    def reconcile(self, reservation: Reservation, billed_tokens: float):
+        """
+        Return the reserved tokens that were not used to the bucket, or take the ones used beyond the reservation
+        """
+        delta = billed_tokens - reservation.tokens
+        if reservation.quota is not None and delta:
+            self.store.adjust(reservation.key, reservation.quota, delta, time.time())
+
+
+def estimate_tokens(messages: List[Dict[str, Any]], system: Optional[str] = None) -> int:
+    """
+    Estimate the input tokens of Converse API messages from their characters and images
+    """
+    chars = len(system or "")
+    images = 0
+    for message in messages:
+        for block in message["content"]:
+            if "text" in block:
+                chars += len(block["text"])
+            elif "image" in block:
+                images += 1
+    return chars // CHARS_PER_TOKEN + images * IMAGE_TOKENS
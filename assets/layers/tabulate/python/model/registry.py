@@ -0,0 +1,303 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Registry of the Bedrock models: capabilities, limits, throughput, price and inference parameter names
+"""
+
+import logging
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+LOGGER = logging.Logger("MODEL-REGISTRY", level=logging.DEBUG)
+HANDLER = logging.StreamHandler(sys.stdout)
+HANDLER.setFormatter(logging.Formatter("%(levelname)s | %(name)s | %(message)s"))
+LOGGER.addHandler(HANDLER)
+
+# Bedrock request body names of the generic inference parameters, per provider
+PARAM_MAPPINGS = {
+    "ai21": {
+        "max_tokens": "maxTokens",
+        "stop_sequences": "stopSequences",
+        "temperature": "temperature",
+        "top_p": "topP",
+        "top_k": "topKReturn",
+    },
+    "amazon": {
+        "max_tokens": "maxTokenCount",
+        "temperature": "temperature",
+        "top_p": "topP",
+    },
+    "anthropic": {
+        "max_tokens": "max_tokens",
+        "stop_sequences": "stop_sequences",
+        "temperature": "temperature",
+        "top_p": "top_p",
+        "top_k": "top_k",
+    },
+    "cohere": {
+        "max_tokens": "max_tokens",
+        "temperature": "temperature",
+        "top_p": "p",
+        "top_k": "k",
+    },
+    "meta": {
+        "max_tokens": "max_gen_len",
+        "temperature": "temperature",
+        "top_p": "top_p",
+    },
+    "mistral": {
+        "max_tokens": "max_tokens",
+        "temperature": "temperature",
+        "top_p": "top_p",
+        "top_k": "top_k",
+    },
+}
+
+# tokenizer used to count the tokens of each provider, see utils.token_count_tokenizer
+TOKENIZER_MODELS = {
+    "ai21": "ai21.j2-ultra-v1",
+    "amazon": "amazon.titan-text-express-v1",
+    "anthropic": "anthropic.claude-",
+    "cohere": "cohere.command-r-v1:0",
+    "meta": "meta.llama2-13b-chat-v1",
+    "mistral": "meta.llama2-13b-chat-v1",
+}
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """
+    Specification of a Bedrock model
+
+    Attributes
+    ----------
+    model_id : str
+        Bedrock model ID
+    name : str
+        Display name
+    context_window : int
+        Max input and output tokens
+    max_output_tokens : int
+        Max tokens generated in one call
+    vision : bool
+        Whether the model accepts images
+    tool_choice : bool
+        Whether the model can be forced to answer with a tool call in the Converse API
+    prompt_caching : bool
+        Whether Bedrock can cache the prompt prefix of the model
+    system_prompt : bool
+        Whether the Converse API accepts a system prompt, otherwise it is prepended to the first user message
+    streaming : bool
+        Whether the model can stream its answer with the ConverseStream API
+    relative_throughput : float
+        Rough output tokens per second relative to Claude 3 Sonnet, used to compare models rather than as a latency
+    input_price : float
+        On-demand price in USD per 1,000 input tokens
+    output_price : float
+        On-demand price in USD per 1,000 output tokens
+    """
+
+    model_id: str
+    name: str
+    context_window: int
+    max_output_tokens: int
+    vision: bool = False
+    tool_choice: bool = False
+    prompt_caching: bool = False
+    system_prompt: bool = True
+    streaming: bool = True
+    relative_throughput: float = 1.0
+    input_price: float = 0.0
+    output_price: float = 0.0
+
+    @property
+    def provider(self) -> str:
+        return self.model_id.split(".")[0]
+
+    @property
+    def param_mapping(self) -> Dict[str, str]:
+        return PARAM_MAPPINGS.get(self.provider, PARAM_MAPPINGS["anthropic"])
+
+    @property
+    def assistant_prefill(self) -> bool:
+        """
+        Whether the model continues a final assistant message, used to resume a truncated answer
+        """
+        return self.provider == "anthropic"
+
+    @property
+    def tokenizer_model(self) -> str:
+        return TOKENIZER_MODELS.get(self.provider, TOKENIZER_MODELS["anthropic"])
+
+    def estimate_cost(self, input_tokens: int, output_tokens: int) -> float:
+        """
+        On-demand cost of a call in USD
+        """
+        return (input_tokens * self.input_price + output_tokens * self.output_price) / 1_000
+
+
+MODELS = [
+    ModelSpec(
+        "anthropic.claude-3-haiku-20240307-v1:0", "Claude 3 Haiku", 200_000, 4_096,
+        vision=True, tool_choice=True, relative_throughput=2.5, input_price=0.00025, output_price=0.00125,
+    ),
+    ModelSpec(
+        "anthropic.claude-3-sonnet-20240229-v1:0", "Claude 3 Sonnet", 200_000, 4_096,
+        vision=True, tool_choice=True, relative_throughput=1.0, input_price=0.003, output_price=0.015,
+    ),
+    ModelSpec(
+        "anthropic.claude-3-opus-20240229-v1:0", "Claude 3 Opus", 200_000, 4_096,
+        vision=True, tool_choice=True, relative_throughput=0.4, input_price=0.015, output_price=0.075,
+    ),
+    ModelSpec(
+        "anthropic.claude-3-5-sonnet-20240620-v1:0", "Claude 3.5 Sonnet", 200_000, 4_096,
+        vision=True, tool_choice=True, relative_throughput=1.3, input_price=0.003, output_price=0.015,
+    ),
+    ModelSpec(
+        "anthropic.claude-v2:1", "Claude 2.1", 200_000, 4_096,
+        relative_throughput=0.7, input_price=0.008, output_price=0.024,
+    ),
+    ModelSpec(
+        "anthropic.claude-v2", "Claude 2", 100_000, 4_096,
+        relative_throughput=0.7, input_price=0.008, output_price=0.024,
+    ),
+    ModelSpec(
+        "anthropic.claude-instant-v1", "Claude Instant", 100_000, 4_096,
+        relative_throughput=1.8, input_price=0.0008, output_price=0.0024,
+    ),
+    ModelSpec(
+        "mistral.mistral-large-2402-v1:0", "Mistral Large", 32_000, 8_192,
+        relative_throughput=0.8, input_price=0.004, output_price=0.012,
+    ),
+    ModelSpec(
+        "mistral.mixtral-8x7b-instruct-v0:1", "Mixtral 8X7B", 32_000, 4_096,
+        system_prompt=False, relative_throughput=1.5, input_price=0.00045, output_price=0.0007,
+    ),
+    ModelSpec(
+        "mistral.mistral-7b-instruct-v0:2", "Mistral 7B", 32_000, 8_192,
+        system_prompt=False, relative_throughput=2.0, input_price=0.00015, output_price=0.0002,
+    ),
+    ModelSpec(
+        "amazon.titan-text-premier-v1:0", "Titan Premier", 32_000, 3_072,
+        system_prompt=False, relative_throughput=1.0, input_price=0.0005, output_price=0.0015,
+    ),
+    ModelSpec(
+        "amazon.titan-text-express-v1", "Titan Express", 8_000, 8_192,
+        system_prompt=False, relative_throughput=1.2, input_price=0.0002, output_price=0.0006,
+    ),
+    ModelSpec(
+        "amazon.titan-text-lite-v1", "Titan Lite", 4_000, 4_096,
+        system_prompt=False, relative_throughput=1.8, input_price=0.00015, output_price=0.0002,
+    ),
+    ModelSpec(
+        "meta.llama3-70b-instruct-v1:0", "Llama 3 70B", 8_000, 2_048,
+        relative_throughput=0.8, input_price=0.00265, output_price=0.0035,
+    ),
+    ModelSpec(
+        "meta.llama3-8b-instruct-v1:0", "Llama 3 8B", 8_000, 2_048,
+        relative_throughput=2.0, input_price=0.0003, output_price=0.0006,
+    ),
+    ModelSpec(
+        "meta.llama2-70b-chat-v1", "Llama 2 70B", 4_096, 2_048,
+        relative_throughput=0.6, input_price=0.00195, output_price=0.00256,
+    ),
+    ModelSpec(
+        "meta.llama2-13b-chat-v1", "Llama 2 13B", 4_096, 2_048,
+        relative_throughput=1.2, input_price=0.00075, output_price=0.001,
+    ),
+    ModelSpec(
+        "cohere.command-r-plus-v1:0", "Cohere Command R+", 128_000, 4_000,
+        relative_throughput=0.8, input_price=0.003, output_price=0.015,
+    ),
+    ModelSpec(
+        "cohere.command-r-v1:0", "Cohere Command R", 128_000, 4_000,
+        relative_throughput=1.5, input_price=0.0005, output_price=0.0015,
+    ),
+    ModelSpec(
+        "cohere.command-text-v14", "Cohere Command", 4_000, 4_000,
+        system_prompt=False, streaming=False, relative_throughput=0.8, input_price=0.0015, output_price=0.002,
+    ),
+    ModelSpec(
+        "cohere.command-light-text-v14", "Cohere Command Light", 4_000, 4_000,
+        system_prompt=False, streaming=False, relative_throughput=1.5, input_price=0.0003, output_price=0.0006,
+    ),
+    ModelSpec(
+        "ai21.j2-ultra-v1", "Jurassic 2 Ultra", 8_191, 8_191,
+        system_prompt=False, streaming=False, relative_throughput=0.6, input_price=0.0188, output_price=0.0188,
+    ),
+    ModelSpec(
+        "ai21.j2-mid-v1", "Jurassic 2 Mid", 8_191, 8_191,
+        system_prompt=False, streaming=False, relative_throughput=1.0, input_price=0.0125, output_price=0.0125,
+    ),
+]  # fmt: skip
+
+MODEL_REGISTRY: Dict[str, ModelSpec] = {spec.model_id: spec for spec in MODELS}
+
+# conservative limits of models missing from the registry, e.g. a new model ID added to config.yml
+UNKNOWN_MODEL_LIMITS = {"context_window": 4_000, "max_output_tokens": 2_048}
+
+
+def get_model_spec(model_id: str) -> ModelSpec:
+    """
+    Return the specification of a model
+
+    Models missing from the registry get the parameter names of their provider and conservative limits,
+    so that new model IDs keep working until they are added.
+
+    Parameters
+    ----------
+    model_id : str
+        Bedrock model ID
+
+    Returns
+    -------
+    ModelSpec
+        Model specification
+    """
+    spec = MODEL_REGISTRY.get(model_id)
+    if spec is None:
+        LOGGER.warning(f"Model {model_id} is not in the registry, using conservative limits")
+        spec = ModelSpec(model_id, model_id, **UNKNOWN_MODEL_LIMITS)
+    return spec
+
+
+def list_model_specs(model_ids: Optional[List[str]] = None) -> List[ModelSpec]:
+    """
+    Return the specifications of the given models, or of all registered models, in registry order
+    """
+    if model_ids is None:
+        return list(MODELS)
+    return [spec for spec in MODELS if spec.model_id in model_ids] + [
+        get_model_spec(model_id) for model_id in model_ids if model_id not in MODEL_REGISTRY
+    ]
+
+
+def map_inference_params(model_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Rename generic inference parameters to the names of the model's Bedrock request body
+
+    Parameters
+    ----------
+    model_id : str
+        Bedrock model ID
+    params : Dict[str, Any]
+        Generic parameters: max_tokens, stop_sequences, temperature, top_p and top_k;
+        parameters not supported by the model are dropped and max_tokens is capped to the model's max output
+
+    Returns
+    -------
+    Dict[str, Any]
+        Bedrock-aligned inference parameters
+    """
+    spec = get_model_spec(model_id)
+    mapped = {}
+    for name, value in params.items():
+        if name in spec.param_mapping:
+            if name == "max_tokens":
+                value = min(value, spec.max_output_tokens)
+            mapped[spec.param_mapping[name]] = value
+    return mapped
+
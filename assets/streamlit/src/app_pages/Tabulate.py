@@ -14,6 +14,7 @@ import datetime
 import json
 import logging
 import os
+import re
 import sys
 
 from components.ssm import load_ssm_params
@@ -44,6 +45,7 @@ from components.constants import (
     DEFAULT_DOCS,
     DEFAULT_FEW_SHOTS,
     MAX_ATTRIBUTES,
+    MAX_CHARS_CLAIM_ID,
     MAX_CHARS_DESCRIPTION,
     MAX_CHARS_DOC,
     MAX_CHARS_FEW_SHOTS_INPUT,
@@ -55,7 +57,7 @@ from components.constants import (
     SUPPORTED_EXTENSIONS_BEDROCK,
 )
 from components.frontend import show_empty_container, show_footer
-from components.model import get_models_specs
+from components.model import describe_model, get_models_specs
 from components.s3 import create_presigned_url
 from components.styling import set_page_styling
 from st_pages import add_indentation, show_pages_from_config
@@ -125,6 +127,7 @@ BEDROCK_MODEL_IDS = json.loads(os.environ.get("BEDROCK_MODEL_IDS"))
 MODELS_DISPLAYED, MODEL_SPECS = get_models_specs(BEDROCK_MODEL_IDS)
 
 RUN_EXTRACTION = False
+CLAIM_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")  # claim IDs are part of S3 keys
 
 
 #########################
@@ -359,7 +362,14 @@ def run_extraction() -> None:
     st.session_state["raw_response"] = []
     st.session_state["model_id"] = MODEL_SPECS[st.session_state["ai_model"]]["MODEL_ID"]
 
-    if len(st.session_state["docs"]) > 1:
+    claim_id = st.session_state.get("claim_id", "").strip()
+    if claim_id and not CLAIM_ID_PATTERN.match(claim_id):
+        st.error("The claim ID can only contain letters, digits, dashes and underscores.")
+        return
+
+    if claim_id:
+        status_message = f"Adding the documents to claim {claim_id} and updating its summary..."
+    elif len(st.session_state["docs"]) > 1:
         status_message = "Analyzing documents in parallel..."
     else:
         status_message = "Analyzing the document..."
@@ -374,16 +384,20 @@ def run_extraction() -> None:
                     file_key = api.invoke_file_upload(file=doc, access_token=st.session_state["access_tkn"])
                     file_keys.append(file_key)
                     LOGGER.info(f"file key: {file_key}")
+            extraction_params = {
+                "attributes": [],
+                "instructions": st.session_state.get("instructions", ""),
+                "few_shots": st.session_state.get("few_shots", []),
+                "model_id": st.session_state["model_id"],
+                "parsing_mode": st.session_state["parsing_mode"],
+                "temperature": float(st.session_state["temperature"]),
+            }
             with st.spinner(status_message):
-                api.invoke_step_function(
-                    file_keys=file_keys,
-                    attributes=[],
-                    instructions=st.session_state.get("instructions", ""),
-                    few_shots=st.session_state.get("few_shots", []),
-                    model_id=st.session_state["model_id"],
-                    parsing_mode=st.session_state["parsing_mode"],
-                    temperature=float(st.session_state["temperature"]),
-                )
+                if claim_id:
+                    # only the new or changed documents of the claim are processed
+                    api.add_documents_to_claim(claim_id, file_keys, **extraction_params)
+                else:
+                    api.invoke_step_function(file_keys=file_keys, **extraction_params)
         thinking.empty()
         vertical_space.empty()
 
@@ -406,6 +420,13 @@ with st.sidebar:
         options=MODELS_DISPLAYED,
         key="ai_model",
     )
+    st.caption(describe_model(MODEL_SPECS[st.session_state["ai_model"]]["MODEL_ID"]))
+    st.text_input(
+        label="Claim ID (optional):",
+        key="claim_id",
+        max_chars=MAX_CHARS_CLAIM_ID,
+        help="Adds the documents to the claim, the summary covers all documents of the claim",
+    )
     st.slider(
         label="Temperature:",
         value=MODEL_SPECS[st.session_state["ai_model"]]["TEMPERATURE_DEFAULT"],
@@ -432,6 +453,7 @@ with st.sidebar:
         st.markdown(
             """- **Language model**: which foundation model is used to analyze the document. Various models may have different accuracy and answer latency.
 - **Temperature**: temperature controls model creativity. Higher values results in more creative answers, while lower values make them more deterministic.
+- **Claim ID**: documents uploaded with a claim ID are added to the claim. Only new or changed documents are analyzed, the summary covers all documents of the claim.
 - **Advanced mode**: allows providing optional document-level instructions and few-shot examples as inputs.
 - **Table format**: the format of the output table. Long format shows attributes as columns and documents as rows."""  # noqa: E501
         )
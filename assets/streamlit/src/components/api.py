@@ -12,6 +12,7 @@ import time
 import boto3
 import requests
 import streamlit as st
+from components.parser import JsonParseError, parse_json_string
 
 import logging
 import sys
@@ -47,6 +48,7 @@ def invoke_step_function(
     model_id: str = "anthropic.claude-v2:1",
     parsing_mode: str = "Amazon Textract",
     temperature: float = 0.0,
+    claim_id: str | None = None,
 ) -> str:
     """
     Invoke "attributes" via a step function boto3 call
@@ -67,23 +69,27 @@ def invoke_step_function(
         Parsing algorithm to use, by default "Amazon Textract"
     temperature : float, optional
         Model inference temperature, by default 0.0
+    claim_id : str, optional
+        ID of a claim the documents are added to, by default None. The summary covers all documents of the claim,
+        only new or changed documents are processed again.
     """
 
     client = boto3.client("stepfunctions")
 
-    data = json.dumps(
-        {
-            "documents": file_keys,
-            "attributes": attributes,
-            "instructions": instructions,
-            "few_shots": few_shots,
-            "parsing_mode": parsing_mode,
-            "model_params": {
-                "model_id": model_id,
-                "temperature": temperature,
-            },
-        }
-    )
+    execution_input = {
+        "documents": file_keys,
+        "attributes": attributes,
+        "instructions": instructions,
+        "few_shots": few_shots,
+        "parsing_mode": parsing_mode,
+        "model_params": {
+            "model_id": model_id,
+            "temperature": temperature,
+        },
+    }
+    if claim_id:
+        execution_input["claim_id"] = claim_id
+    data = json.dumps(execution_input)
 
     response = client.start_execution(
         stateMachineArn=STATE_MACHINE_ARN,
@@ -104,8 +110,14 @@ def invoke_step_function(
         if status == "SUCCEEDED":
             output = json.loads(response["output"])
 
-            groups = re.search("([\\s\\S]*?)<json>([\\s\\S]*?)</json>([\\s\\S]*?)", output["llm_answer"]["raw_answer"])
-            accident_info=json.loads(groups[2])
+            try:
+                accident_info = output["llm_answer"].get("answer")
+                if not isinstance(accident_info, dict) or not accident_info:  # not parsed by the Lambda
+                    accident_info = parse_json_string(output["llm_answer"]["raw_answer"])
+            except JsonParseError as e:
+                LOGGER.warning(f"Could not parse the summary: {e}")
+                st.warning("The summary could not be parsed, see the raw answer below.")
+                accident_info = {}
 
             parsed_response_list = []
 
@@ -159,6 +171,20 @@ def invoke_step_function(
             break
 
 
+def add_documents_to_claim(claim_id: str, file_keys: list[str], **kwargs) -> str:
+    """
+    Add documents to a claim and update its summary, see invoke_step_function for the keyword arguments
+
+    Parameters
+    ----------
+    claim_id : str
+        ID of the claim, letters, digits, dashes and underscores
+    file_keys : list[str]
+        S3 keys of the new documents, an empty list recomputes the summary of the claim
+    """
+    return invoke_step_function(file_keys=file_keys, claim_id=claim_id, **kwargs)
+
+
 def invoke_file_upload(
     file,
     access_token: str,
@@ -15,6 +15,7 @@ MAX_CHARS_NAME = 100
 MAX_CHARS_DESCRIPTION = 100_000
 MAX_CHARS_FEW_SHOTS_INPUT = 100_000
 MAX_CHARS_FEW_SHOTS_OUTPUT = 100_000
+MAX_CHARS_CLAIM_ID = 128
 
 DEFAULT_ATTRIBUTES = 1
 DEFAULT_DOCS = 1
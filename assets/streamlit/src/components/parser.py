@@ -0,0 +1,417 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Parsing helper functions
+"""
+
+import re
+from typing import Any, List, Optional, Tuple
+
+# parser states of the innermost container
+EXPECT_KEY = 0  # object key or closing brace
+EXPECT_COLON = 1
+EXPECT_VALUE = 2  # object member value, array item or closing bracket
+EXPECT_COMMA = 3  # separator or closing brace / bracket
+
+WHITESPACE = re.compile(r"\s+")
+INLINE_WHITESPACE = re.compile(r"[^\S\n]+")
+STRING_END = {'"': re.compile(r'["\\]'), "'": re.compile(r"['\\]")}
+BARE_TOKEN = re.compile(r"[^\s,:\[\]{}]+")
+ESCAPE = re.compile(r"\\(u[0-9a-fA-F]{4}|.)", flags=re.DOTALL)
+ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+BARE_WORDS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+
+JSON_TAG_START, JSON_TAG_END = "<json>", "</json>"
+CODE_FENCE = re.compile(r"```[a-zA-Z]*[^\S\n]*\n?")
+# payload starting with a quoted key, without an opening brace
+IMPLICIT_OBJECT = re.compile(r"\s*(\"[^\"\n]+\"|'[^'\n]+')\s*:")
+# scans for a tag: in prose, the start of a JSON value or a tag, in a JSON value, whole string literals as well
+PROSE_SCAN = re.compile(r"[{\[<]")
+VALUE_SCAN = re.compile(r"[{}\[\]<]|\"[^\"\\]*(?:\\.[^\"\\]*)*\"?|'[^'\\]*(?:\\.[^'\\]*)*'?", flags=re.DOTALL)
+
+
+class JsonParseError(ValueError):
+    pass
+
+
+def decode_string(raw: str) -> str:
+    """
+    Resolve the escape sequences of a string literal, unknown escapes are kept as the escaped character
+    """
+    if "\\" not in raw:
+        return raw
+
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] == "u" and len(escape) == 5:
+            return chr(int(escape[1:], 16))
+        return ESCAPES.get(escape, escape)
+
+    if (len(raw) - len(raw.rstrip("\\"))) % 2:
+        raw = raw[:-1]  # dangling backslash of a truncated string
+    text = ESCAPE.sub(replace, raw)
+    if any("\ud800" <= char <= "\udfff" for char in text):
+        text = text.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+    return text
+
+
+def convert_bare_token(token: str, is_complete: bool = True) -> Any:
+    """
+    Convert an unquoted token to a number or a literal, anything else is kept as a string
+
+    Incomplete tokens at the end of a truncated output are dropped when they are the start of a literal.
+    """
+    if token in BARE_WORDS:
+        return BARE_WORDS[token]
+    try:
+        return int(token)
+    except ValueError:
+        pass
+    try:
+        return float(token)
+    except ValueError:
+        pass
+    if not is_complete and any(word.startswith(token) for word in BARE_WORDS):
+        raise JsonParseError(f"Truncated literal {token}")
+    return token
+
+
+class JsonStreamParser:
+    """
+    Incremental and tolerant JSON parser for LLM outputs
+
+    Text is fed in chunks, e.g. as a response is streamed, and every character is read once,
+    so that parsing runs in linear time. The parser skips any text before the first object or array
+    (or object only, with root_types="{"), ignores any text after it and tolerates:
+        - single-quoted strings, unquoted keys and values and Python literals (True, False, None)
+        - trailing, doubled and missing commas, doubled braces from prompt templates
+        - raw newlines in strings and truncated outputs, whose open strings and containers are closed
+    """
+
+    def __init__(self, root_types: str = "{["):
+        self._root_start = re.compile("[" + re.escape(root_types) + "]")
+        self._stack: List[list] = []  # frames of [container, pending key, state, extra opening braces]
+        self._root = None
+        self._started = False
+        self._done = False
+        self._string_quote: Optional[str] = None  # quote of the string being read
+        self._string_chunks: List[str] = []
+        self._pending_escape = False
+        self._bare_chunks: List[str] = []  # unquoted token being read
+        self._value_words: List[Tuple[str, str]] = []  # unquoted member value being read, words and space before
+        self._value_space = ""  # space after the last word of the member value
+
+    @property
+    def done(self) -> bool:
+        """
+        Whether the top-level value is complete, the rest of the text is then ignored
+        """
+        return self._done
+
+    @property
+    def in_string(self) -> bool:
+        """
+        Whether the text fed so far ends in a string literal
+        """
+        return self._string_quote is not None
+
+    @property
+    def value(self) -> Any:
+        """
+        Top-level value parsed so far, without the string or token being read
+        """
+        return self._root
+
+    def feed(self, text: str):  # noqa: C901
+        """
+        Parse the next chunk of text
+        """
+        i, n = 0, len(text)
+        while i < n and not self._done:
+            if not self._started:
+                match = self._root_start.search(text, i)
+                if match is None:
+                    return
+                self._started = True
+                i = match.start()
+
+            # continue the string being read
+            if self._string_quote is not None:
+                if self._pending_escape:
+                    self._string_chunks.append(text[i])
+                    self._pending_escape = False
+                    i += 1
+                    continue
+                match = STRING_END.get(self._string_quote).search(text, i)
+                if match is None:
+                    self._string_chunks.append(text[i:])
+                    return
+                if match.group() == "\\":
+                    self._string_chunks.append(text[i : match.end()])
+                    if match.end() == n:
+                        self._pending_escape = True
+                        return
+                    self._string_chunks.append(text[match.end()])
+                    i = match.end() + 1
+                    continue
+                self._string_chunks.append(text[i : match.start()])
+                i = match.end()
+                self._end_string()
+                continue
+
+            # continue the unquoted token being read
+            if self._bare_chunks:
+                match = BARE_TOKEN.match(text, i)
+                if match is not None:
+                    self._bare_chunks.append(match.group())
+                    i = match.end()
+                    if i == n:
+                        return
+                self._end_bare_token()
+                continue
+
+            # continue the unquoted member value being read up to the next comma or brace, e.g. {a: two words},
+            # unless its last word is the next key, e.g. {a: 1 b: 2}
+            if self._value_words:
+                if text[i] in ",}]\n":
+                    self._end_bare_value()
+                    continue
+                match = INLINE_WHITESPACE.match(text, i)
+                if match is not None:
+                    self._value_space += match.group()
+                    i = match.end()
+                    continue
+                match = BARE_TOKEN.match(text, i) if text[i] not in "\"'" else None
+                if match is not None:
+                    self._bare_chunks.append(match.group())
+                    i = match.end()
+                elif text[i] == ":" and len(self._value_words) > 1:
+                    key = self._value_words.pop()[1]
+                    self._end_bare_value()
+                    self._add_value(key)
+                else:
+                    self._end_bare_value()
+                continue
+
+            char = text[i]
+            if char.isspace():
+                i = WHITESPACE.match(text, i).end()
+            elif char in "{[":
+                self._start_container({} if char == "{" else [])
+                i += 1
+            elif char in "}]":
+                self._end_container(dict if char == "}" else list)
+                i += 1
+            elif char == ",":
+                frame = self._stack[-1]
+                if frame[2] == EXPECT_COMMA:
+                    frame[2] = EXPECT_KEY if isinstance(frame[0], dict) else EXPECT_VALUE
+                elif frame[2] in (EXPECT_COLON, EXPECT_VALUE) and frame[1] is not None:
+                    frame[1], frame[2] = None, EXPECT_KEY  # member without value
+                i += 1
+            elif char == ":":
+                frame = self._stack[-1]
+                if frame[2] == EXPECT_COLON:
+                    frame[2] = EXPECT_VALUE
+                i += 1
+            elif char in "\"'":
+                self._string_quote = char
+                i += 1
+            else:
+                match = BARE_TOKEN.match(text, i)
+                self._bare_chunks.append(match.group())
+                i = match.end()
+
+    def close(self) -> Any:
+        """
+        Close the strings and containers left open by a truncated output and return the top-level value
+
+        Raises
+        ------
+        JsonParseError
+            If the text contains no object or array
+        """
+        is_complete = not self._bare_chunks
+        if self._string_quote is not None:
+            self._end_string()
+        elif self._bare_chunks:
+            self._end_bare_token(is_complete=False)
+        if self._value_words:
+            self._end_bare_value(is_complete)
+        while self._stack:
+            self._end_container(type(self._stack[-1][0]))
+        if self._root is None:
+            raise JsonParseError("No JSON object or array found")
+        return self._root
+
+    def _prepare_frame(self) -> Optional[list]:
+        """
+        Return the innermost frame ready to receive a value, handling missing commas
+        """
+        if not self._stack:
+            return None
+        frame = self._stack[-1]
+        if frame[2] == EXPECT_COMMA:
+            frame[2] = EXPECT_KEY if isinstance(frame[0], dict) else EXPECT_VALUE
+        return frame
+
+    def _add_value(self, value: Any):
+        frame = self._prepare_frame()
+        if frame is None:
+            self._root, self._done = value, True
+        elif isinstance(frame[0], list):
+            frame[0].append(value)
+            frame[2] = EXPECT_COMMA
+        elif frame[2] == EXPECT_KEY:
+            frame[1], frame[2] = value if isinstance(value, str) else str(value), EXPECT_COLON
+        else:  # value after a colon, or after a key without colon
+            frame[0][frame[1]] = value
+            frame[1], frame[2] = None, EXPECT_COMMA
+
+    def _start_container(self, container):
+        frame = self._prepare_frame()
+        if frame is None:
+            self._root = container
+        elif isinstance(frame[0], dict) and frame[2] == EXPECT_KEY:
+            if isinstance(container, dict):
+                frame[3] += 1  # doubled brace, e.g. "{{" copied from a prompt template
+                return
+            frame[1], frame[2] = "", EXPECT_VALUE  # array as a key, store it under an empty key
+            self._start_container(container)
+            return
+        else:
+            self._add_value(container)
+        self._stack.append([container, None, EXPECT_KEY if isinstance(container, dict) else EXPECT_VALUE, 0])
+
+    def _end_container(self, container_type: type):
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if container_type is dict and frame[3] > 0:
+            frame[3] -= 1
+            return
+        if not isinstance(frame[0], container_type) and not any(
+            isinstance(outer[0], container_type) for outer in self._stack
+        ):
+            return  # stray closing brace or bracket
+        while not isinstance(self._stack.pop()[0], container_type):
+            pass  # close the containers left open inside, e.g. "[1, 2}" closes the array
+        if not self._stack:
+            self._done = True
+
+    def _end_string(self):
+        text = decode_string("".join(self._string_chunks))
+        self._string_quote, self._string_chunks, self._pending_escape = None, [], False
+        if self._stack:
+            self._add_value(text)
+
+    def _end_bare_token(self, is_complete: bool = True):
+        token = "".join(self._bare_chunks)
+        self._bare_chunks = []
+        if not self._stack:
+            return
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[2] in (EXPECT_KEY, EXPECT_COMMA):
+            self._add_value(token)
+            return
+        if isinstance(frame[0], dict) and frame[2] == EXPECT_VALUE:
+            self._value_words.append((self._value_space, token))  # the value may continue with the next word
+            self._value_space = ""
+            return
+        try:
+            self._add_value(convert_bare_token(token, is_complete))
+        except JsonParseError:
+            pass
+
+    def _end_bare_value(self, is_complete: bool = True):
+        token = "".join(space + word for space, word in self._value_words)
+        self._value_words, self._value_space = [], ""
+        try:
+            self._add_value(convert_bare_token(token, is_complete))
+        except JsonParseError:
+            pass
+
+
+def find_tag(text: str, tag: str, start: int = 0) -> int:
+    """
+    Index of the first tag outside the string literals of the JSON values of a text, -1 if there is none
+
+    Quotes only delimit strings inside braces or brackets, the apostrophes of the prose around the JSON are ignored.
+    """
+    depth = 0
+    i = start
+    candidate = text.find(tag, start)
+    while candidate >= 0:
+        match = (VALUE_SCAN if depth else PROSE_SCAN).search(text, i)  # found at the latest at the candidate
+        token = match.group()
+        if match.start() == candidate:
+            return candidate
+        if token in "{[":
+            depth += 1
+        elif token in "}]":
+            depth -= 1
+        elif match.end() > candidate and token[0] != "<":  # the candidate is in a string literal
+            candidate = text.find(tag, match.end())
+        i = match.end()
+    return -1
+
+
+def extract_json_payload(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Return the part of an LLM answer holding the JSON, from its <json> tag or code fence if any, and the closing tag
+    or fence, which ends the JSON unless it is in a string literal
+    """
+    closing = None
+    start = find_tag(text, JSON_TAG_START)
+    if start >= 0:
+        text, closing = text[start + len(JSON_TAG_START) :], JSON_TAG_END
+    else:
+        fence = CODE_FENCE.search(text)
+        if fence is not None:
+            text, closing = text[fence.end() :], "```"
+
+    if IMPLICIT_OBJECT.match(text):
+        text = "{" + text
+    return text, closing
+
+
+def parse_json(text: str, root_types: str = "{[") -> Any:
+    """
+    Parse the JSON object or array of an LLM answer
+
+    Parameters
+    ----------
+    text : str
+        LLM answer, possibly with the JSON in <json> tags or a code fence, surrounded by prose or truncated
+    root_types : str, optional
+        Opening characters of the accepted top-level values, by default objects and arrays
+
+    Returns
+    -------
+    Any
+        Parsed object or array
+
+    Raises
+    ------
+    JsonParseError
+        If the answer contains no object or array
+    """
+    parser = JsonStreamParser(root_types)
+    payload, closing = extract_json_payload(text)
+    start, end = 0, payload.find(closing) if closing else -1
+    while end >= 0:
+        parser.feed(payload[start:end])
+        if not parser.in_string:
+            return parser.close()
+        start, end = end, payload.find(closing, end + 1)
+    parser.feed(payload[start:])
+    return parser.close()
+
+
+def parse_json_string(text: str) -> dict:
+    """
+    Parse dict from LLM response string
+    """
+    return parse_json(text, root_types="{")
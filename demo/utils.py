@@ -23,6 +23,7 @@ def run_tabulate_api(
     instructions: Optional[str] = "",
     few_shots: Optional[Sequence[Dict[str, Any]]] = [],
     model_params: Optional[Dict[str, str]] = None,
+    claim_id: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Run Tabulate to extract custom attributes and scores from the text(s)
@@ -58,6 +59,9 @@ def run_tabulate_api(
                 The values should be the values of the attributes you want to extract
     model_params : Optional[Dict[str, str]], optional
         LLM inference parameters, by default None
+    claim_id : Optional[str], optional
+        ID of a claim the documents are added to, by default None. Only new or changed documents of the claim are
+        processed, the summary covers all its documents.
 
     Returns
     -------
@@ -71,16 +75,17 @@ def run_tabulate_api(
     if isinstance(documents, str):
         documents = [documents]
 
-    event = json.dumps(
-        {
-            "attributes": attributes,
-            "documents": documents,
-            "instructions": instructions,
-            "few_shots": few_shots,
-            "model_params": model_params,
-            "parsing_mode": parsing_mode,
-        }
-    )
+    execution_input = {
+        "attributes": attributes,
+        "documents": documents,
+        "instructions": instructions,
+        "few_shots": few_shots,
+        "model_params": model_params,
+        "parsing_mode": parsing_mode,
+    }
+    if claim_id:
+        execution_input["claim_id"] = claim_id
+    event = json.dumps(execution_input)
 
     response = client.start_execution(
         stateMachineArn=state_machine_arn,
@@ -12,6 +12,7 @@ import aws_cdk.aws_apigatewayv2 as _apigw
 import aws_cdk.aws_apigatewayv2_integrations as _integrations
 from aws_cdk import Aws, Duration, RemovalPolicy
 from aws_cdk import aws_cognito as cognito
+from aws_cdk import aws_dynamodb as dynamodb
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_kms as kms
 from aws_cdk import aws_lambda as _lambda
@@ -38,6 +39,7 @@ HTTP_API_SERVICE_ACCESS_LOGS_FORMATTER = {
 QUERY_BEDROCK_TIMEOUT = 900
 TEXTRACT_TIMEOUT = 900
 PRESIGNED_URL_TIMEOUT = 900
+MANAGE_CLAIM_TIMEOUT = 300
 
 POWERPOINT_EXTENSIONS = (".ppt", ".pptx")
 WORD_EXTENSIONS = (".doc", ".docx")
@@ -58,6 +60,13 @@ class TabulateAPIConstructs(Construct):
         textract_region: str,
         architecture: _lambda.Architecture,
         python_runtime: _lambda.Runtime,
+        summary_output_mode: str = "text",
+        cascade_policy: dict = None,
+        governor_policy: dict = None,
+        hedge_policy: dict = None,
+        retry_budget: int = 3,
+        checkpoints_enabled: bool = True,
+        single_flight_policy: dict = None,
         table_flatten_headers: bool = True,
         table_remove_column_headers: bool = True,
         table_duplicate_text_in_merged_cells: bool = True,
@@ -75,6 +84,13 @@ class TabulateAPIConstructs(Construct):
         self.s3_data_bucket = s3_data_bucket
         self.bedrock_region = bedrock_region
         self.textract_region = textract_region
+        self.summary_output_mode = summary_output_mode
+        self.cascade_policy = cascade_policy or {}
+        self.governor_policy = governor_policy or {}
+        self.hedge_policy = hedge_policy or {}
+        self.retry_budget = retry_budget
+        self.checkpoints_enabled = checkpoints_enabled
+        self.single_flight_policy = single_flight_policy or {}
         self.table_flatten_headers = table_flatten_headers
         self.table_remove_column_headers = table_remove_column_headers
         self.table_duplicate_text_in_merged_cells = table_duplicate_text_in_merged_cells
@@ -105,6 +121,8 @@ class TabulateAPIConstructs(Construct):
 
         ## **************** Create resources ****************
         self.create_roles()
+        self.create_governor_table()
+        self.create_single_flight_table()
         self.create_lambda_functions()
         self.create_stepfunction_role()
         self.create_stepfunctions()
@@ -219,6 +237,42 @@ class TabulateAPIConstructs(Construct):
             string_value=self.client_id,
         )
 
+    def create_governor_table(self):
+        # token buckets of the Bedrock throughput governor, shared by the extraction Lambdas
+        self.governor_table_name = ""
+        if not self.governor_policy.get("enabled", False):
+            return
+        self.governor_table = dynamodb.Table(
+            self,
+            f"{self.stack_name}-governor-table",
+            table_name=f"{self.stack_name}-bedrock-governor",
+            partition_key=dynamodb.Attribute(name="bucket_key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        self.governor_table.grant_read_write_data(self.lambda_attributes_role)
+        self.governor_table_name = self.governor_table.table_name
+
+    def create_single_flight_table(self):
+        # locks and results of the work in flight, shared by the Lambdas processing the same documents
+        self.single_flight_table_name = ""
+        if not self.single_flight_policy.get("enabled", False):
+            return
+        self.single_flight_table = dynamodb.Table(
+            self,
+            f"{self.stack_name}-single-flight-table",
+            table_name=f"{self.stack_name}-single-flight",
+            partition_key=dynamodb.Attribute(name="flight_key", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+        for role in (self.lambda_attributes_role, self.lambda_textract_role, self.lambda_transcribe_role):
+            self.single_flight_table.grant_read_write_data(role)
+        self.single_flight_table_name = self.single_flight_table.table_name
+
     ## **************** Lambda Functions ****************
     def create_lambda_functions(self):
         ## ********* Get features *********
@@ -234,7 +288,15 @@ class TabulateAPIConstructs(Construct):
             timeout=Duration.seconds(QUERY_BEDROCK_TIMEOUT),
             environment={
                 "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+                "CHECKPOINTS_ENABLED": str(self.checkpoints_enabled),
+                "SINGLE_FLIGHT_POLICY": json.dumps(self.single_flight_policy),
+                "SINGLE_FLIGHT_TABLE": self.single_flight_table_name,
                 "BEDROCK_REGION": self.bedrock_region,
+                "SUMMARY_OUTPUT_MODE": self.summary_output_mode,
+                "CASCADE_POLICY": json.dumps(self.cascade_policy),
+                "GOVERNOR_POLICY": json.dumps(self.governor_policy),
+                "GOVERNOR_TABLE": self.governor_table_name,
+                "HEDGE_POLICY": json.dumps(self.hedge_policy),
             },
             role=self.lambda_attributes_role,
             layers=self.tabulate_code_layers,
@@ -291,6 +353,24 @@ class TabulateAPIConstructs(Construct):
             description="Alias used for Lambda provisioned concurrency",
         )
 
+        ## ********* Manage claims *********
+        self.manage_claim_lambda = _lambda.Function(
+            self,
+            f"{self.stack_name}-manage-claim-lambda",
+            runtime=self._python_runtime,
+            architecture=self._architecture,
+            code=_lambda.Code.from_asset("./assets/lambda/backend/manage_claim"),
+            handler="manage_claim.lambda_handler",
+            function_name=f"{self.stack_name}-manage-claim",
+            memory_size=512,
+            timeout=Duration.seconds(MANAGE_CLAIM_TIMEOUT),
+            environment={
+                "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+            },
+            role=self.lambda_claims_role,
+            layers=self.tabulate_code_layers,
+        )
+
         ## ********* Process with Textract *********
         self.textract_lambda = _lambda.Function(
             self,
@@ -303,6 +383,9 @@ class TabulateAPIConstructs(Construct):
             timeout=Duration.seconds(TEXTRACT_TIMEOUT),
             environment={
                 "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+                "CHECKPOINTS_ENABLED": str(self.checkpoints_enabled),
+                "SINGLE_FLIGHT_POLICY": json.dumps(self.single_flight_policy),
+                "SINGLE_FLIGHT_TABLE": self.single_flight_table_name,
                 "TEXTRACT_REGION": self.textract_region,
                 "TABLE_FLATTEN_HEADERS": str(self.table_flatten_headers),
                 "TABLE_REMOVE_COLUMN_HEADERS": str(self.table_remove_column_headers),
@@ -321,6 +404,28 @@ class TabulateAPIConstructs(Construct):
             description="Alias used for Lambda provisioned concurrency",
         )
 
+        ## ********* Classify PDF pages *********
+        self.classify_pages_lambda = _lambda.DockerImageFunction(
+            self,
+            f"{self.stack_name}-classify-pages-lambda",
+            code=_lambda.DockerImageCode.from_image_asset("./assets/lambda/backend/classify_pages"),
+            function_name=f"{self.stack_name}-classify-pages",
+            memory_size=3008,
+            timeout=Duration.seconds(TEXTRACT_TIMEOUT),
+            environment={
+                "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+                "CHECKPOINTS_ENABLED": str(self.checkpoints_enabled),
+                "SINGLE_FLIGHT_POLICY": json.dumps(self.single_flight_policy),
+                "SINGLE_FLIGHT_TABLE": self.single_flight_table_name,
+            },
+            role=self.lambda_textract_role,
+        )
+        self.classify_pages_lambda.add_alias(
+            "Warm",
+            provisioned_concurrent_executions=0,
+            description="Alias used for Lambda provisioned concurrency",
+        )
+
         ## ********* Process with Transcribe *********
         self.transcribe_lambda = _lambda.Function(
             self,
@@ -333,6 +438,9 @@ class TabulateAPIConstructs(Construct):
             timeout=Duration.seconds(TEXTRACT_TIMEOUT),
             environment={
                 "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+                "CHECKPOINTS_ENABLED": str(self.checkpoints_enabled),
+                "SINGLE_FLIGHT_POLICY": json.dumps(self.single_flight_policy),
+                "SINGLE_FLIGHT_TABLE": self.single_flight_table_name,
                 "TEXTRACT_REGION": self.textract_region,
                 "TABLE_FLATTEN_HEADERS": str(self.table_flatten_headers),
                 "TABLE_REMOVE_COLUMN_HEADERS": str(self.table_remove_column_headers),
@@ -362,7 +470,14 @@ class TabulateAPIConstructs(Construct):
             environment={
                 #"CUSTOMER_ID_TABLE_NAME": self.customer_index_table.table_name,
                 "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+                "CHECKPOINTS_ENABLED": str(self.checkpoints_enabled),
+                "SINGLE_FLIGHT_POLICY": json.dumps(self.single_flight_policy),
+                "SINGLE_FLIGHT_TABLE": self.single_flight_table_name,
                 "BEDROCK_REGION": self.bedrock_region,
+                "CASCADE_POLICY": json.dumps(self.cascade_policy),
+                "GOVERNOR_POLICY": json.dumps(self.governor_policy),
+                "GOVERNOR_TABLE": self.governor_table_name,
+                "HEDGE_POLICY": json.dumps(self.hedge_policy),
             },
             role=self.lambda_attributes_role, # TODO consider making a separate role?
         )
@@ -382,7 +497,14 @@ class TabulateAPIConstructs(Construct):
             timeout=Duration.seconds(TEXTRACT_TIMEOUT),
             environment={
                 "BUCKET_NAME": self.s3_data_bucket.bucket_name,
+                "CHECKPOINTS_ENABLED": str(self.checkpoints_enabled),
+                "SINGLE_FLIGHT_POLICY": json.dumps(self.single_flight_policy),
+                "SINGLE_FLIGHT_TABLE": self.single_flight_table_name,
                 "BEDROCK_REGION": self.bedrock_region,
+                "CASCADE_POLICY": json.dumps(self.cascade_policy),
+                "GOVERNOR_POLICY": json.dumps(self.governor_policy),
+                "GOVERNOR_TABLE": self.governor_table_name,
+                "HEDGE_POLICY": json.dumps(self.hedge_policy),
             },
             role=self.lambda_attributes_role, # TODO consider making a separate role?
         )
@@ -421,6 +543,14 @@ class TabulateAPIConstructs(Construct):
         )
 
 
+        self.lambda_claims_role = iam.Role(
+            self,
+            f"{self.stack_name}-claims-role",
+            role_name=f"{self.stack_name}-claims-role",
+            assumed_by=iam.CompositePrincipal(
+                iam.ServicePrincipal("lambda.amazonaws.com"),
+            ),
+        )
         self.lambda_transcribe_role = iam.Role(
             self,
             f"{self.stack_name}-transcribe-role",
@@ -455,6 +585,7 @@ class TabulateAPIConstructs(Construct):
         self.lambda_textract_role.attach_inline_policy(self.cloudwatch_access_policy)
         self.lambda_transcribe_role.attach_inline_policy(self.cloudwatch_access_policy)
         self.lambda_attributes_role.attach_inline_policy(self.cloudwatch_access_policy)
+        self.lambda_claims_role.attach_inline_policy(self.cloudwatch_access_policy)
 
         # Added to suppressing list given Resource::arn:aws:logs:<AWS::Region>:<AWS::AccountId>:log-group:*
         self.nag_suppressed_resources.append(self.cloudwatch_access_policy)
@@ -548,6 +679,7 @@ class TabulateAPIConstructs(Construct):
                 ),
             )
             self.lambda_attributes_role.attach_inline_policy(kms_policy)
+            self.lambda_claims_role.attach_inline_policy(kms_policy)
 
         ## ********* S3 *********
         s3_read_write_files_document = iam.PolicyDocument(
@@ -567,6 +699,7 @@ class TabulateAPIConstructs(Construct):
         self.lambda_presigned_url_role.attach_inline_policy(self.s3_read_write_files_policy)
         self.lambda_textract_role.attach_inline_policy(self.s3_read_write_files_policy)
         self.lambda_transcribe_role.attach_inline_policy(self.s3_read_write_files_policy)
+        self.lambda_claims_role.attach_inline_policy(self.s3_read_write_files_policy)
 
     def create_stepfunction_role(self: str):
         ## ********* IAM Roles *********
@@ -592,6 +725,8 @@ class TabulateAPIConstructs(Construct):
                         self.attributes_lambda.function_arn,
                         self.textract_lambda.function_arn,
                         self.transcribe_lambda.function_arn,
+                        self.classify_pages_lambda.function_arn,
+                        self.manage_claim_lambda.function_arn,
                         # self.llm_attributes_lambda.function_arn,
                     ],
                 )
@@ -617,7 +752,11 @@ class TabulateAPIConstructs(Construct):
                 "LAMBDA_EXTRACT_ATTRIBUTES_LLM_IMG": self.extract_attributes_llm_image.function_arn,
                 "LAMBDA_RUN_TEXTRACT": self.textract_lambda.function_arn,
                 "LAMBDA_RUN_TRANSCRIBE": self.transcribe_lambda.function_arn,
+                "LAMBDA_CLASSIFY_PAGES": self.classify_pages_lambda.function_arn,
                 "LAMBDA_EXTRACT_ATTRIBUTES": self.attributes_lambda.function_arn,
+                "LAMBDA_MANAGE_CLAIM": self.manage_claim_lambda.function_arn,
+                # retries of a task, passed in the payloads of the tasks and spent by the Lambdas
+                "RETRY_BUDGET": str(self.retry_budget),
                 # "LAMBDA_EXTRACT_ATTRIBUTES_LLM": self.llm_attributes_lambda.function_arn,
             },
             role=self.stepfunctions_role,
@@ -62,7 +62,7 @@ class TabulateLambdaLayers(Construct):
         self.epd = self._create_layer_from_asset(
             layer_name=f"{stack_name}-epd",
             path_to_layer_assets="./assets/layers/extra_dependencies/",
-            description="Lambda layer that contains pandas for textractor",
+            description="Lambda layer that contains pandas for textractor and ijson for streamed JSON parsing",
         )
 
         # AWS Lambda PowerTools
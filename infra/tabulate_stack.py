@@ -10,7 +10,7 @@ import json
 from typing import Any, Dict
 
 import aws_cdk.aws_apigateway as apigw_v1
-from aws_cdk import Aws, RemovalPolicy, Stack, Tags
+from aws_cdk import Aws, Duration, RemovalPolicy, Stack, Tags
 from aws_cdk import CfnOutput as output
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_kms as kms
@@ -105,6 +105,13 @@ class TabulateStack(Stack):
                 server_access_logs_prefix=f"buckets/{data_bucket_name}",
                 encryption=encryption,
                 enforce_ssl=True,
+                lifecycle_rules=[
+                    _s3.LifecycleRule(
+                        id="expire-checkpoints",
+                        prefix="checkpoints/",
+                        expiration=Duration.days(config.get("checkpoints", {}).get("expiration_days", 7)),
+                    )
+                ],
             )
 
         ## **************** Lambda layers ****************
@@ -121,6 +128,14 @@ class TabulateStack(Stack):
         bedrock_region = kwargs["env"].region
         textract_region = kwargs["env"].region
 
+        summary_output_mode = config.get("bedrock", {}).get("summary_output_mode", "text")
+        cascade_policy = config.get("cascade", {})
+        governor_policy = config.get("governor", {})
+        hedge_policy = config.get("hedging", {})
+        retry_budget = config.get("retries", {}).get("budget", 3)
+        checkpoints_enabled = config.get("checkpoints", {}).get("enabled", True)
+        single_flight_policy = config.get("single_flight", {})
+
         if "bedrock" in config:
             if "region" in config["bedrock"]:
                 bedrock_region = (
@@ -176,6 +191,13 @@ class TabulateStack(Stack):
             layers=self.layers,
             bedrock_region=bedrock_region,
             textract_region=textract_region,
+            summary_output_mode=summary_output_mode,
+            cascade_policy=cascade_policy,
+            governor_policy=governor_policy,
+            hedge_policy=hedge_policy,
+            retry_budget=retry_budget,
+            checkpoints_enabled=checkpoints_enabled,
+            single_flight_policy=single_flight_policy,
             table_flatten_headers=table_flatten_headers,
             table_remove_column_headers=table_remove_column_headers,
             table_duplicate_text_in_merged_cells=table_duplicate_text_in_merged_cells,
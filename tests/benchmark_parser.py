@@ -0,0 +1,85 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Benchmark of the tolerant JSON parser of the layer: throughput against json.loads on valid answers
+    and scaling on adversarial inputs, which must stay linear in the input size
+
+Usage:
+    python tests/benchmark_parser.py [--max-size 1000000] [--max-ratio 3]
+"""
+
+import argparse
+import json
+import pathlib
+import sys
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "assets" / "layers" / "tabulate" / "python"))
+
+from model.parser import JsonParseError, parse_json  # noqa: E402
+
+ADVERSARIAL_INPUTS = {
+    "nested arrays": lambda size: "[" * size,
+    "doubled braces": lambda size: "{" * size,
+    "backslashes": lambda size: '{"a": "' + "\\" * size,
+    "commas": lambda size: "[" + "," * size + "]",
+    "unclosed strings": lambda size: "{" + '"a' * (size // 2),
+    "stray closings": lambda size: "{" + "]" * size,
+    "prose without json": lambda size: "word " * (size // 5),
+}
+
+
+def answer_of_size(size: int) -> str:
+    record = {"PolicyNumber": "AB-12345", "Damage": "Front bumper and left headlight", "Cost": 1250.5, "Injured": False}
+    records = [dict(record, Id=idx) for idx in range(size // len(json.dumps(record)) + 1)]
+    return f"<thinking>Summary of the claim.</thinking>\n<json>\n{json.dumps({'claims': records}, indent=2)}\n</json>"
+
+
+def time_call(func, text: str) -> float:
+    start = time.perf_counter()
+    try:
+        func(text)
+    except JsonParseError:
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the tolerant JSON parser")
+    parser.add_argument("--max-size", type=int, default=1_000_000, help="Largest input size in characters")
+    parser.add_argument("--max-ratio", type=float, default=3.0, help="Max per-character slowdown between sizes")
+    args = parser.parse_args()
+
+    sizes = []
+    size = args.max_size
+    while size >= 10_000 and len(sizes) < 4:
+        sizes.insert(0, size)
+        size //= 4
+
+    print(f"{'input':<20} {'size':>10} {'parse_json MB/s':>16} {'json.loads MB/s':>16}")
+    for size in sizes:
+        text = answer_of_size(size)
+        payload = text.split("<json>")[1].split("</json>")[0]
+        elapsed = time_call(parse_json, text)
+        baseline = time_call(json.loads, payload)
+        mb = len(text) / 2**20
+        print(f"{'valid answer':<20} {len(text):>10} {mb / elapsed:>16.2f} {mb / baseline:>16.2f}")
+
+    failed = False
+    for name, make_input in ADVERSARIAL_INPUTS.items():
+        per_char = []
+        for size in sizes:
+            text = make_input(size)
+            per_char.append(time_call(parse_json, text) / len(text))
+            print(f"{name:<20} {len(text):>10} {len(text) / 2**20 / (per_char[-1] * len(text)):>16.2f}")
+        if per_char[-1] > args.max_ratio * per_char[0]:
+            print(f"{name}: parsing is not linear, {per_char[-1] / per_char[0]:.1f}x slower per character")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
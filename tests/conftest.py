@@ -0,0 +1,58 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Test configuration: the layer and the Lambdas under test are imported the way they are deployed
+"""
+
+import importlib
+import os
+import pathlib
+import sys
+
+import pytest
+
+ROOT = pathlib.Path(__file__).parents[1]
+LAYER_DIR = ROOT / "assets" / "layers" / "tabulate" / "python"
+LAMBDA_DIR = ROOT / "assets" / "lambda" / "backend"
+
+sys.path.insert(0, str(LAYER_DIR))
+
+# read by the Lambdas at import
+os.environ.setdefault("BUCKET_NAME", "test-bucket")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+
+@pytest.fixture
+def import_lambda(monkeypatch):
+    """
+    Import a module of a Lambda with the Lambda directory first on the path
+
+    The Lambdas share module names (utils, helpers, checkpoint...), so the modules that a Lambda ships are unloaded
+    before the import and restored after the test. Docker Lambdas ship their own copy of the model package, which
+    replaces the layer.
+    """
+    saved_modules = {}
+    shadowed_names = set()
+
+    def unload(names):
+        modules = {name: module for name, module in sys.modules.items() if name.split(".")[0] in names}
+        for name in modules:
+            del sys.modules[name]
+        return modules
+
+    def import_module(lambda_name, module_name):
+        lambda_dir = LAMBDA_DIR / lambda_name
+        local_names = {path.stem for path in lambda_dir.iterdir() if path.suffix == ".py" or path.is_dir()}
+        for name, module in unload(local_names).items():
+            saved_modules.setdefault(name, module)
+        shadowed_names.update(local_names)
+        layer_path = [] if "model" in local_names else [str(LAYER_DIR)]
+        monkeypatch.setattr(sys, "path", [str(lambda_dir)] + layer_path + [p for p in sys.path if p != str(LAYER_DIR)])
+        return importlib.import_module(module_name)
+
+    yield import_module
+
+    unload(shadowed_names)
+    sys.modules.update(saved_modules)
@@ -0,0 +1,139 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Fuzzing of the tolerant JSON parser of the layer: random values are serialized the way LLMs mangle them
+    (tags, fences, prose, single quotes, trailing commas, truncation, streamed chunks) and parsed back
+
+Usage:
+    python tests/fuzz_parser.py [--iterations 5000] [--seed 0]
+"""
+
+import argparse
+import json
+import pathlib
+import random
+import re
+import sys
+
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / "assets" / "layers" / "tabulate" / "python"))
+
+from model.parser import JsonParseError, JsonStreamParser, parse_json  # noqa: E402
+
+ALPHABET = "abcXYZ 019_-.,:;{}[]'\"\\/\n\té中\U0001f600"
+KEY_ALPHABET = "abcdefXYZ_0123456789 "
+
+
+def random_string(rng: random.Random, alphabet: str, max_length: int = 12) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.choice(["object", "array"] if depth == 0 else ["object", "array", "string", "number", "literal"] * 2)
+    if kind in ("object", "array") and depth >= 4:
+        kind = "string"
+    if kind == "object":
+        return {random_string(rng, KEY_ALPHABET) or "k": random_value(rng, depth + 1) for _ in range(rng.randint(0, 5))}
+    if kind == "array":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+    if kind == "string":
+        return random_string(rng, ALPHABET)
+    if kind == "number":
+        return rng.choice([rng.randint(-(10**6), 10**6), round(rng.uniform(-1e3, 1e3), 3)])
+    return rng.choice([True, False, None])
+
+
+def add_trailing_commas(text: str) -> str:
+    # only safe on the output of json.dumps without strings containing brackets, used on string-free values
+    return re.sub(r"([}\]])", r",\1", text)
+
+
+def wrap(rng: random.Random, text: str) -> str:
+    return rng.choice(
+        [
+            text,
+            f"<thinking>The document is a claim form.</thinking>\n<json>\n{text}\n</json>",
+            f"Here is the answer:\n```json\n{text}\n```\nLet me know if you need anything else.",
+            f"Sure! {text} Hope it helps.",
+        ]
+    )
+
+
+def parse_streamed(rng: random.Random, text: str):
+    parser = JsonStreamParser()
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 16)
+        parser.feed(text[i : i + size])
+        i += size
+    return parser.close()
+
+
+def contains_strings(value) -> bool:
+    if isinstance(value, str):
+        return True
+    if isinstance(value, dict):
+        return bool(value) or any(contains_strings(item) for item in value.values())
+    if isinstance(value, list):
+        return any(contains_strings(item) for item in value)
+    return False
+
+
+def main():  # noqa: C901
+    parser = argparse.ArgumentParser(description="Fuzz the tolerant JSON parser")
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+
+    def check(name, text, expected, parse=parse_json):
+        nonlocal failures
+        try:
+            result = parse(text)
+        except Exception as e:  # noqa: BLE001
+            result = e
+        if result != expected:
+            failures += 1
+            if failures <= 10:
+                print(f"[{name}] mismatch\n  input:    {text!r}\n  expected: {expected!r}\n  got:      {result!r}")
+
+    for _ in range(args.iterations):
+        value = random_value(rng)
+        text = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+
+        check("valid", wrap(rng, text), value)
+        check("streamed", text, value, parse=lambda text: parse_streamed(rng, text))
+        if not contains_strings(value):
+            check("trailing commas", add_trailing_commas(text), value)
+        check("python literal", repr(value), value)
+
+        # truncated outputs must parse to a container or fail with JsonParseError, never crash
+        cut = rng.randint(0, len(text))
+        try:
+            result = parse_json(text[:cut])
+            assert isinstance(result, (dict, list))
+        except JsonParseError:
+            pass
+        except Exception as e:  # noqa: BLE001
+            failures += 1
+            print(f"[truncated] crash on {text[:cut]!r}: {e!r}")
+
+        # random garbage must never crash
+        garbage = random_string(rng, ALPHABET + "truefalsnul", max_length=60)
+        try:
+            parse_json(garbage)
+        except JsonParseError:
+            pass
+        except Exception as e:  # noqa: BLE001
+            failures += 1
+            print(f"[garbage] crash on {garbage!r}: {e!r}")
+
+    print(f"{args.iterations} iterations, {failures} failures")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
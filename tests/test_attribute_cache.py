@@ -0,0 +1,101 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the attribute cache: only new or changed attributes are extracted
+"""
+
+import pytest
+from model.attribute_cache import AttributeCache, run_incremental
+from model.cascade import CascadePolicy, run_cascade
+from model.checkpoint import Checkpoints, LocalCheckpointStore
+from model.structured import get_attribute_names
+
+
+@pytest.fixture
+def extract_incremental(tmp_path):
+    calls = []
+
+    def extract(model_id, attributes):
+        calls.append(get_attribute_names(attributes))
+        return {attribute["name"]: f"{model_id}:{attribute['description']}" for attribute in attributes}, "raw"
+
+    def run(attributes, inputs=None):
+        checkpoints = Checkpoints(LocalCheckpointStore(str(tmp_path)), "document-hash", "execution")
+        cache = AttributeCache(checkpoints, inputs or {"tiers": ["model"], "temperature": 0})
+        return run_incremental(
+            lambda pending: run_cascade(extract, ["model"], pending, CascadePolicy()), attributes, cache
+        )
+
+    return run, calls
+
+
+def test_only_new_or_changed_attributes_are_extracted(extract_incremental):
+    run, calls = extract_incremental
+    run([{"name": "a", "description": "x"}, {"name": "b", "description": "y"}])
+    assert calls == [["a", "b"]]
+
+    result = run(
+        [{"name": "a", "description": "x"}, {"name": "b", "description": "y2"}, {"name": "c", "description": "z"}]
+    )
+    assert calls[-1] == ["b", "c"]
+    assert result.answer == {"a": "model:x", "b": "model:y2", "c": "model:z"}
+    assert result.reused == ["a"]
+    assert result.field_tiers == {"a": "model", "b": "model", "c": "model"}
+
+
+def test_cached_attributes_are_not_extracted_again(extract_incremental):
+    run, calls = extract_incremental
+    attributes = [{"name": "a", "description": "x"}]
+    run(attributes)
+    result = run(attributes)
+    assert calls == [["a"]]
+    assert result.parsed and result.reused == ["a"] and result.steps == []
+
+
+def test_other_parameters_do_not_share_the_cache(extract_incremental):
+    run, calls = extract_incremental
+    attributes = [{"name": "a", "description": "x"}]
+    run(attributes)
+    run(attributes, inputs={"tiers": ["model"], "temperature": 1})
+    assert calls == [["a"], ["a"]]
+
+
+def test_unparsable_answers_are_not_cached(tmp_path):
+    checkpoints = Checkpoints(LocalCheckpointStore(str(tmp_path)), "document-hash")
+    cache = AttributeCache(checkpoints, {})
+    attributes = [{"name": "a", "description": "x"}]
+    result = run_incremental(
+        lambda pending: run_cascade(lambda model_id, names: (None, "no json"), ["model"], pending, CascadePolicy()),
+        attributes,
+        cache,
+    )
+    assert not result.parsed
+    assert AttributeCache(checkpoints, {}).load() == {}
+
+
+def test_values_rejected_by_every_tier_are_not_cached(tmp_path):
+    calls = []
+
+    def extract(model_id, attributes):
+        calls.append((model_id, get_attribute_names(attributes)))
+        return {attribute["name"]: "N/A" if attribute["name"] == "b" else "value" for attribute in attributes}, "raw"
+
+    checkpoints = Checkpoints(LocalCheckpointStore(str(tmp_path)), "document-hash")
+    policy = CascadePolicy(enabled=True, model_ids=["fast", "strong"])
+    attributes = [{"name": "a", "description": "x"}, {"name": "b", "description": "y"}]
+
+    def run():
+        cache = AttributeCache(checkpoints, {"tiers": policy.model_ids})
+        return run_incremental(
+            lambda pending: run_cascade(extract, policy.model_ids, pending, policy), attributes, cache
+        )
+
+    result = run()
+    assert calls == [("fast", ["a", "b"]), ("strong", ["b"])]
+    assert result.answer == {"a": "value", "b": "N/A"} and result.invalid == ["b"]
+
+    result = run()
+    assert calls[2:] == [("fast", ["b"]), ("strong", ["b"])]
+    assert result.reused == ["a"]
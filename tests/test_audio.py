@@ -0,0 +1,90 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the audio preprocessing of the transcription Lambda
+"""
+
+import io
+import tracemalloc
+import wave
+
+import numpy as np
+import pytest
+from botocore.response import StreamingBody
+
+
+@pytest.fixture
+def audio(import_lambda):
+    return import_lambda("run_transcribe", "audio")
+
+
+def make_wav(samples: np.ndarray, sample_rate: int, num_channels: int = 1, sample_width: int = 2) -> bytes:
+    frames = np.repeat(samples[:, None], num_channels, axis=1).ravel()
+    if sample_width == 1:
+        raw = (frames * 127 + 128).astype(np.uint8).tobytes()
+    elif sample_width == 3:
+        raw = (frames * (2**23 - 1)).astype("<i4").view(np.uint8).reshape(-1, 4)[:, :3].tobytes()
+    else:
+        raw = (frames * (2 ** (8 * sample_width - 1) - 1)).astype(f"<i{sample_width}").tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(num_channels)
+        wav.setsampwidth(sample_width)
+        wav.setframerate(sample_rate)
+        wav.writeframes(raw)
+    return buffer.getvalue()
+
+
+def tone(sample_rate: int, seconds: float, amplitude: float = 0.5, frequency: float = 440) -> np.ndarray:
+    return amplitude * np.sin(2 * np.pi * frequency * np.arange(int(seconds * sample_rate)) / sample_rate)
+
+
+def stream(data: bytes) -> StreamingBody:
+    return StreamingBody(io.BytesIO(data), len(data))
+
+
+@pytest.mark.parametrize(
+    "sample_rate, num_channels, sample_width", [(48_000, 2, 2), (44_100, 1, 3), (16_000, 2, 2), (8_000, 1, 1)]
+)
+def test_read_wav_resamples_to_mono(audio, sample_rate, num_channels, sample_width):
+    signal = tone(sample_rate, 2)
+    samples = audio.read_wav(stream(make_wav(signal, sample_rate, num_channels, sample_width)), block_frames=1000)
+
+    assert samples.dtype == np.float32
+    assert len(samples) == 2 * audio.TARGET_SAMPLE_RATE
+    expected = tone(audio.TARGET_SAMPLE_RATE, 2)
+    assert np.abs(samples - expected)[10:-10].max() < 0.02
+
+
+def test_blocks_do_not_change_the_output(audio):
+    data = make_wav(np.random.default_rng(0).uniform(-0.5, 0.5, 44_100), 44_100, num_channels=2)
+    assert np.array_equal(audio.read_wav(data, block_frames=777), audio.read_wav(data))
+
+
+def test_silences_are_trimmed(audio):
+    sample_rate = 48_000
+    signal = np.concatenate([np.zeros(3 * sample_rate), tone(sample_rate, 2), np.zeros(4 * sample_rate)])
+    samples, timestamp_map = audio.preprocess_wav(stream(make_wav(signal, sample_rate, num_channels=2)))
+
+    assert len(timestamp_map) == 1
+    assert timestamp_map[0]["original_start"] == pytest.approx(3 - audio.KEEP_SILENCE_S, abs=audio.FRAME_S)
+    assert len(samples) / audio.TARGET_SAMPLE_RATE == pytest.approx(2 + 2 * audio.KEEP_SILENCE_S, abs=2 * audio.FRAME_S)
+    assert audio.get_time_mapper(timestamp_map)(1.0) == pytest.approx(timestamp_map[0]["original_start"] + 1)
+
+
+def test_memory_does_not_grow_with_the_original_recording(audio):
+    sample_rate, seconds = 48_000, 60
+    speech = np.tile(np.concatenate([tone(sample_rate, 5), np.zeros(5 * sample_rate)]), seconds // 10)
+    data = make_wav(speech, sample_rate, num_channels=2)
+
+    tracemalloc.start()
+    try:
+        audio.preprocess_wav(stream(data))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # the preprocessed audio is 16 kHz mono float32, 1/3 of the 48 kHz stereo 16-bit original, plus one block;
+    # decoding the whole original at once took about 10 times its size
+    assert peak < len(data)
@@ -0,0 +1,100 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the model cascade: only the attributes rejected by a tier are re-asked to the next one
+"""
+
+import pytest
+from model.cascade import CascadePolicy, run_cascade
+from model.structured import get_attribute_names
+
+ATTRIBUTES = [{"name": "policy", "description": "policy number"}, {"name": "total", "description": "total amount"}]
+POLICY = CascadePolicy(enabled=True, model_ids=["fast", "strong"], patterns={"policy": r"\d{3}-\d{3}"})
+
+
+class FakeDeadline:
+    def __init__(self, remaining_s):
+        self.remaining_s = remaining_s
+        self.degradations = []
+
+    def remaining(self):
+        return self.remaining_s
+
+    def degrade(self, step, detail):
+        self.degradations.append(step)
+
+
+def make_extract(answers):
+    calls = []
+
+    def extract(model_id, attributes):
+        calls.append((model_id, get_attribute_names(attributes)))
+        answer = answers[model_id]
+        return answer, str(answer)
+
+    return extract, calls
+
+
+@pytest.mark.parametrize(
+    "name, value, valid",
+    [
+        ("policy", "123-456", True),
+        ("policy", "123456", False),
+        ("total", "N/A", False),
+        ("total", " unknown ", False),
+        ("total", "<total>", False),
+        ("total", None, False),
+        ("total", 0, True),
+        ("total", ["", "1,200"], True),
+        ("total", {"amount": "none"}, False),
+    ],
+)
+def test_is_valid(name, value, valid):
+    assert POLICY.is_valid(name, value) == valid
+
+
+def test_tiers_that_do_not_fit_are_dropped():
+    assert CascadePolicy().get_tiers("requested") == ["requested"]
+    assert POLICY.get_tiers("requested") == ["fast", "strong"]
+    assert POLICY.get_tiers("requested", fits=lambda model_id: model_id == "fast") == ["fast"]
+    assert POLICY.get_tiers("requested", fits=lambda model_id: False) == ["requested"]
+
+
+def test_cascade_is_disabled_without_models(monkeypatch):
+    monkeypatch.setenv("CASCADE_POLICY", '{"enabled": true, "model_ids": []}')
+    assert not CascadePolicy.from_env().enabled
+
+
+def test_only_invalid_attributes_are_escalated():
+    extract, calls = make_extract(
+        {"fast": {"policy": "123456", "total": "1,200"}, "strong": {"policy": "123-456", "total": "9"}}
+    )
+    result = run_cascade(extract, POLICY.model_ids, ATTRIBUTES, POLICY)
+    assert calls == [("fast", ["policy", "total"]), ("strong", ["policy"])]
+    assert result.answer == {"policy": "123-456", "total": "1,200"}
+    assert result.field_tiers == {"policy": "strong", "total": "fast"}
+    assert result.invalid == [] and result.raw_answer == str({"policy": "123456", "total": "1,200"})
+
+
+def test_first_answer_is_kept_when_no_tier_answers():
+    extract, calls = make_extract({"fast": {"policy": "123456", "total": "1,200"}, "strong": None})
+    result = run_cascade(extract, POLICY.model_ids, ATTRIBUTES, POLICY)
+    assert result.answer == {"policy": "123456", "total": "1,200"}
+    assert result.invalid == ["policy"] and result.parsed
+
+
+def test_unparsable_answer_sends_the_whole_document_to_the_next_tier():
+    extract, calls = make_extract({"fast": None, "strong": {"policy": "123-456", "total": "1,200"}})
+    result = run_cascade(extract, POLICY.model_ids, ATTRIBUTES, POLICY)
+    assert calls == [("fast", ["policy", "total"]), ("strong", ["policy", "total"])]
+    assert result.field_tiers == {"policy": "strong", "total": "strong"}
+
+
+def test_escalation_stops_at_the_deadline():
+    extract, calls = make_extract({"fast": {"policy": "123456", "total": "1,200"}})
+    deadline = FakeDeadline(remaining_s=1.0)
+    result = run_cascade(extract, POLICY.model_ids, ATTRIBUTES, POLICY, deadline=deadline)
+    assert [model_id for model_id, _ in calls] == ["fast"]
+    assert deadline.degradations == ["cascade"] and result.invalid == ["policy"]
@@ -0,0 +1,70 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the claims: planning of the documents to be processed and memoization of their outputs
+"""
+
+import pytest
+from model.claim import Claim, get_output_fingerprint
+
+FINGERPRINT = get_output_fingerprint({"attributes": ["PolicyNumber"], "model_params": {"model_id": "model"}})
+
+
+@pytest.fixture
+def claim(tmp_path):
+    return Claim.from_directory(str(tmp_path), "claim-1")
+
+
+def test_only_new_documents_are_processed(claim):
+    hashes = {"report.pdf": "h1", "photo.jpg": "h2"}
+    plan = claim.plan(["report.pdf"], FINGERPRINT, hashes.get)
+    assert plan.pending == ["report.pdf"]
+    assert claim.commit(plan, [{"answer": "report"}], "execution-1") == [{"answer": "report"}]
+
+    plan = claim.plan(["photo.jpg"], FINGERPRINT, hashes.get)
+    assert plan.documents == ["report.pdf", "photo.jpg"]
+    assert plan.pending == ["photo.jpg"]
+    assert claim.commit(plan, [{"answer": "photo"}], "execution-2") == [{"answer": "report"}, {"answer": "photo"}]
+
+
+def test_changed_and_failed_documents_are_processed_again(claim):
+    hashes = {"report.pdf": "h1"}
+    claim.commit(claim.plan(["report.pdf"], FINGERPRINT, hashes.get), [{"answer": "v1"}])
+
+    hashes["report.pdf"] = "h2"
+    plan = claim.plan([], FINGERPRINT, hashes.get)
+    assert plan.pending == ["report.pdf"]
+    claim.commit(plan, [{"error": "throttled"}])
+    assert claim.plan([], FINGERPRINT, hashes.get).pending == ["report.pdf"]
+
+    other_fingerprint = get_output_fingerprint({"attributes": ["Cost"]})
+    assert claim.plan([], other_fingerprint, hashes.get).pending == ["report.pdf"]
+
+
+def test_deleted_documents_are_removed(claim):
+    hashes = {"report.pdf": "h1", "photo.jpg": "h2"}
+    claim.commit(claim.plan(["report.pdf", "photo.jpg"], FINGERPRINT, hashes.get), [{"answer": 1}, {"answer": 2}])
+
+    del hashes["report.pdf"]
+    plan = claim.plan([], FINGERPRINT, hashes.get)
+    assert plan.removed == ["report.pdf"]
+    assert claim.commit(plan, []) == [{"answer": 2}]
+    assert list(claim.load_manifest()) == ["photo.jpg"]
+
+
+def test_concurrent_commits_keep_all_documents(claim):
+    hashes = {"report.pdf": "h1", "photo.jpg": "h2"}
+    first = claim.plan(["report.pdf"], FINGERPRINT, hashes.get)
+    second = claim.plan(["photo.jpg"], FINGERPRINT, hashes.get)
+    claim.commit(second, [{"answer": "photo"}])
+    claim.commit(first, [{"answer": "report"}])
+
+    assert sorted(claim.load_manifest()) == ["photo.jpg", "report.pdf"]
+    assert claim.plan([], FINGERPRINT, hashes.get).pending == []
+
+
+def test_invalid_claim_id(tmp_path):
+    with pytest.raises(ValueError):
+        Claim.from_directory(str(tmp_path), "../other-claim")
@@ -0,0 +1,88 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the page labels: blank, photo, table and text-dense pages rendered at the classification resolution
+"""
+
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+from pypdf import PdfReader, PdfWriter
+
+PAGE_SIZE = (340, 440)  # letter page at 40 dpi
+LOREM = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 10
+
+
+@pytest.fixture
+def utils(import_lambda):
+    return import_lambda("classify_pages", "utils")
+
+
+def make_text_page() -> Image.Image:
+    image = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    for row in range(30):
+        draw.text((20, 20 + 13 * row), "Lorem ipsum dolor sit amet, consectetur", fill="black")
+    return image
+
+
+def make_table_page() -> Image.Image:
+    image = Image.new("RGB", PAGE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(40, 400, 40):
+        draw.line((20, y, 320, y), fill="black", width=2)
+    for x in (20, 170, 320):
+        draw.line((x, 40, x, 360), fill="black", width=2)
+    return image
+
+
+def make_photo_page() -> Image.Image:
+    colors = np.random.default_rng(0).integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(colors).resize(PAGE_SIZE, Image.Resampling.BICUBIC)
+
+
+def test_blank_page(utils):
+    assert utils.classify_page(Image.new("RGB", PAGE_SIZE, "white")) == utils.LABEL_BLANK
+
+
+def test_text_layer_is_not_a_blank_page(utils):
+    assert utils.classify_page(Image.new("RGB", PAGE_SIZE, "white"), LOREM) == utils.LABEL_TEXT
+
+
+def test_photo_page(utils):
+    assert utils.classify_page(make_photo_page()) == utils.LABEL_PHOTO
+
+
+def test_scanned_text_is_not_a_photo(utils):
+    assert utils.classify_page(make_photo_page(), LOREM) != utils.LABEL_PHOTO
+
+
+def test_table_page(utils):
+    assert utils.classify_page(make_table_page()) == utils.LABEL_TABLE
+
+
+def test_text_page(utils):
+    assert utils.classify_page(make_text_page(), LOREM) == utils.LABEL_TEXT
+
+
+@pytest.mark.parametrize(
+    "profile, num_lines",
+    [([0, 0, 0], 0), ([255, 255, 0, 255], 2), ([0, 128, 0], 1), ([0, 127, 0], 0)],
+)
+def test_count_lines(utils, profile, num_lines):
+    assert utils.count_lines(profile) == num_lines
+
+
+def test_write_pdf_subset(utils):
+    writer = PdfWriter()
+    for width in (100, 200, 300):
+        writer.add_blank_page(width=width, height=100)
+    buffer = BytesIO()
+    writer.write(buffer)
+
+    subset = PdfReader(BytesIO(utils.write_pdf_subset(PdfReader(buffer), [1, 3])))
+    assert [float(page.mediabox.width) for page in subset.pages] == [100, 300]
@@ -0,0 +1,79 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the page routing: text pages go to the OCR path, photo pages are rendered once to the vision path
+"""
+
+import pathlib
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+DEMO_PDF = pathlib.Path(__file__).parents[1] / "demo" / "originals" / "code-sample-catalog.pdf"
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+
+    def get_object(self, Bucket, Key):
+        return {"Body": BytesIO(self.objects[Key])}
+
+    def put_object(self, Body, Bucket, Key, ContentType):
+        self.objects[Key] = Body
+
+
+def make_photo_pdf() -> bytes:
+    colors = np.random.default_rng(0).integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(colors).resize((800, 600), Image.Resampling.BICUBIC).save(buffer, format="PDF", resolution=100)
+    return buffer.getvalue()
+
+
+def make_mixed_pdf() -> bytes:
+    writer = PdfWriter()
+    for source in [DEMO_PDF.read_bytes(), make_photo_pdf()]:
+        writer.append(PdfReader(BytesIO(source)), pages=(0, 1))
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def classify_pages(import_lambda, monkeypatch):
+    module = import_lambda("classify_pages", "classify_pages")
+    monkeypatch.setattr(module, "S3_CLIENT", FakeS3({"originals/mixed.pdf": make_mixed_pdf()}))
+    return module
+
+
+def test_text_and_photo_pages_are_routed(classify_pages):
+    routing = classify_pages.route_pages("originals/mixed.pdf", "pages/doc")
+    assert routing["page_labels"][1] == classify_pages.LABEL_PHOTO
+    assert routing["page_labels"][0] in classify_pages.OCR_LABELS
+    assert routing["photo_page_keys"] == ["pages/doc/page_2.jpg"]
+    assert routing["text_file_name"] == "pages/doc/text_pages.pdf"
+
+    objects = classify_pages.S3_CLIENT.objects
+    assert len(PdfReader(BytesIO(objects["pages/doc/text_pages.pdf"])).pages) == 1
+    photo = Image.open(BytesIO(objects["pages/doc/page_2.jpg"]))
+    assert photo.format == "JPEG" and photo.width == pytest.approx(800 * classify_pages.PHOTO_DPI / 100, abs=1)
+
+
+def test_failed_renderer_falls_back_to_poppler(classify_pages, monkeypatch):
+    renderer_names = []
+
+    def label_pages(pdf_bytes, reader, renderer_name=classify_pages.PDF_RENDERER):
+        renderer_names.append(renderer_name)
+        if renderer_name != "poppler":
+            raise RuntimeError("cannot open")
+        return ["text-dense"] * len(reader.pages), {}
+
+    monkeypatch.setattr(classify_pages, "label_pages", label_pages)
+    routing = classify_pages.route_pages("originals/mixed.pdf", "pages/doc")
+    assert renderer_names == ["pdfium", "poppler"]
+    assert routing["text_file_name"] == "originals/mixed.pdf"
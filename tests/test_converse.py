@@ -0,0 +1,72 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the Converse API module: transient errors are retried in-process, the others fail immediately
+"""
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from model import converse
+from model.converse import ConverseError, invoke
+
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+RESPONSE = {
+    "output": {"message": {"role": "assistant", "content": [{"text": "answer"}]}},
+    "stopReason": "end_turn",
+    "usage": {"inputTokens": 10, "outputTokens": 2},
+}
+
+
+class FakeClient:
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def converse(self, **request):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(converse.time, "sleep", lambda seconds: None)
+
+
+def call(client, max_attempts=5):
+    return invoke(client, MODEL_ID, {"modelId": MODEL_ID}, False, None, max_attempts)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ReadTimeoutError(endpoint_url="https://bedrock-runtime"),
+        EndpointConnectionError(endpoint_url="https://bedrock-runtime"),
+        ClientError({"Error": {"Code": "ThrottlingException"}}, "Converse"),
+    ],
+)
+def test_transient_errors_are_retried(error):
+    client = FakeClient(error, RESPONSE)
+    result = call(client)
+    assert result.text == "answer" and result.attempts == 2
+
+
+def test_other_errors_fail_immediately():
+    client = FakeClient(ClientError({"Error": {"Code": "ValidationException"}}, "Converse"), RESPONSE)
+    with pytest.raises(ConverseError) as e:
+        call(client)
+    assert e.value.code == "ValidationException" and not e.value.retryable
+    assert client.calls == 1
+
+
+@pytest.mark.parametrize("max_attempts", [0, 1, 3])
+def test_attempts_are_capped(max_attempts):
+    client = FakeClient(*[ReadTimeoutError(endpoint_url="https://bedrock-runtime")] * 3, RESPONSE)
+    with pytest.raises(ConverseError) as e:
+        call(client, max_attempts)
+    assert e.value.code == "ReadTimeoutError" and e.value.retryable
+    assert client.calls == max(max_attempts, 1)
@@ -0,0 +1,81 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the deadline: client read timeouts and the degradations that fit a call in the remaining time
+"""
+
+import math
+
+import pytest
+from model import deadline as deadline_module
+from model.deadline import (
+    SMALL_IMAGE_MAX_SIDE,
+    Deadline,
+    DeadlineExceeded,
+    VisionPlan,
+    fits_vision_call,
+    get_fastest_model,
+    plan_text_call,
+    plan_vision_call,
+)
+
+HAIKU = "anthropic.claude-3-haiku-20240307-v1:0"
+SONNET = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+
+class FakeContext:
+    def get_remaining_time_in_millis(self):
+        return 60_000
+
+
+@pytest.fixture
+def make_deadline(monkeypatch):
+    monkeypatch.setattr(deadline_module.time, "monotonic", lambda: 0.0)
+    return lambda budget_s: Deadline(budget_s, reserve_s=0)
+
+
+def test_remaining_time_keeps_a_reserve(make_deadline):
+    assert Deadline.from_context(FakeContext()).remaining() == 55.0
+    assert Deadline.from_context(None).remaining() == math.inf
+    with pytest.raises(DeadlineExceeded):
+        make_deadline(-1).check("extraction")
+
+
+@pytest.mark.parametrize("remaining_s, read_timeout", [(200, None), (120, None), (50, 40), (10, 10), (5, 10)])
+def test_read_timeout_ends_before_the_deadline(make_deadline, remaining_s, read_timeout):
+    assert make_deadline(remaining_s).read_timeout() == read_timeout
+
+
+def test_fastest_model_replaces_a_text_call_that_does_not_fit(make_deadline):
+    deadline = make_deadline(100)
+    assert plan_text_call(deadline, SONNET, max_tokens=1_000) == SONNET
+    assert deadline.degradations == []
+
+    deadline = make_deadline(10)
+    fastest = get_fastest_model().model_id
+    assert plan_text_call(deadline, SONNET, max_tokens=1_000) == fastest
+    assert deadline.degradations[0]["detail"] == f"{fastest} used instead of {SONNET}"
+
+
+@pytest.mark.parametrize(
+    "budget_s, plan, degraded_steps",
+    [
+        (100, VisionPlan(SONNET, 20), []),
+        (26.5, VisionPlan(SONNET, 20, SMALL_IMAGE_MAX_SIDE), ["images"]),
+        (23, VisionPlan(SONNET, 7, SMALL_IMAGE_MAX_SIDE), ["images", "pages"]),
+        (15, VisionPlan(HAIKU, 20, SMALL_IMAGE_MAX_SIDE), ["images", "model"]),
+        (9.5, VisionPlan(HAIKU, 1, SMALL_IMAGE_MAX_SIDE), ["images", "model", "pages"]),
+    ],
+)
+def test_vision_call_is_degraded_step_by_step(make_deadline, budget_s, plan, degraded_steps):
+    deadline = make_deadline(budget_s)
+    assert plan_vision_call(deadline, SONNET, max_pages=20, max_tokens=1_000) == plan
+    assert [degradation["step"] for degradation in deadline.degradations] == degraded_steps
+
+
+def test_fits_vision_call_uses_the_image_size_of_the_plan(make_deadline):
+    deadline = make_deadline(26.5)
+    assert not fits_vision_call(deadline, SONNET, VisionPlan(SONNET, 20), max_tokens=1_000)
+    assert fits_vision_call(deadline, SONNET, VisionPlan(SONNET, 20, SMALL_IMAGE_MAX_SIDE), max_tokens=1_000)
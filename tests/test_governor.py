@@ -0,0 +1,161 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the throughput governor: token buckets, waits for capacity and reconciliation with the billed tokens
+"""
+
+import pytest
+from botocore.exceptions import ClientError
+from model import governor
+from model.governor import (
+    BucketState,
+    DynamoDBBucketStore,
+    Governor,
+    GovernorTimeout,
+    InMemoryBucketStore,
+    Quota,
+    estimate_tokens,
+    refill,
+    take,
+)
+
+QUOTA = Quota(requests_per_minute=60, tokens_per_minute=6_000)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeTable:
+    """
+    DynamoDB table whose first conditional writes fail, as if other Lambdas updated the item in between
+    """
+
+    def __init__(self, num_conflicts=0):
+        self.items = {}
+        self.num_conflicts = num_conflicts
+
+    def get_item(self, Key, ConsistentRead):
+        item = self.items.get(Key["bucket_key"])
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues=None):
+        if self.num_conflicts:
+            self.num_conflicts -= 1
+            raise ClientError({"Error": {"Code": "ConditionalCheckFailedException"}}, "PutItem")
+        self.items[Item["bucket_key"]] = Item
+
+
+class FakeResource:
+    def __init__(self, table):
+        self.table = table
+
+    def Table(self, name):
+        return self.table
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(governor.time, "time", clock.time)
+    monkeypatch.setattr(governor.time, "sleep", clock.sleep)
+    monkeypatch.setattr(governor.random, "uniform", lambda a, b: 1.0)
+    return clock
+
+
+def test_missing_bucket_is_full_and_refills_up_to_the_quota():
+    assert refill(None, QUOTA, 0.0) == BucketState(60, 6_000, 0.0)
+    state = refill(BucketState(0, 0, 0.0), QUOTA, 30.0)
+    assert (state.requests, state.tokens) == (30, 3_000)
+    state = refill(BucketState(0, 0, 0.0), QUOTA, 600.0)
+    assert (state.requests, state.tokens) == (60, 6_000)
+
+
+def test_take_returns_the_time_until_the_bucket_holds_enough():
+    state, wait = take(BucketState(10, 1_000, 0.0), QUOTA, 1, 400)
+    assert (state.requests, state.tokens, wait) == (9, 600, 0.0)
+    state, wait = take(BucketState(10, 1_000, 0.0), QUOTA, 1, 1_600)
+    assert state is None and wait == pytest.approx(6.0)
+
+
+def test_reservation_larger_than_the_bucket_is_granted_when_full():
+    state, wait = take(refill(None, QUOTA, 0.0), QUOTA, 1, 10_000)
+    assert wait == 0.0 and state.tokens == -4_000  # the debt is paid by the refill
+
+
+def test_reserve_waits_for_the_refill(clock):
+    gov = Governor(InMemoryBucketStore(), {"model": QUOTA}, "us-east-1")
+    gov.reserve("model", 6_000)
+    reservation = gov.reserve("model", 1_000)
+    assert reservation.waited_s == pytest.approx(10.0)
+    assert sum(clock.sleeps) == pytest.approx(10.0) and max(clock.sleeps) <= governor.MAX_SLEEP_S
+
+
+def test_reserve_fails_fast_when_the_capacity_comes_back_too_late(clock):
+    gov = Governor(InMemoryBucketStore(), {"model": QUOTA}, "us-east-1")
+    gov.reserve("model", 6_000)
+    with pytest.raises(GovernorTimeout):
+        gov.reserve("model", 3_000, max_wait_s=20)
+    assert clock.sleeps == []
+
+
+def test_models_without_quota_and_regions_are_governed_separately(clock):
+    gov = Governor(InMemoryBucketStore(), {"model": QUOTA}, "us-east-1")
+    gov.reserve("model", 6_000)
+    assert gov.reserve("model", 6_000, region="us-west-2").waited_s == 0
+    assert gov.reserve("other-model", 1_000_000).quota is None
+
+
+def test_unused_tokens_are_returned_to_the_bucket(clock):
+    store = InMemoryBucketStore()
+    gov = Governor(store, {"model": QUOTA}, "us-east-1")
+    reservation = gov.reserve("model", 6_000)
+    gov.reconcile(reservation, 2_000)
+    assert gov.reserve("model", 4_000).waited_s == 0
+
+
+def test_dynamodb_store_retries_conflicting_updates(clock):
+    table = FakeTable(num_conflicts=2)
+    store = DynamoDBBucketStore("buckets", dynamodb_resource=FakeResource(table))
+    assert store.acquire("us-east-1#model", QUOTA, 1, 1_000, clock.now) == 0.0
+    item = table.items["us-east-1#model"]
+    assert (float(item["tokens"]), item["version"]) == (5_000, 1)
+
+    assert store.acquire("us-east-1#model", QUOTA, 1, 6_000, clock.now) == pytest.approx(10.0)
+    store.adjust("us-east-1#model", QUOTA, -1_000, clock.now)
+    assert (float(table.items["us-east-1#model"]["tokens"]), table.items["us-east-1#model"]["version"]) == (6_000, 2)
+
+
+def test_dynamodb_store_lets_the_call_through_after_too_many_conflicts(clock):
+    table = FakeTable(num_conflicts=100)
+    store = DynamoDBBucketStore("buckets", max_conflicts=3, dynamodb_resource=FakeResource(table))
+    assert store.acquire("us-east-1#model", QUOTA, 1, 1_000, clock.now) == 0.0
+    assert table.num_conflicts == 97
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.delenv("GOVERNOR_TABLE", raising=False)
+    monkeypatch.delenv("GOVERNOR_POLICY", raising=False)
+    assert Governor.from_env("us-east-1") is None
+
+    quotas = '{"model": {"requests_per_minute": 60, "tokens_per_minute": 6000}}'
+    monkeypatch.setenv("GOVERNOR_POLICY", f'{{"enabled": true, "max_wait_s": 5, "quotas": {quotas}}}')
+    gov = Governor.from_env("us-east-1")
+    assert isinstance(gov.store, InMemoryBucketStore)
+    assert gov.quotas == {"model": QUOTA} and gov.max_wait_s == 5
+
+
+def test_estimate_tokens():
+    messages = [{"role": "user", "content": [{"text": "x" * 400}, {"image": {}}, {"image": {}}]}]
+    assert estimate_tokens(messages, system="y" * 40) == 110 + 2 * governor.IMAGE_TOKENS
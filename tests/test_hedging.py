@@ -0,0 +1,110 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the hedged calls: a slow or failed call is duplicated to the next endpoint, the first valid answer wins
+"""
+
+import threading
+
+import pytest
+from model.hedging import Endpoint, EndpointSelector, HedgePolicy, LatencyStats
+
+PRIMARY = Endpoint("us-east-1", "model")
+SECONDARY = Endpoint("us-west-2", "model")
+
+
+@pytest.fixture
+def selector():
+    policy = HedgePolicy(enabled=True, default_delay_s=0.05, min_samples=3, secondary_regions=["us-west-2"])
+    return EndpointSelector(policy, lambda region, read_timeout: f"client-{region}-{read_timeout}")
+
+
+def test_endpoints_of_a_call():
+    policy = HedgePolicy(
+        enabled=True, secondary_regions=["us-east-1", "us-west-2"], equivalent_models={"model": ["m2"]}
+    )
+    assert policy.get_endpoints("us-east-1", "model") == [PRIMARY, SECONDARY, Endpoint("us-east-1", "m2")]
+    assert HedgePolicy(secondary_regions=["us-west-2"]).get_endpoints("us-east-1", "model") == [PRIMARY]
+
+
+def test_nearest_rank_percentile():
+    stats = LatencyStats(window=4)
+    assert stats.percentile(PRIMARY, 50) is None
+    for latency in [9.0, 1.0, 2.0, 3.0, 4.0]:  # the first latency falls out of the window
+        stats.record(PRIMARY, latency)
+    assert stats.count(PRIMARY) == 4
+    assert (stats.percentile(PRIMARY, 50), stats.percentile(PRIMARY, 95)) == (2.0, 4.0)
+
+
+def test_endpoints_are_ranked_by_median_latency_once_known(selector):
+    for latency in [3.0, 3.0, 3.0]:
+        selector.stats.record(PRIMARY, latency)
+    assert selector.rank([SECONDARY, PRIMARY]) == [PRIMARY, SECONDARY]
+    for latency in [1.0, 1.0, 1.0]:
+        selector.stats.record(SECONDARY, latency)
+    assert selector.rank([PRIMARY, SECONDARY]) == [SECONDARY, PRIMARY]
+
+
+def test_hedge_delay_is_the_latency_percentile(selector):
+    assert selector.hedge_delay(PRIMARY) == 0.05
+    for latency in [1.0, 4.0, 5.0]:
+        selector.stats.record(PRIMARY, latency)
+    assert selector.hedge_delay(PRIMARY) == 5.0
+    selector.policy.min_delay_s = 10.0
+    assert selector.hedge_delay(PRIMARY) == 10.0
+
+
+def test_clients_are_created_once_per_region_and_read_timeout(selector):
+    assert selector.get_client("us-east-1", 30) == "client-us-east-1-30"
+    assert selector.get_client("us-east-1", 30) is selector.get_client("us-east-1", 30)
+
+
+def test_slow_call_is_duplicated_and_the_first_answer_wins(selector):
+    release = threading.Event()
+
+    def call(endpoint, client):
+        if endpoint == PRIMARY:
+            release.wait(5)
+        return endpoint.region
+
+    try:
+        assert selector.call([PRIMARY, SECONDARY], call) == ("us-west-2", SECONDARY)
+    finally:
+        release.set()
+
+
+def test_failed_call_is_duplicated_without_waiting(selector):
+    selector.policy.default_delay_s = 60
+
+    def call(endpoint, client):
+        if endpoint == PRIMARY:
+            raise ConnectionError("reset")
+        return endpoint.region
+
+    assert selector.call([PRIMARY, SECONDARY], call) == ("us-west-2", SECONDARY)
+
+
+def test_invalid_answer_is_returned_when_no_other_endpoint_answers(selector):
+    def call(endpoint, client):
+        if endpoint == SECONDARY:
+            raise ConnectionError("reset")
+        return "not json"
+
+    assert selector.call([PRIMARY, SECONDARY], call, is_valid=lambda answer: False) == ("not json", PRIMARY)
+
+
+def test_last_error_is_raised_when_every_endpoint_fails(selector):
+    def call(endpoint, client):
+        raise ConnectionError(endpoint.region)
+
+    with pytest.raises(ConnectionError, match="us-west-2"):
+        selector.call([PRIMARY, SECONDARY], call)
+
+
+def test_only_the_requested_endpoint_is_called_when_disabled(selector):
+    selector.policy.enabled = False
+    called = []
+    assert selector.call([PRIMARY, SECONDARY], lambda endpoint, client: called.append(client)) == (None, PRIMARY)
+    assert called == ["client-us-east-1-None"]
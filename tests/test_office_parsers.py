@@ -0,0 +1,103 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the native Office and HTML parsers: page numbers, tables and text of every supported format
+"""
+
+import datetime
+
+import pytest
+
+
+@pytest.fixture
+def parsers(import_lambda):
+    return import_lambda("read_office_docker", "parsers")
+
+
+def parse(parsers, path):
+    return parsers.format_pages(parsers.NATIVE_PARSERS[path.suffix](str(path)))
+
+
+def test_docx_pages_and_tables(parsers, tmp_path):
+    from docx import Document
+    from docx.enum.text import WD_BREAK
+
+    document = Document()
+    document.add_paragraph("Claim summary")
+    table = document.add_table(rows=2, cols=2)
+    for row, values in zip(table.rows, [("Item", "Amount"), ("Bumper", "1,200")]):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    document.add_paragraph().add_run().add_break(WD_BREAK.PAGE)
+    document.add_paragraph("Signature")
+    path = tmp_path / "claim.docx"
+    document.save(path)
+
+    assert parse(parsers, path) == (
+        "[page 1]\nClaim summary\n| Item | Amount |\n|---|---|\n| Bumper | 1,200 |\n[page 2]\nSignature\n"
+    )
+
+
+def test_xlsx_sheets_are_pages(parsers, tmp_path):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Claims"
+    for row in [("Date", "Amount"), (None, None), (datetime.datetime(2024, 3, 1), 1200.0)]:
+        sheet.append(row)
+    workbook.create_sheet("Empty")
+    path = tmp_path / "claims.xlsx"
+    workbook.save(path)
+
+    assert parse(parsers, path) == (
+        "[page 1]\nSheet: Claims\n| Date | Amount |\n|---|---|\n| 2024-03-01 | 1200 |\n[page 2]\nSheet: Empty\n"
+    )
+
+
+def test_pptx_slides_are_pages(parsers, tmp_path):
+    from pptx import Presentation
+    from pptx.util import Inches
+
+    presentation = Presentation()
+    for title in ["Overview", "Damages"]:
+        slide = presentation.slides.add_slide(presentation.slide_layouts[5])
+        slide.shapes.title.text = title
+    table = slide.shapes.add_table(2, 2, Inches(1), Inches(2), Inches(4), Inches(1)).table
+    for row, values in zip(table.rows, [("Part", "Cost"), ("Door", "900")]):
+        for cell, value in zip(row.cells, values):
+            cell.text = value
+    slide.notes_slide.notes_text_frame.text = "Ask for the invoice"
+    path = tmp_path / "claim.pptx"
+    presentation.save(path)
+
+    assert parse(parsers, path) == (
+        "[page 1]\nOverview\n[page 2]\nDamages\n| Part | Cost |\n|---|---|\n| Door | 900 |\nAsk for the invoice\n"
+    )
+
+
+def test_html_blocks_and_tables(parsers, tmp_path):
+    path = tmp_path / "claim.html"
+    path.write_text(
+        "<html><head><title>Ignored</title><style>p {}</style></head><body>"
+        "<h1>Claim</h1><p>Policy   123<br>Sedan</p><script>var x;</script>"
+        "<table><tr><th>Part</th><th>Cost</th></tr><tr><td>Door</td><td>9|00</td></tr></table>"
+        "</body></html>"
+    )
+
+    assert parse(parsers, path) == (
+        "[page 1]\nClaim\nPolicy 123\nSedan\n| Part | Cost |\n|---|---|\n| Door | 9\\|00 |\n"
+    )
+
+
+def test_markdown_is_read_as_is(parsers, tmp_path):
+    path = tmp_path / "notes.md"
+    path.write_text("# Notes\n\n- first\n")
+    assert parse(parsers, path) == "[page 1]\n# Notes\n\n- first\n\n"
+
+
+def test_rows_are_padded_to_the_last_non_empty_column(parsers):
+    table = parsers.format_table([["a", "", "c"], ["d"], [None, None, None]])
+    assert table == "| a |  | c |\n|---|---|---|\n| d |  |  |"
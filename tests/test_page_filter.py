@@ -0,0 +1,77 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the page filter of the vision Lambdas: blank and repeated pages are dropped, distinct pages are kept
+"""
+
+import pathlib
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+from pypdf import PdfReader
+
+DEMO_DIR = pathlib.Path(__file__).parents[1] / "demo" / "originals"
+
+
+@pytest.fixture
+def helpers(import_lambda):
+    return import_lambda("extract_attributes_llm", "helpers")
+
+
+def to_jpeg(image: Image.Image, quality: int = 85) -> bytes:
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_form(total: str) -> Image.Image:
+    image = Image.new("RGB", (1700, 2200), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=36)
+    draw.text((150, 150), "CLAIM FORM", fill="black", font=ImageFont.load_default(size=72))
+    for row, label in enumerate(["Policy number: 123-456", "Date of loss: 2024-03-01", "Vehicle: Sedan"]):
+        draw.text((150, 400 + 120 * row), label, fill="black", font=font)
+        draw.line((150, 460 + 120 * row, 1550, 460 + 120 * row), fill="black", width=3)
+    draw.text((150, 900), f"Total: {total}", fill="black", font=font)
+    return image
+
+
+def make_photo(seed: int) -> Image.Image:
+    colors = np.random.default_rng(seed).integers(0, 256, size=(6, 8, 3), dtype=np.uint8)
+    return Image.fromarray(colors).resize((1600, 1200), Image.Resampling.BICUBIC)
+
+
+@pytest.mark.parametrize("file_name", ["cloud-adoption-framework.pdf", "code-sample-catalog.pdf"])
+def test_distinct_pages_of_a_pdf_are_kept(helpers, file_name):
+    pdf_bytes = (DEMO_DIR / file_name).read_bytes()
+    images, skipped_pages = helpers.get_images_from_pdf(pdf_bytes)
+    assert skipped_pages == []
+    assert len(images) == len(PdfReader(BytesIO(pdf_bytes)).pages)
+
+
+def test_blank_and_repeated_pages_are_dropped(helpers):
+    form = make_form("$1,200")
+    pages = [to_jpeg(form), to_jpeg(Image.new("RGB", form.size, "white")), to_jpeg(form)]
+    images, skipped_pages = helpers.get_images_from_files(pages)
+    assert len(images) == 1
+    assert [(page["page"], page["reason"]) for page in skipped_pages] == [(2, "blank"), (3, "duplicate")]
+
+
+@pytest.mark.parametrize("other_total", ["$1,300", "$9,875"])
+def test_pages_of_the_same_layout_are_kept(helpers, other_total):
+    pages = [to_jpeg(make_form("$1,200")), to_jpeg(make_form(other_total))]
+    images, skipped_pages = helpers.get_images_from_files(pages)
+    assert len(images) == 2 and skipped_pages == []
+
+
+def test_photos_of_the_same_scene_are_collapsed(helpers):
+    photo = make_photo(0)
+    retake = ImageEnhance.Brightness(photo.crop((20, 15, 1600, 1200)).resize(photo.size)).enhance(1.05)
+    pages = [to_jpeg(photo), to_jpeg(retake), to_jpeg(make_photo(1))]
+    images, skipped_pages = helpers.get_images_from_files(pages)
+    assert len(images) == 2
+    assert skipped_pages == [{"page": 2, "reason": "duplicate", "duplicate_of": 1}]
@@ -0,0 +1,118 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the tolerant JSON parser of the layer
+"""
+
+import json
+import random
+
+import pytest
+from model.parser import JsonParseError, JsonStreamParser, parse_json
+
+ALPHABET = "abcXYZ 019_-.,:;{}[]'\"\\/\n\té中\U0001f600<>json`"
+KEY_ALPHABET = "abcdefXYZ_0123456789 "
+
+
+def random_string(rng: random.Random, alphabet: str, max_length: int = 12) -> str:
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length)))
+
+
+def random_value(rng: random.Random, depth: int = 0):
+    kind = rng.choice(["object", "array"] if depth == 0 else ["object", "array", "string", "number", "literal"] * 2)
+    if kind in ("object", "array") and depth >= 4:
+        kind = "string"
+    if kind == "object":
+        return {random_string(rng, KEY_ALPHABET) or "k": random_value(rng, depth + 1) for _ in range(rng.randint(0, 5))}
+    if kind == "array":
+        return [random_value(rng, depth + 1) for _ in range(rng.randint(0, 5))]
+    if kind == "string":
+        return random_string(rng, ALPHABET)
+    if kind == "number":
+        return rng.choice([rng.randint(-(10**6), 10**6), round(rng.uniform(-1e3, 1e3), 3)])
+    return rng.choice([True, False, None])
+
+
+def wrap(rng: random.Random, text: str) -> str:
+    return rng.choice(
+        [
+            text,
+            f"<thinking>The document is a claim form.</thinking>\n<json>\n{text}\n</json>",
+            f"Here is the answer:\n```json\n{text}\n```\nLet me know if you need anything else.",
+            f"Sure! {text} Hope it helps.",
+        ]
+    )
+
+
+def parse_streamed(rng: random.Random, text: str):
+    parser = JsonStreamParser()
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 16)
+        parser.feed(text[i : i + size])
+        i += size
+    return parser.close()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_round_trip(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        value = random_value(rng)
+        text = json.dumps(value, ensure_ascii=rng.random() < 0.5, indent=rng.choice([None, 2]))
+
+        assert parse_json(wrap(rng, text)) == value
+        assert parse_streamed(rng, text) == value
+        assert parse_json(repr(value)) == value
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_truncated_and_garbage_never_crash(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        text = json.dumps(random_value(rng))
+        for candidate in (text[: rng.randint(0, len(text))], random_string(rng, ALPHABET + "truefalsnul", 60)):
+            try:
+                assert isinstance(parse_json(candidate), (dict, list))
+            except JsonParseError:
+                pass
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": "<json>"}', {"a": "<json>"}),
+        ('<json>{"a": "</json>", "b": 1}</json> {"c": 2}', {"a": "</json>", "b": 1}),
+        ("Here's the answer: <json>{'a': 'x'}</json>", {"a": "x"}),
+        ('```json\n{"a": "```"}\n```', {"a": "```"}),
+        ('<json>{"a": 1</json> {"b": 2}', {"a": 1}),
+    ],
+)
+def test_tags_in_strings(text, expected):
+    assert parse_json(text) == expected
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("{a: 1, b: two words}", {"a": 1, "b": "two words"}),
+        ("{a: 1 b: 2}", {"a": 1, "b": 2}),
+        ("{a: true story, b: [x y]}", {"a": "true story", "b": ["x", "y"]}),
+        ("{a: two\nb: 3}", {"a": "two", "b": 3}),
+        ("{a: two wor", {"a": "two wor"}),
+        ("{a: tr", {}),
+    ],
+)
+def test_bare_values(text, expected):
+    assert parse_json(text) == expected
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5])
+def test_bare_values_streamed(size):
+    text = "{ a : one two three :x, b: 4 c: five six}"
+    parser = JsonStreamParser()
+    for i in range(0, len(text), size):
+        parser.feed(text[i : i + size])
+    assert parser.close() == parse_json(text) == {"a": "one two", "three": "x", "b": 4, "c": "five six"}
@@ -0,0 +1,65 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the PDF renderers: in-process rendering of every page, and fallback to poppler
+"""
+
+import pathlib
+import shutil
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from pypdf import PdfReader
+
+DEMO_PDF = pathlib.Path(__file__).parents[1] / "demo" / "originals" / "code-sample-catalog.pdf"
+
+requires_poppler = pytest.mark.skipif(shutil.which("pdftoppm") is None, reason="poppler is not installed")
+
+
+@pytest.fixture
+def renderer(import_lambda):
+    return import_lambda("extract_attributes_llm", "renderer")
+
+
+@pytest.fixture
+def pdf_bytes():
+    return DEMO_PDF.read_bytes()
+
+
+def test_every_page_is_rendered_in_document_order(renderer, pdf_bytes):
+    images = list(renderer.render_pdf(pdf_bytes, dpi=50))
+    assert len(images) == len(PdfReader(BytesIO(pdf_bytes)).pages)
+    assert all(Image.open(BytesIO(image)).format == "JPEG" for image in images)
+
+
+def test_pages_are_rendered_at_the_requested_resolution(renderer, pdf_bytes):
+    width, height = PdfReader(BytesIO(pdf_bytes)).pages[0].mediabox[2:]
+    with renderer.get_renderer("pdfium").open(pdf_bytes) as document:
+        for dpi in [40, 200]:
+            image = document.render(0, dpi)
+            assert image.size == pytest.approx((float(width) * dpi / 72, float(height) * dpi / 72), abs=1)
+
+
+def test_failed_renderer_falls_back_to_poppler(renderer, pdf_bytes, monkeypatch):
+    def fail(self, source):
+        raise RuntimeError("cannot open")
+
+    def render(self, source, dpi, image_format):
+        rendered.append(dpi)
+        return iter([b"page"])
+
+    rendered = []
+    monkeypatch.setattr(renderer.PdfiumRenderer, "open", fail)
+    monkeypatch.setattr(renderer.PopplerRenderer, "render", render)
+    assert renderer.render_pdf(pdf_bytes, dpi=50) == [b"page"]
+    assert rendered == [50]
+
+
+@requires_poppler
+def test_poppler_renders_the_same_pages(renderer, pdf_bytes):
+    with renderer.get_renderer("poppler").open(pdf_bytes) as document:
+        assert len(document) == len(PdfReader(BytesIO(pdf_bytes)).pages)
+        assert len(list(document.render_all(40))) == len(document)
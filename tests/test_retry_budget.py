@@ -0,0 +1,113 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the retry budget: error classification, retries spent across layers and restarts of the task
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError, ReadTimeoutError
+from model.retry_budget import (
+    NonRetryableError,
+    RetryableError,
+    RetryBudget,
+    instrument,
+    is_retryable,
+    with_retry_budget,
+)
+
+
+def client_error(code: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, "Operation")
+
+
+class FakeEvents:
+    def __init__(self):
+        self.handlers = []
+
+    def register(self, event_name, handler):
+        self.handlers.append(handler)
+
+    def emit(self, retry_attempts):
+        parsed = {"ResponseMetadata": {"RetryAttempts": retry_attempts}}
+        for handler in self.handlers:
+            handler(http_response=None, parsed=parsed, model=SimpleNamespace(name="GetObject"))
+
+
+@pytest.mark.parametrize(
+    "error, retryable",
+    [
+        (client_error("ThrottlingException"), True),
+        (client_error("ServiceUnavailable"), True),
+        (client_error("ValidationException"), False),
+        (client_error("NoSuchKey"), False),
+        (EndpointConnectionError(endpoint_url="https://s3"), True),
+        (ReadTimeoutError(endpoint_url="https://s3"), True),
+        (RetryableError("x"), True),
+        (NonRetryableError("x"), False),
+        (ValueError("x"), False),
+        (SimpleNamespace(retryable=True), True),
+    ],
+)
+def test_is_retryable(error, retryable):
+    assert is_retryable(error) == retryable
+
+
+def test_budget_left_after_the_step_functions_retries():
+    budget = RetryBudget.from_event({"retry_budget": 3, "retry_count": 1, "state_name": "Extract"}, "extract")
+    assert (budget.stage, budget.remaining) == ("Extract", 2)
+    assert budget.botocore_config().retries["max_attempts"] == 3
+    assert budget.spend("throttling") and budget.spend("throttling")
+    assert not budget.spend("throttling")
+    assert budget.remaining == 0 and budget.spent == {"throttling": 2}
+
+
+def test_a_task_that_retried_in_the_lambda_is_not_restarted():
+    budget = RetryBudget("extract", budget=3)
+    error = client_error("ThrottlingException")
+    assert budget.can_restart(error)
+    assert isinstance(budget.escalate(error), RetryableError)
+
+    budget.record("s3:GetObject", 1)
+    assert not budget.can_restart(error)
+    assert isinstance(budget.escalate(error), NonRetryableError)
+
+
+def test_client_retries_are_charged_to_the_running_invocation():
+    events = FakeEvents()
+    client = SimpleNamespace(meta=SimpleNamespace(events=events, service_model=SimpleNamespace(service_name="s3")))
+    instrument(client)
+    events.emit(2)  # outside an invocation
+
+    @with_retry_budget("extract")
+    def handler(event, context, retry_budget):
+        events.emit(2)
+        events.emit(0)
+        return dict(retry_budget.spent)
+
+    assert handler({}, None) == {"s3:GetObject": 2}
+
+
+def test_handler_errors_are_classified_for_the_state_machine(capsys):
+    @with_retry_budget("extract")
+    def handler(event, context, retry_budget):
+        raise client_error(event["code"])
+
+    with pytest.raises(RetryableError) as error:
+        handler({"code": "ThrottlingException"}, None)
+    assert isinstance(error.value.__cause__, ClientError)
+    with pytest.raises(NonRetryableError):
+        handler({"code": "ValidationException"}, None)
+    with pytest.raises(NonRetryableError):
+        handler({"code": "ThrottlingException", "retry_budget": 1, "retry_count": 1}, None)
+
+    metrics = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.startswith("{")]
+    assert [(m["Stage"], m["RetriesSpent"], m["StateRetries"]) for m in metrics] == [
+        ("extract", 0, 0),
+        ("extract", 0, 0),
+        ("extract", 0, 1),
+    ]
@@ -0,0 +1,151 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the transcription Lambda: transcripts are mapped to the original recording once, however often it runs
+"""
+
+import hashlib
+import io
+import json
+import wave
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from botocore.exceptions import ClientError
+from botocore.response import StreamingBody
+
+SAMPLE_RATE = 16_000
+RAW_START_S = 1.0  # time of the first word in the preprocessed audio
+
+
+def make_recording() -> bytes:
+    """
+    Speech-like tones separated by long silences, which are trimmed by the preprocessing
+    """
+    rng = np.random.default_rng(0)
+
+    def tone(seconds):
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        return 0.5 * np.sin(2 * np.pi * 220 * t)
+
+    def silence(seconds):
+        return 0.0005 * rng.standard_normal(int(seconds * SAMPLE_RATE))
+
+    samples = np.concatenate([silence(3), tone(2), silence(4), tone(2), silence(1)])
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((samples * 32767).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def raw_transcript(job_name: str) -> bytes:
+    item = {
+        "id": 0,
+        "type": "pronunciation",
+        "start_time": f"{RAW_START_S:.3f}",
+        "end_time": f"{RAW_START_S + 0.5:.3f}",
+        "speaker_label": "spk_0",
+        "alternatives": [{"confidence": "0.99", "content": "hello"}],
+    }
+    segment = {"speaker_label": "spk_0", "start_time": item["start_time"], "end_time": item["end_time"], "items": []}
+    results = {"transcripts": [{"transcript": "hello"}], "items": [item], "speaker_labels": {"segments": [segment]}}
+    return json.dumps({"jobName": job_name, "status": "COMPLETED", "results": results}).encode()
+
+
+class FakeClient:
+    def __init__(self, service_name: str):
+        self.meta = SimpleNamespace(
+            events=SimpleNamespace(register=lambda *args, **kwargs: None),
+            service_model=SimpleNamespace(service_name=service_name),
+        )
+
+
+class FakeS3(FakeClient):
+    def __init__(self):
+        super().__init__("s3")
+        self.objects = {}
+
+    def _get(self, key: str) -> bytes:
+        if key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return self.objects[key]
+
+    def get_object(self, Bucket, Key):
+        data = self._get(Key)
+        return {"Body": StreamingBody(io.BytesIO(data), len(data))}
+
+    def head_object(self, Bucket, Key):
+        data = self._get(Key)
+        return {"ETag": hashlib.md5(data).hexdigest(), "ContentLength": len(data), "Metadata": {}}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body.encode() if isinstance(Body, str) else bytes(Body)
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self.objects[Key] = self._get(CopySource["Key"])
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        with open(Filename, "rb") as f:
+            self.objects[Key] = f.read()
+
+
+class FakeTranscribe(FakeClient):
+    def __init__(self, s3: FakeS3):
+        super().__init__("transcribe")
+        self.s3 = s3
+        self.jobs = {}
+
+    def start_transcription_job(self, TranscriptionJobName, OutputKey, **kwargs):
+        self.jobs[TranscriptionJobName] = OutputKey
+        self.s3.objects[OutputKey] = raw_transcript(TranscriptionJobName)
+
+    def get_transcription_job(self, TranscriptionJobName):
+        if TranscriptionJobName not in self.jobs:
+            raise ClientError({"Error": {"Code": "BadRequestException"}}, "GetTranscriptionJob")
+        return {"TranscriptionJob": {"TranscriptionJobStatus": "COMPLETED"}}
+
+
+@pytest.fixture
+def lambda_env(import_lambda, monkeypatch, tmp_path):
+    run_transcribe = import_lambda("run_transcribe", "run_transcribe")
+    s3 = FakeS3()
+    transcribe = FakeTranscribe(s3)
+    clients = {"s3": s3, "transcribe": transcribe}
+    monkeypatch.setattr(run_transcribe.boto3, "client", lambda service_name, **kwargs: clients[service_name])
+    monkeypatch.setattr(run_transcribe, "LOCAL_TRANSCRIPT_PATH", str(tmp_path / "transcript.json"))
+    s3.objects["originals/call.wav"] = make_recording()
+    return run_transcribe, s3, transcribe
+
+
+def get_start_time(s3: FakeS3, key: str) -> float:
+    return float(json.loads(s3.objects[key])["results"]["items"][0]["start_time"])
+
+
+def test_raw_transcripts_are_kept_apart_from_the_output(lambda_env):
+    run_transcribe, s3, transcribe = lambda_env
+    response = run_transcribe.lambda_handler({"body": {"file_name": "originals/call.wav"}}, None)
+
+    assert response["statusCode"] == 200
+    assert "transcripts/call.wav.txt" not in transcribe.jobs.values()
+    assert all(key.startswith(run_transcribe.PREFIX_TRANSCRIPT_PARTS) for key in transcribe.jobs.values())
+    # the first word is mapped past the leading silence trimmed by the preprocessing
+    assert get_start_time(s3, "transcripts/call.wav.txt") > RAW_START_S + 1
+
+
+@pytest.mark.parametrize("execution_name", ["execution-1", "execution-2"])
+def test_remap_is_idempotent(lambda_env, execution_name):
+    run_transcribe, s3, transcribe = lambda_env
+    event = {"body": {"file_name": "originals/call.wav"}, "execution_name": "execution-1"}
+    run_transcribe.lambda_handler(event, None)
+    first = s3.objects["transcripts/call.wav.txt"]
+
+    # a retry of the execution, or a re-submission, resumes the jobs from the checkpoint and maps them again
+    run_transcribe.lambda_handler(dict(event, execution_name=execution_name), None)
+    assert len(transcribe.jobs) == 1
+    assert s3.objects["transcripts/call.wav.txt"] == first
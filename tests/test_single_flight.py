@@ -0,0 +1,130 @@
+"""
+Copyright © Amazon.com and Affiliates
+This code is being licensed under the terms of the Amazon Software License available at https://aws.amazon.com/asl/
+----------------------------------------------------------------------
+File content:
+    Tests of the single flight: concurrent callers of the same work wait for the result of the first one
+"""
+
+import json
+
+import pytest
+from botocore.exceptions import ClientError
+from model import single_flight
+from model.single_flight import InMemoryLockStore, SingleFlight, get_flight_key
+
+KEY = get_flight_key("document-hash", "stage", {"model": "m"})
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000.0
+        self.on_sleep = None
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.on_sleep is not None:
+            self.on_sleep()
+
+
+class FailingStore(InMemoryLockStore):
+    def acquire(self, key, owner, expires_at, now):
+        raise ClientError({"Error": {"Code": "ProvisionedThroughputExceededException"}}, "PutItem")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(single_flight.time, "time", clock.time)
+    monkeypatch.setattr(single_flight.time, "sleep", clock.sleep)
+    monkeypatch.setattr(single_flight.random, "uniform", lambda a, b: 1.0)
+    return clock
+
+
+def counting_work(result):
+    calls = []
+
+    def work():
+        calls.append(1)
+        return result
+
+    return work, calls
+
+
+def test_flight_key_depends_on_the_document_stage_and_inputs():
+    assert KEY == get_flight_key("document-hash", "stage", {"model": "m"})
+    assert KEY.startswith("document-hash/stage/")
+    assert KEY != get_flight_key("document-hash", "stage", {"model": "other"})
+    assert KEY != get_flight_key("other-hash", "stage", {"model": "m"})
+
+
+def test_work_runs_without_coordination_when_disabled():
+    work, calls = counting_work({"pages": 1})
+    assert SingleFlight().run(KEY, work) == ({"pages": 1}, False)
+    assert calls == [1]
+
+
+def test_waiting_caller_returns_the_result_of_the_first_one(clock):
+    store = InMemoryLockStore()
+    store.acquire(KEY, "first", clock.now + 900, clock.now)
+    clock.on_sleep = lambda: store.complete(KEY, "first", json.dumps({"pages": 1}), clock.now + 60)
+
+    work, calls = counting_work({"pages": 2})
+    assert SingleFlight(store).run(KEY, work) == ({"pages": 1}, True)
+    assert calls == []
+
+
+def test_waiting_caller_runs_the_work_itself_after_the_wait(clock):
+    store = InMemoryLockStore()
+    store.acquire(KEY, "first", clock.now + 900, clock.now)
+
+    work, calls = counting_work({"pages": 2})
+    assert SingleFlight(store, wait_s=10, poll_s=1).run(KEY, work) == ({"pages": 2}, False)
+    assert calls == [1] and clock.now == pytest.approx(1_010.0)
+
+
+def test_lock_of_a_dead_caller_is_taken_over_when_it_expires(clock):
+    store = InMemoryLockStore()
+    store.acquire(KEY, "dead", clock.now + 5, clock.now)
+
+    work, calls = counting_work({"pages": 2})
+    assert SingleFlight(store, wait_s=60).run(KEY, work) == ({"pages": 2}, False)
+    assert calls == [1]
+    assert store.get(KEY, clock.now)["status"] == single_flight.STATUS_DONE
+
+
+def test_failed_caller_releases_the_lock(clock):
+    store = InMemoryLockStore()
+
+    def fail():
+        raise RuntimeError("job failed")
+
+    with pytest.raises(RuntimeError):
+        SingleFlight(store).run(KEY, fail)
+    assert store.get(KEY, clock.now) is None
+
+
+def test_unpublishable_result_releases_the_lock(clock):
+    store = InMemoryLockStore()
+    result = {"not json": object()}
+    assert SingleFlight(store).run(KEY, lambda: result) == (result, False)
+    assert store.get(KEY, clock.now) is None
+
+
+def test_lock_store_errors_do_not_fail_the_work(clock):
+    work, calls = counting_work({"pages": 1})
+    assert SingleFlight(FailingStore()).run(KEY, work) == ({"pages": 1}, False)
+    assert calls == [1]
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.delenv("SINGLE_FLIGHT_POLICY", raising=False)
+    monkeypatch.delenv("SINGLE_FLIGHT_TABLE", raising=False)
+    assert SingleFlight.from_env().store is None
+
+    monkeypatch.setenv("SINGLE_FLIGHT_POLICY", '{"enabled": true, "wait_s": 30}')
+    flight = SingleFlight.from_env()
+    assert isinstance(flight.store, InMemoryLockStore) and flight.wait_s == 30